@@ -0,0 +1,189 @@
+"""
+PII Regex Benchmark & Fuzz Harness
+Throughput and worst-case (catastrophic backtracking) checks for every
+pattern used by PIIDetectionTool and the Privacy Guard
+
+Usage (from the repository root):
+    python -m benchmarks.pii_regex_bench            # full run
+    python -m benchmarks.pii_regex_bench --quick    # smaller inputs, for CI
+
+Exits with status 1 if any pattern scales worse than linearly.
+"""
+
+from typing import Callable, Dict, List, Pattern, Tuple
+import argparse
+import io
+import math
+import random
+import sys
+import time
+
+from src.tools.pii_scanner import (
+    COMPILED_RULES, COMBINED_PATTERN, _SAFE_CUT, scan_spans, iter_spans
+)
+from src.agents.privacy_decision import SENSITIVE_HINTS
+
+PATTERNS: Dict[str, Pattern] = dict(COMPILED_RULES)
+PATTERNS["combined"] = COMBINED_PATTERN
+PATTERNS["sensitive_hints"] = SENSITIVE_HINTS
+PATTERNS["stream_safe_cut"] = _SAFE_CUT
+
+# Growth exponent above which a pattern is reported as superlinear
+# (time ~ n^k; linear patterns measure close to 1.0)
+MAX_GROWTH_EXPONENT = 1.35
+
+SENTENCES = [
+    "Kakek lahir di sebuah desa kecil dekat Yogyakarta pada tahun 1932. ",
+    "Nenek selalu memasak rendang setiap Lebaran untuk seluruh keluarga. ",
+    "Our family gathered at 12 Main Street for the reunion in 1998. ",
+    "Bapak bekerja sebagai guru selama empat puluh tahun, dan dikenal ramah. ",
+    "Hubungi Om Budi di +62 812-3456-7890 atau budi.santoso@mail.com. ",
+    "Nomor KTP 3174012345678901 tertulis di belakang foto lama. ",
+    "The old letter mentions 45 Jalan Merdeka and a trip to Surabaya. ",
+]
+
+
+def build_corpus(size: int, seed: int = 7) -> str:
+    """Realistic family text with PII sprinkled in"""
+    rng = random.Random(seed)
+    parts, length = [], 0
+    while length < size:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:size]
+
+
+# Adversarial inputs: each targets a backtracking weak spot of a rule
+ADVERSARIAL: Dict[str, Callable[[int], str]] = {
+    "digit_run": lambda n: "1" * n,
+    "spaced_digits": lambda n: ("1 " * n)[:n],
+    "short_digit_groups": lambda n: ("123456789a" * n)[:n],
+    "whitespace_run": lambda n: " " * n,
+    "digit_then_spaces": lambda n: "1" + " " * (n - 2) + "x",
+    "long_word": lambda n: "a" * n,
+    "address_no_suffix": lambda n: "12 " + ("kampung " * n)[:n],
+    "address_many_starts": lambda n: ("1 " + "a" * 20 + " ") * (n // 23),
+    "dotted_local_part": lambda n: ("a." * n)[:n],
+    "local_part_no_at": lambda n: ("a-" * n)[:n] + " ",
+    "many_ats": lambda n: ("a@" * n)[:n],
+    "domain_no_tld": lambda n: "a@" + ("b." * n)[:n] + "1",
+    "domain_long_label": lambda n: "a@b." + "c" * n + "1",
+    "coordinates_no_pair": lambda n: "1." + "2" * n,
+    "dots_and_spaces": lambda n: (". " * n)[:n],
+}
+
+
+def _time_finditer(pattern: Pattern, text: str, repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _match in pattern.finditer(text):
+            pass
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def growth_exponent(lengths: List[int], timings: List[float]) -> float:
+    """Least-squares slope of log(time) against log(length)"""
+    points = [(math.log(n), math.log(max(t, 1e-7))) for n, t in zip(lengths, timings)]
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    numerator = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    return numerator / denominator if denominator else 0.0
+
+
+def bench_throughput(corpus_size: int, repeat: int) -> List[Tuple[str, float]]:
+    """MB/s of each pattern and of the full scanners on the corpus"""
+    corpus = build_corpus(corpus_size)
+    megabytes = len(corpus.encode("utf-8")) / 1e6
+    results = []
+
+    for name, pattern in PATTERNS.items():
+        results.append((name, megabytes / _time_finditer(pattern, corpus, repeat)))
+
+    scanners = {
+        "scan_spans": lambda: scan_spans(corpus),
+        "iter_spans": lambda: sum(1 for _ in iter_spans(io.StringIO(corpus))),
+    }
+    for name, scanner in scanners.items():
+        best = math.inf
+        for _ in range(repeat):
+            started = time.perf_counter()
+            scanner()
+            best = min(best, time.perf_counter() - started)
+        results.append((name, megabytes / best))
+
+    return results
+
+
+def bench_worst_case(lengths: List[int], repeat: int) -> List[Tuple[str, str, float, float]]:
+    """Scan time of every pattern on every adversarial input, by length"""
+    results = []
+    for pattern_name, pattern in PATTERNS.items():
+        for input_name, make_input in ADVERSARIAL.items():
+            timings = [_time_finditer(pattern, make_input(n), repeat) for n in lengths]
+            results.append((pattern_name, input_name, timings[-1], growth_exponent(lengths, timings)))
+    return results
+
+
+def fuzz(iterations: int, max_length: int, seed: int = 11) -> List[str]:
+    """
+    Random PII-shaped inputs: every scan must stay within a per-character
+    time budget, and streaming must agree with the in-memory scan
+    """
+    rng = random.Random(seed)
+    alphabet = list("0123456789 -()+@._%abcXYZ,;\n") + [
+        " Street", " Jalan", "3174012345678901", "4111 1111 1111 1111", "x@y.co", "-6.2088, 106.8456"
+    ]
+    budget_per_char = 20e-6
+    failures = []
+
+    for _ in range(iterations):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, max_length)))
+        started = time.perf_counter()
+        spans = scan_spans(text)
+        elapsed = time.perf_counter() - started
+        if elapsed > budget_per_char * len(text) + 1e-3:
+            failures.append(f"slow scan ({elapsed * 1e3:.1f} ms, {len(text)} chars): {text[:60]!r}")
+        if list(iter_spans(io.StringIO(text), chunk_size=64, overlap=32)) != spans:
+            failures.append(f"stream mismatch: {text[:60]!r}")
+
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and fewer repeats")
+    args = parser.parse_args()
+
+    if args.quick:
+        lengths, repeat, corpus_size, iterations = [1000, 2000, 4000, 8000], 2, 200_000, 300
+    else:
+        lengths, repeat, corpus_size, iterations = [2000, 4000, 8000, 16000, 32000], 3, 2_000_000, 2000
+
+    print("Throughput on family corpus")
+    for name, rate in bench_throughput(corpus_size, repeat):
+        print(f"  {name:<20} {rate:8.2f} MB/s")
+
+    print(f"\nWorst case by input length {lengths}")
+    superlinear = []
+    for pattern_name, input_name, slowest, exponent in bench_worst_case(lengths, repeat):
+        flag = ""
+        if exponent > MAX_GROWTH_EXPONENT and slowest > 1e-3:
+            flag = "  <-- superlinear"
+            superlinear.append((pattern_name, input_name))
+        print(f"  {pattern_name:<17} {input_name:<21} {slowest * 1e3:9.3f} ms  n^{exponent:.2f}{flag}")
+
+    print("\nFuzz")
+    failures = fuzz(iterations, 400)
+    for failure in failures[:20]:
+        print(f"  {failure}")
+    print(f"  {iterations} inputs, {len(failures)} failures")
+
+    return 1 if superlinear or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,9 @@ Part of THE BIG FAMILY LEGACY AI Crew
 
 from crewai import Agent, Task
 from langchain_openai import ChatOpenAI
-from typing import Dict, List
+from typing import Dict, Iterator, List
+
+from .llm_usage import TokenUsageCallback
 
 class BiographerAgent:
     """
@@ -16,6 +18,8 @@ class BiographerAgent:
     """
     
     def __init__(self, llm_model: str = "gpt-4o", temperature: float = 0.7):
+        self.llm = ChatOpenAI(model=llm_model, temperature=temperature,
+                              callbacks=[TokenUsageCallback("biographer", llm_model)])
         self.agent = Agent(
             role="Family Biographer & Narrative Writer",
             goal="Transform family memories into compelling, emotional stories",
@@ -29,15 +33,45 @@ class BiographerAgent:
             verbose=True,
             allow_delegation=False,
             tools=[],
-            llm=ChatOpenAI(model=llm_model, temperature=temperature)
+            llm=self.llm
         )
     
     def create_generate_story_task(self, person: Dict, memories: List[Dict], tone: str = "emotional") -> Task:
         """Generate family story for a person"""
+        return Task(
+            description=self._story_prompt(person, memories, tone),
+            expected_output="Complete biographical narrative (800-1000 words)",
+            agent=self.agent
+        )
+    
+    def stream_story(self, person: Dict, memories: List[Dict], tone: str = "emotional") -> Iterator[str]:
+        """
+        Write the family story, yielding text as the LLM produces it
+        
+        Same brief as create_generate_story_task, sent straight to the model
+        so tokens can be shown while the story is being written.
+        
+        Args:
+            person: Family member the story is about ("name", "birth_date")
+            memories: Memories to weave in ("title", "description")
+            tone: Story tone
+            
+        Yields:
+            Pieces of the story text
+        """
+        messages = [
+            ("system", f"You are a {self.agent.role}. {self.agent.backstory}\n"
+                       "Separate paragraphs with a blank line."),
+            ("human", self._story_prompt(person, memories, tone))
+        ]
+        for chunk in self.llm.stream(messages):
+            if chunk.content:
+                yield chunk.content
+    
+    def _story_prompt(self, person: Dict, memories: List[Dict], tone: str) -> str:
         memories_text = "\n".join([f"- {m.get('title', 'Untitled')}: {m.get('description', '')}" for m in memories])
         
-        return Task(
-            description=f"""Write a family biography for:
+        return f"""Write a family biography for:
             Person: {person['name']}
             Birth: {person.get('birth_date', 'unknown')}
             Key Memories:
@@ -50,10 +84,7 @@ class BiographerAgent:
             4. Style: Warm, respectful, culturally sensitive
             
             For Indonesian families, use appropriate titles (Bapak, Ibu, Kakek, Nenek).
-            """,
-            expected_output="Complete biographical narrative (800-1000 words)",
-            agent=self.agent
-        )
+            """
     
     def create_caption_task(self, memory: Dict, ai_analysis: Dict) -> Task:
         """Generate warm caption for memory"""
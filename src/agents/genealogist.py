@@ -5,10 +5,15 @@ Part of THE BIG FAMILY LEGACY AI Crew
 
 from crewai import Agent, Task
 from langchain_openai import ChatOpenAI
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional
 
 from ..tools.database_query import DatabaseQueryTool
-from ..tools.relationship_validator import RelationshipValidatorTool
+from ..tools.family_graph import FamilyGraph, get_family_graph_store
+from ..tools.family_sync import apply_changes, change_events
+from ..tools.geo_index import get_geo_index_store
+from ..tools.kinship import KinshipIndex, get_kinship_store
+from ..tools.relationship_validator import RelationshipValidatorTool, validate_relationships
+from .llm_usage import TokenUsageCallback
 
 
 class GeneologistAgent:
@@ -20,6 +25,10 @@ class GeneologistAgent:
     """
     
     def __init__(self, llm_model: str = "gpt-4o", temperature: float = 0.0):
+        self.db_tool = DatabaseQueryTool()
+        self.graph_store = get_family_graph_store()
+        self.kinship_store = get_kinship_store()
+        
         self.agent = Agent(
             role="Genealogy Specialist",
             goal="Build accurate family tree structures and validate relationships",
@@ -34,11 +43,12 @@ class GeneologistAgent:
             allow_delegation=False,
             
             tools=[
-                DatabaseQueryTool(),
+                self.db_tool,
                 RelationshipValidatorTool()
             ],
             
-            llm=ChatOpenAI(model=llm_model, temperature=temperature)
+            llm=ChatOpenAI(model=llm_model, temperature=temperature,
+                           callbacks=[TokenUsageCallback("genealogist", llm_model)])
         )
     
     def create_validate_relationship_task(self, person1: Dict, person2: Dict, relationship_type: str) -> Task:
@@ -67,21 +77,128 @@ class GeneologistAgent:
             agent=self.agent
         )
     
-    def create_build_tree_task(self, family_id: str, focus_person_id: str = None) -> Task:
-        """Build complete family tree"""
-        return Task(
-            description=f"""Build a complete family tree for:
-            Family ID: {family_id}
-            Focus Person: {focus_person_id or "all members"}
+    def family_graph(self, family_id: str, refresh: bool = False) -> FamilyGraph:
+        """
+        Graph of a family's members and relationships (cached per family)
+        
+        Args:
+            family_id: Family to load
+            refresh: Reload the rows even if the family is cached
             
-            Generate:
-            1. Hierarchical tree structure (ancestors and descendants)
-            2. Sibling groups
-            3. Spouse relationships
-            4. Statistics (total people, generations, living/deceased)
+        Returns:
+            The family's FamilyGraph
+        """
+        graph = None if refresh else self.graph_store.get(family_id)
+        if graph is None:
+            # Relationship rows are consumed a page at a time
+            graph = self.graph_store.build(family_id, self._rows("get_family_members", family_id),
+                                           self._rows("get_relationships", family_id))
+        return graph
+    
+    def build_tree(self, family_id: str, focus_person_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the family tree deterministically from the database rows
+        
+        Args:
+            family_id: Family to build
+            focus_person_id: Member whose descendants form the tree (default: everyone)
             
-            Format: JSON suitable for D3.js visualization
-            """,
-            expected_output="Family tree JSON structure",
-            agent=self.agent
+        Returns:
+            Dictionary with the D3 "tree", "sibling_groups", "spouses",
+            "statistics" and, with a focus person, their "ancestors"
+        """
+        graph = self.family_graph(family_id)
+        with graph.lock:
+            result = {
+                "family_id": family_id,
+                "focus_person_id": focus_person_id,
+                "tree": graph.to_d3(focus_person_id),
+                "sibling_groups": graph.sibling_groups(),
+                "spouses": [list(pair) for pair in graph.spouse_pairs()],
+                "statistics": graph.statistics()
+            }
+            if focus_person_id:
+                result["ancestors"] = [
+                    {"id": member_id, "generations_up": depth}
+                    for member_id, depth in graph.ancestors(focus_person_id)
+                ]
+        return result
+    
+    def kinship(self, family_id: str) -> KinshipIndex:
+        """Kinship index of a family (built once per cached family graph)"""
+        graph = self.family_graph(family_id)
+        with graph.lock:
+            return self.kinship_store.get(family_id, graph)
+    
+    def relation(self, family_id: str, person_id: str, relative_id: str) -> Dict[str, Any]:
+        """
+        What one member is to another ("how am I related to X?")
+        
+        Args:
+            family_id: Family of both members
+            person_id: The member asking
+            relative_id: The member asked about
+            
+        Returns:
+            Dictionary with the English "relation", "relation_indonesian",
+            the kind of link and the generations to the common ancestor
+        """
+        index = self.kinship(family_id)
+        with index.graph.lock:
+            return index.relation(person_id, relative_id)
+    
+    def relations_of(self, family_id: str, person_id: str) -> List[Dict[str, Any]]:
+        """Every relative of a member with their relation, closest first"""
+        index = self.kinship(family_id)
+        with index.graph.lock:
+            return index.relations_of(person_id)
+    
+    def sync_family(self, family_id: str, events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Apply row changes to the family's cached graph instead of rebuilding it
+        
+        Args:
+            family_id: Family whose rows changed
+            events: Change events (realtime payloads, see normalize_event);
+                by default the rows edited since the graph's watermark are
+                read back
+            
+        Returns:
+            Dictionary with "cached" (false if the family is not loaded:
+            the next read builds it from scratch) and the counts reported
+            by apply_changes
+        """
+        graph = self.graph_store.get(family_id)
+        if graph is None:
+            return {"family_id": family_id, "cached": False, "applied": 0}
+        if events is None:
+            since = graph.watermark or None
+            events = change_events(self._rows("get_member_changes", family_id, since=since),
+                                   self._rows("get_relationship_changes", family_id, since=since))
+        result = apply_changes(graph, events, self.kinship_store.peek(family_id, graph))
+        if result["applied"]:
+            # Home locations may have changed; the residence index reloads on next use
+            get_geo_index_store().invalidate_residences(family_id)
+        return {"family_id": family_id, "cached": True, **result}
+    
+    def validate_family(self, family_id: str) -> Dict[str, Any]:
+        """
+        Check every relationship of a family (ages, lifetimes, marriages,
+        conflicting links, ancestry cycles) without the LLM
+        
+        Args:
+            family_id: Family to check
+            
+        Returns:
+            Full violation report (see validate_relationships)
+        """
+        report = validate_relationships(
+            self._rows("get_family_members", family_id),
+            self._rows("get_relationships", family_id)
         )
+        report["family_id"] = family_id
+        return report
+    
+    def _rows(self, query_type: str, family_id: str, **params: Any) -> Iterator[Dict[str, Any]]:
+        """Rows of a query, fetched one keyset page at a time (projected columns only)"""
+        return self.db_tool.iter_rows(query_type, {"family_id": family_id, **params})
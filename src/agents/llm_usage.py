@@ -0,0 +1,47 @@
+"""
+LLM Usage - Token accounting for the agents' chat models
+Part of THE BIG FAMILY LEGACY AI Crew
+"""
+
+from typing import Any, Set
+from uuid import UUID
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from ..metrics import record_tokens
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Counts the prompt and completion tokens of one agent's chat model
+
+    Completed calls report usage from the OpenAI response. Streamed calls
+    carry no usage there, so their completion tokens are counted as they
+    arrive (their prompt tokens are not known).
+    """
+
+    def __init__(self, agent: str, model: str):
+        self.agent = agent
+        self.model = model
+        self._streamed: Set[UUID] = set()
+        self._lock = threading.Lock()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._streamed.add(run_id)
+        record_tokens(self.agent, self.model, completion=1)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            streamed = run_id in self._streamed
+            self._streamed.discard(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        record_tokens(self.agent, self.model,
+                      prompt=usage.get("prompt_tokens", 0),
+                      completion=0 if streamed else usage.get("completion_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._streamed.discard(run_id)
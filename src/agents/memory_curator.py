@@ -5,12 +5,19 @@ Part of THE BIG FAMILY LEGACY AI Crew
 
 from crewai import Agent, Task
 from langchain_openai import ChatOpenAI
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 from ..tools.vision_ai import VisionAITool
 from ..tools.face_detection import FaceDetectionTool
 from ..tools.ocr import OCRTool
 from ..tools.exif_extractor import ExifExtractorTool
+from ..tools.image_store import get_image_store
+from ..tools.database_query import DatabaseQueryTool
+from ..tools.geo_index import get_geo_index_store, location_of, PLACE_RADIUS_KM
+from ..tools.duplicate_index import (
+    get_duplicate_index_store, perceptual_hash, hash_to_hex, hash_from_hex, DEFAULT_MAX_DISTANCE
+)
+from .llm_usage import TokenUsageCallback
 
 
 class MemoryCuratorAgent:
@@ -22,6 +29,12 @@ class MemoryCuratorAgent:
     """
     
     def __init__(self, llm_model: str = "gpt-4o", temperature: float = 0.3):
+        # Kept as attributes so workflows can run the tools directly
+        self.vision_tool = VisionAITool()
+        self.face_tool = FaceDetectionTool()
+        self.ocr_tool = OCRTool()
+        self.exif_tool = ExifExtractorTool()
+        
         self.agent = Agent(
             role="Memory & Context Analyst",
             goal="Extract meaningful context and emotions from family photos and stories",
@@ -35,13 +48,169 @@ class MemoryCuratorAgent:
             allow_delegation=False,
             
             tools=[
-                VisionAITool(),
-                FaceDetectionTool(),
-                OCRTool(),
-                ExifExtractorTool()
+                self.vision_tool,
+                self.face_tool,
+                self.ocr_tool,
+                self.exif_tool
             ],
             
-            llm=ChatOpenAI(model=llm_model, temperature=temperature)
+            llm=ChatOpenAI(model=llm_model, temperature=temperature,
+                           callbacks=[TokenUsageCallback("memory_curator", llm_model)])
+        )
+        
+        self.image_store = get_image_store()
+        self.duplicate_index = get_duplicate_index_store()
+        self.geo_index = get_geo_index_store()
+        self.db_tool = DatabaseQueryTool()
+    
+    def find_duplicate_analysis(self, image_url: str, family_id: str,
+                                max_distance: int = DEFAULT_MAX_DISTANCE) -> Dict[str, Any]:
+        """
+        Look for an already analysed near-duplicate of a photo
+        
+        Args:
+            image_url: URL of the uploaded image
+            family_id: Family whose memories are searched
+            max_distance: Perceptual-hash bits two copies may differ by
+            
+        Returns:
+            Dictionary with the upload's "phash" (see save_phash) and, on a
+            match, "duplicate_of", "distance" and its "ai_analysis"
+        """
+        # Hash once per image content; the store caches it next to the image
+        phash_hex = self.image_store.get_derived(
+            image_url, "phash", lambda path: hash_to_hex(perceptual_hash(path)).encode()
+        ).decode()
+        
+        index = self._duplicates(family_id)
+        for memory_id, distance in index.query(hash_from_hex(phash_hex), max_distance):
+            analysis = index.payload(memory_id)
+            if analysis:
+                return {
+                    "phash": phash_hex,
+                    "duplicate_of": memory_id,
+                    "distance": distance,
+                    "ai_analysis": analysis
+                }
+        
+        return {"phash": phash_hex, "duplicate_of": None, "distance": None, "ai_analysis": None}
+    
+    def save_phash(self, family_id: str, memory_id: str, phash_hex: str) -> bool:
+        """
+        Store a memory's perceptual hash in memories.metadata and index it
+        
+        Args:
+            family_id: Family the memory belongs to
+            memory_id: Memory the photo was uploaded as
+            phash_hex: Hash from find_duplicate_analysis
+            
+        Returns:
+            False if the hash could not be written (it is still indexed
+            until the family's index is rebuilt)
+        """
+        index = self._duplicates(family_id)
+        index.add(memory_id, hash_from_hex(phash_hex), index.payload(memory_id))
+        try:
+            self.db_tool.update_memory_metadata(memory_id, {"phash": phash_hex})
+            return True
+        except Exception:
+            return False
+    
+    def remember_analysis(self, family_id: str, memory_id: str, phash_hex: str,
+                          ai_analysis: Optional[Dict[str, Any]]) -> bool:
+        """
+        Store a newly analysed memory's analysis in memories.ai_analysis
+        and make it available for reuse by later uploads
+
+        Returns:
+            False if the analysis could not be written (it is still
+            indexed until the family's index is rebuilt)
+        """
+        self._duplicates(family_id).add(memory_id, hash_from_hex(phash_hex), ai_analysis)
+        if not ai_analysis:
+            return False
+        try:
+            self.db_tool.update_memory_analysis(memory_id, ai_analysis)
+            return True
+        except Exception:
+            return False
+    
+    def create_dedup_report(self, family_id: str,
+                            max_distance: int = DEFAULT_MAX_DISTANCE) -> Dict[str, Any]:
+        """
+        Near-duplicate groups among a family's memories
+        
+        Args:
+            family_id: Family to report on (index built from the hashes
+                stored in its memories rows)
+            max_distance: Perceptual-hash bits two copies may differ by
+            
+        Returns:
+            Report with duplicate groups and the number of redundant memories
+        """
+        return self.duplicate_index.report(
+            family_id, max_distance,
+            lambda: self.db_tool.iter_rows("get_memory_hashes", {"family_id": family_id})
+        )
+    
+    def memories_near(self, family_id: str, latitude: float, longitude: float,
+                      radius_km: float = 2.0) -> List[Dict[str, Any]]:
+        """
+        Memories taken within radius_km of a place ("photos near this village")
+        
+        Args:
+            family_id: Family whose memories are searched
+            latitude: Latitude of the place
+            longitude: Longitude of the place
+            radius_km: Search radius
+            
+        Returns:
+            {"memory_id", "distance_km"} entries, nearest first
+        """
+        index = self._memory_locations(family_id)
+        return [{"memory_id": memory_id, "distance_km": distance}
+                for memory_id, distance in index.within(latitude, longitude, radius_km)]
+    
+    def memory_places(self, family_id: str, radius_km: float = PLACE_RADIUS_KM,
+                      min_memories: int = 2) -> List[Dict[str, Any]]:
+        """Places where several of a family's memories were taken, largest first"""
+        places = self._memory_locations(family_id).clusters(radius_km, min_memories)
+        for place in places:
+            place["memory_ids"] = place.pop("keys")
+        return places
+    
+    def remember_location(self, family_id: str, memory_id: str, gps_info: Optional[Dict[str, Any]]) -> bool:
+        """
+        Store a newly analysed memory's coordinates in memories.metadata
+        and add them to the family's geo index
+        
+        Returns:
+            False if there were no coordinates or they could not be
+            written (they are still indexed until the index is rebuilt)
+        """
+        location = location_of(gps_info)
+        if location is None:
+            return False
+        self.geo_index.add_memory(family_id, memory_id, *location)
+        latitude, longitude = location
+        try:
+            self.db_tool.update_memory_metadata(memory_id, {"gps": {"latitude": latitude, "longitude": longitude}})
+            return True
+        except Exception:
+            return False
+    
+    def sync_face_tags(self, family_id: str, events: List[Dict[str, Any]]) -> int:
+        """Apply memory_people changes (faces tagged or untagged) to the family's face index"""
+        return self.face_tool.face_index_store.apply_tag_events(family_id, events)
+    
+    def _duplicates(self, family_id: str):
+        return self.duplicate_index.get(
+            family_id, lambda: self.db_tool.iter_rows("get_memory_hashes", {"family_id": family_id})
+        )
+    
+    def _memory_locations(self, family_id: str):
+        return self.geo_index.memories(
+            family_id, lambda: self.db_tool.iter_rows("get_memory_locations", {"family_id": family_id})
         )
     
     def create_analyze_photo_task(self, image_url: str, user_description: str = "") -> Task:
@@ -89,33 +258,44 @@ class MemoryCuratorAgent:
             agent=self.agent
         )
     
-    def create_detect_faces_task(self, image_url: str, family_members: List[Dict]) -> Task:
+    def create_detect_faces_task(self, image_url: str, family_members: List[Dict],
+                                 family_id: str = "") -> Task:
         """
         Create face detection and identification task
         
         Args:
             image_url: URL of the image
             family_members: List of known family members with photos
+            family_id: Family whose tagged faces the face index matches against
             
         Returns:
             Task object for CrewAI execution
         """
         family_members_str = "\n".join([
-            f"- {member['name']} (born: {member.get('birth_date', 'unknown')})"
+            f"- {member['name']} (id: {member.get('id', 'unknown')}, "
+            f"born: {member.get('birth_date', 'unknown')})"
             for member in family_members
         ])
         
         return Task(
             description=f"""Use face detection to find all faces in the image:
             Image URL: {image_url}
+            Family ID: {family_id}
             Known family members:
             {family_members_str}
             
+            Call the face_detection tool with the image URL and the family ID.
+            It returns bounding boxes and, per face, "suggested_matches"
+            (family member ids with embedding similarity scores) computed
+            from the family's tagged faces.
+            
             For each detected face:
-            1. Extract bounding box coordinates
+            1. Keep the bounding box coordinates from the tool
             2. Estimate age group (child, teen, adult, elderly)
             3. Gender (if visually apparent)
-            4. Suggest possible matches from family members
+            4. Report the tool's suggested matches with the member's name;
+               use the similarity as confidence and do not guess matches
+               the tool did not return
             5. Confidence score for each suggestion
             
             Return JSON format:
@@ -127,7 +307,7 @@ class MemoryCuratorAgent:
                         "age_group": "...",
                         "gender": "...",
                         "suggested_matches": [
-                            {{"name": "...", "confidence": 0.0-1.0, "reasoning": "..."}}
+                            {{"family_member_id": "...", "name": "...", "confidence": 0.0-1.0, "reasoning": "..."}}
                         ]
                     }}
                 ],
@@ -0,0 +1,150 @@
+"""
+Privacy Decision Engine - Tiered privacy check in front of the Privacy Guard LLM
+Part of THE BIG FAMILY LEGACY AI Crew
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional
+import copy
+import hashlib
+import re
+import threading
+
+from ..tools.pii_scanner import scan_spans, highest_risk, RISK_ORDER
+
+# Sensitive topics the regex rules cannot judge on their own (health,
+# finances, identity documents, exact coordinates). Text mentioning any
+# of them is ambiguous and goes to the LLM.
+SENSITIVE_HINTS = re.compile(
+    r"\b(?:"
+    r"sakit|penyakit|diagnos\w*|kanker|cancer|diabetes|stroke|hiv|aids|"
+    r"hospital|rumah\s+sakit|operasi|surgery|medical|medis|obat|therapy|terapi|"
+    r"rekening|account\s+number|gaji|salary|income|penghasilan|hutang|debt|npwp|"
+    r"passport|paspor|ssn|nik|"
+    r"gps|latitude|longitude"
+    r")\b"
+    r"|-?\d{1,3}\.\d{4,}\s*,\s*-?\d{1,3}\.\d{4,}",
+    re.IGNORECASE
+)
+
+DEFAULT_CACHE_SIZE = 4096
+TIERS = ("empty", "cache", "rules_clean", "rules_blocked", "llm", "llm_failed")
+
+
+def content_hash(text: str) -> str:
+    """Stable cache key for a piece of text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PrivacyDecisionEngine:
+    """
+    Tiered privacy decision engine
+
+    The rule scanner settles clear-cut text within microseconds: empty or
+    clean text is approved, text at or above block_level is rejected.
+    Only ambiguous text reaches the LLM check. Verdicts are cached by
+    content hash with LRU eviction. An LLM check that raises (no answer,
+    or one that cannot be parsed) fails closed and is not cached, so the
+    text is checked again next time.
+    """
+
+    def __init__(self, llm_check: Callable[[str], Dict[str, Any]],
+                 block_level: str = "high", cache_size: int = DEFAULT_CACHE_SIZE):
+        self.llm_check = llm_check
+        self.block_rank = RISK_ORDER[block_level]
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._counts = {tier: 0 for tier in TIERS}
+        self._lock = threading.Lock()
+
+    def check(self, text: Optional[str]) -> Dict[str, Any]:
+        """
+        Decide whether text is safe to process
+
+        Args:
+            text: Family data to check
+
+        Returns:
+            Verdict in the create_privacy_check_task JSON format, plus the
+            tier that decided it under "decided_by" (a copy the caller
+            may modify)
+        """
+        if not text or not text.strip():
+            self._count("empty")
+            return self._verdict(True, [], "none", "empty")
+
+        key = content_hash(text)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._counts["cache"] += 1
+        if cached is not None:
+            verdict = copy.deepcopy(cached)
+            verdict["decided_by"] = "cache"
+            return verdict
+
+        spans = scan_spans(text)
+        risk_level = highest_risk(spans)
+        pii_detected = [{"type": span.type, "start": span.start, "end": span.end} for span in spans]
+
+        if RISK_ORDER[risk_level] >= self.block_rank:
+            verdict = self._verdict(False, pii_detected, risk_level, "rules_blocked")
+        elif not spans and not SENSITIVE_HINTS.search(text):
+            verdict = self._verdict(True, [], "none", "rules_clean")
+        else:
+            try:
+                verdict = dict(self.llm_check(text), decided_by="llm")
+            except Exception:
+                verdict = self._verdict(False, pii_detected, "unknown", "llm_failed")
+                verdict["redaction_needed"] = True
+                verdict["recommendations"].append("Manual privacy review required")
+
+        self._count(verdict["decided_by"])
+        if verdict["decided_by"] != "llm_failed":
+            self._remember(key, verdict)
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        """How often each tier decided, and the share that avoided the LLM"""
+        with self._lock:
+            counts = dict(self._counts)
+            cache_entries = len(self._cache)
+        total = sum(counts.values())
+        return {
+            "decisions": counts,
+            "total": total,
+            "llm_ratio": (counts["llm"] + counts["llm_failed"]) / total if total else 0.0,
+            "cache_entries": cache_entries
+        }
+
+    def clear_cache(self) -> None:
+        """Forget all cached verdicts"""
+        with self._lock:
+            self._cache.clear()
+
+    def _count(self, tier: str) -> None:
+        with self._lock:
+            self._counts[tier] += 1
+
+    def _remember(self, key: str, verdict: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[key] = copy.deepcopy(verdict)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _verdict(is_safe: bool, pii_detected: List[Dict], risk_level: str,
+                 decided_by: str) -> Dict[str, Any]:
+        recommendations = []
+        if pii_detected:
+            recommendations.append("Redact detected PII before processing")
+        return {
+            "is_safe": is_safe,
+            "pii_detected": pii_detected,
+            "risk_level": risk_level,
+            "redaction_needed": bool(pii_detected),
+            "recommendations": recommendations,
+            "decided_by": decided_by
+        }
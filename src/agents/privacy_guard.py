@@ -5,12 +5,18 @@ Part of THE BIG FAMILY LEGACY AI Crew
 
 from crewai import Agent, Task
 from langchain_openai import ChatOpenAI
-from typing import Dict, List, Any
-import re
+from typing import Dict, List, Any, Optional
+import json
 
 from ..tools.pii_detection import PIIDetectionTool
+from ..tools.pii_scanner import COMPILED_RULES, scan_spans
 from ..tools.data_redaction import DataRedactionTool
 from ..tools.compliance_check import ComplianceCheckTool
+from ..tools.database_query import DatabaseQueryTool
+from ..tools.geo_index import get_geo_index_store, location_of, PRIVATE_RADIUS_KM
+from .privacy_decision import PrivacyDecisionEngine
+from .llm_usage import TokenUsageCallback
+from ..metrics import track_task
 
 
 class PrivacyGuardAgent:
@@ -40,8 +46,79 @@ class PrivacyGuardAgent:
                 ComplianceCheckTool()
             ],
             
-            llm=ChatOpenAI(model=llm_model, temperature=temperature)
+            llm=ChatOpenAI(model=llm_model, temperature=temperature,
+                           callbacks=[TokenUsageCallback("privacy_guard", llm_model)])
         )
+        
+        # Rules settle clean and critical text; only ambiguous text hits the LLM
+        self.decision_engine = PrivacyDecisionEngine(self._llm_privacy_check)
+        self.geo_index = get_geo_index_store()
+        self.db_tool = DatabaseQueryTool()
+    
+    def check_privacy(self, input_data: str) -> Dict[str, Any]:
+        """
+        Decide whether family data is safe to process
+        
+        Args:
+            input_data: Family data to check for sensitive information
+            
+        Returns:
+            Privacy verdict (is_safe, pii_detected, risk_level, ...) and the
+            tier that decided it ("decided_by")
+        """
+        return self.decision_engine.check(input_data)
+    
+    def check_location(self, family_id: str, gps_info: Optional[Dict[str, Any]],
+                       radius_km: float = PRIVATE_RADIUS_KM) -> Dict[str, Any]:
+        """
+        Flag photo coordinates that reveal a family member's home
+        
+        Args:
+            family_id: Family whose private residences are checked (indexed
+                from its members' home_location on first use)
+            gps_info: Coordinates from ExifExtractorTool ("latitude", "longitude")
+            radius_km: Distance from a residence that counts as revealing it
+            
+        Returns:
+            Dictionary with is_private and, when flagged, the member whose
+            residence is near and the distance
+        """
+        location = location_of(gps_info)
+        if location is None:
+            residence = None
+        else:
+            residence = self.geo_index.private_residence_near(
+                family_id, *location, radius_km,
+                load=lambda: self.db_tool.iter_rows("get_member_residences", {"family_id": family_id})
+            )
+        if residence is None:
+            return {"is_private": False, "near_residence_of": None, "distance_km": None, "recommendations": []}
+        
+        member_id, distance_km = residence
+        return {
+            "is_private": True,
+            "near_residence_of": member_id,
+            "distance_km": distance_km,
+            "recommendations": ["Strip GPS coordinates before sharing outside the family"]
+        }
+    
+    def _llm_privacy_check(self, input_data: str) -> Dict[str, Any]:
+        """
+        Run the privacy check task and parse its JSON verdict
+        
+        Raises ValueError on an answer without a verdict; the decision
+        engine then fails closed without caching it.
+        """
+        with track_task("privacy_guard", "privacy_check"):
+            result = str(self.create_privacy_check_task(input_data).execute())
+        verdict = json.loads(result[result.find("{"):result.rfind("}") + 1])
+        if not isinstance(verdict, dict) or not isinstance(verdict.get("is_safe"), bool):
+            raise ValueError("Privacy check answer has no is_safe verdict")
+        
+        verdict.setdefault("pii_detected", [])
+        verdict.setdefault("redaction_needed", not verdict.get("is_safe", False))
+        verdict.setdefault("recommendations", [])
+        return verdict
     
     def create_privacy_check_task(self, input_data: str) -> Task:
         """
@@ -120,20 +197,17 @@ class PrivacyGuardAgent:
 # Utility functions for quick PII detection
 def detect_indonesian_ktp(text: str) -> List[str]:
     """Detect Indonesian KTP (ID card) numbers"""
-    pattern = r'\b\d{16}\b'
-    return re.findall(pattern, text)
+    return COMPILED_RULES["ktp_number"].findall(text)
 
 
 def detect_phone_numbers(text: str) -> List[str]:
     """Detect phone numbers"""
-    pattern = r'\+?[\d\s\-\(\)]{10,}'
-    return re.findall(pattern, text)
+    return COMPILED_RULES["phone_number"].findall(text)
 
 
 def detect_email_addresses(text: str) -> List[str]:
     """Detect email addresses"""
-    pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    return re.findall(pattern, text)
+    return COMPILED_RULES["email_address"].findall(text)
 
 
 def quick_pii_scan(text: str) -> Dict[str, Any]:
@@ -146,13 +220,14 @@ def quick_pii_scan(text: str) -> Dict[str, Any]:
     Returns:
         Dictionary with detected PII
     """
+    found = {"ktp_number": [], "phone_number": [], "email_address": []}
+    for span in scan_spans(text):
+        if span.type in found:
+            found[span.type].append(span.value)
+    
     return {
-        "ktp_numbers": detect_indonesian_ktp(text),
-        "phone_numbers": detect_phone_numbers(text),
-        "email_addresses": detect_email_addresses(text),
-        "has_pii": any([
-            detect_indonesian_ktp(text),
-            detect_phone_numbers(text),
-            detect_email_addresses(text)
-        ])
+        "ktp_numbers": found["ktp_number"],
+        "phone_numbers": found["phone_number"],
+        "email_addresses": found["email_address"],
+        "has_pii": any(found.values())
     }
@@ -0,0 +1,143 @@
+"""
+Story Review - Incremental privacy review of generated stories
+Part of THE BIG FAMILY LEGACY AI Crew
+"""
+
+from typing import Any, Dict, List
+import re
+
+from ..tools.pii_scanner import scan_spans
+from ..tools.redaction_engine import merge_spans, redact_range
+from .privacy_decision import PrivacyDecisionEngine, SENSITIVE_HINTS
+
+# A blank line ends a paragraph; sentence ends and line breaks are the
+# points at which reviewed text can be released inside one (not a line
+# break after a digit, which may be the middle of a phone number)
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+RELEASE_POINT = re.compile(r"[.!?][\"')\]]*\s+|(?<!\d)\n")
+
+WITHHELD_REASON = "Sensitive content removed by privacy review"
+
+
+class StoryReviewer:
+    """
+    Paragraph-by-paragraph privacy review of text as it is generated
+
+    Text is fed in as the LLM produces it. Inside a paragraph, every
+    complete sentence is released at once with its PII redacted, as long
+    as the paragraph so far mentions no sensitive topic: that is exactly
+    what the decision engine's rules tier approves without the LLM. Once a
+    sensitive topic appears, the rest of the paragraph is held until it is
+    complete and the whole (redacted) paragraph goes to the decision
+    engine; if that rejects it, the paragraph is withheld and clients drop
+    the sentences they already received.
+
+    feed() and close() return events:
+        {"event": "delta", "paragraph": i, "text": ...}  reviewed text
+        {"event": "paragraph", "paragraph": i, "status": "released" | "withheld", ...}
+
+    The text of the deltas of released paragraphs, joined, is exactly
+    final_text: whitespace after a sentence is only released with the
+    next one, and a paragraph's first delta starts with the blank line
+    that separates it from the previous released paragraph.
+    """
+
+    def __init__(self, decision_engine: PrivacyDecisionEngine):
+        self.decision_engine = decision_engine
+        self.paragraphs: List[str] = []
+        self.withheld: List[int] = []
+        self._draft: List[str] = []
+        self._buffer = ""
+        self._released = 0
+        self._held = False
+        self._separated = False
+
+    @property
+    def draft(self) -> str:
+        """Everything fed in so far, unreviewed"""
+        return "".join(self._draft)
+
+    @property
+    def final_text(self) -> str:
+        """The released paragraphs, redacted"""
+        return "\n\n".join(self.paragraphs)
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add generated text; returns the events it releases"""
+        if not text:
+            return []
+        self._draft.append(text)
+        self._buffer += text
+        if not self._released:
+            self._buffer = self._buffer.lstrip()
+
+        events = []
+        while True:
+            match = PARAGRAPH_BREAK.search(self._buffer)
+            if match is None:
+                break
+            rest = self._buffer[match.end():]
+            self._buffer = self._buffer[:match.start()]
+            events.extend(self._finish_paragraph())
+            self._buffer = rest.lstrip()
+
+        if not self._held and SENSITIVE_HINTS.search(self._buffer):
+            self._held = True
+        if not self._held:
+            events.extend(self._release_sentences())
+        return events
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Review the last paragraph once generation has finished"""
+        return self._finish_paragraph()
+
+    def _release_sentences(self) -> List[Dict[str, Any]]:
+        spans = scan_spans(self._buffer)
+        cut = None
+        for match in RELEASE_POINT.finditer(self._buffer, self._released):
+            # Up to the sentence end; the whitespace after it goes with the next one
+            end = len(self._buffer[:match.end()].rstrip())
+            # Never cut through PII; the rest of it may still be coming
+            if end > self._released and not any(span.start < end < span.end for span in spans):
+                cut = end
+        if cut is None:
+            return []
+        text = redact_range(self._buffer, merge_spans(spans), self._released, cut)
+        self._released = cut
+        return [self._delta(text)] if text else []
+
+    def _finish_paragraph(self) -> List[Dict[str, Any]]:
+        paragraph = self._buffer.rstrip()
+        released, separated = self._released, self._separated
+        held = self._held or bool(SENSITIVE_HINTS.search(paragraph))
+        self._buffer, self._released, self._held, self._separated = "", 0, False, False
+        if not paragraph.strip():
+            return []
+
+        index = len(self.paragraphs) + len(self.withheld)
+        regions = merge_spans(scan_spans(paragraph))
+        redacted = redact_range(paragraph, regions, 0, len(paragraph))
+        if held:
+            # Judged on the redacted text: only the topic is left to decide
+            verdict = self.decision_engine.check(redacted)
+            if not verdict.get("is_safe", False):
+                self.withheld.append(index)
+                return [{"event": "paragraph", "paragraph": index, "status": "withheld",
+                         "reason": WITHHELD_REASON}]
+
+        events = []
+        rest = redact_range(paragraph, regions, released, len(paragraph)) if released < len(paragraph) else ""
+        if rest:
+            if not separated and self.paragraphs:
+                rest = "\n\n" + rest
+            events.append({"event": "delta", "paragraph": index, "text": rest})
+        self.paragraphs.append(redacted)
+        events.append({"event": "paragraph", "paragraph": index, "status": "released"})
+        return events
+
+    def _delta(self, text: str) -> Dict[str, Any]:
+        if not self._separated:
+            self._separated = True
+            if self.paragraphs:
+                text = "\n\n" + text
+        return {"event": "delta", "paragraph": len(self.paragraphs) + len(self.withheld), "text": text}
@@ -3,13 +3,22 @@ THE BIG FAMILY LEGACY - AI Agents API
 FastAPI application for AI processing workflows
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
+import asyncio
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from .metrics import render_metrics
+from .registry import get_registry, MEMORY_WORKFLOW, STORY_WORKFLOW
+from .tools.pii_batch import scan_batch
+
 # Load environment variables
 load_dotenv()
 
@@ -34,6 +43,7 @@ class MemoryAnalysisRequest(BaseModel):
     memory_id: str
     image_url: str
     user_description: Optional[str] = ""
+    family_id: Optional[str] = None
 
 class StoryGenerationRequest(BaseModel):
     person_id: str
@@ -41,6 +51,15 @@ class StoryGenerationRequest(BaseModel):
     tone: str = "emotional"
     length: str = "medium"
 
+class PrivacyScanBatchRequest(BaseModel):
+    texts: List[str]
+
+class FamilyChangesRequest(BaseModel):
+    events: Optional[List[Dict[str, Any]]] = None
+
+class FaceTagChangesRequest(BaseModel):
+    events: List[Dict[str, Any]]
+
 # Response models
 class MemoryAnalysisResponse(BaseModel):
     success: bool
@@ -55,6 +74,24 @@ class StoryGenerationResponse(BaseModel):
     story_content: str
     generation_time_ms: int
 
+class JobResponse(BaseModel):
+    success: bool
+    job_id: str
+    workflow: str
+    status: str
+    attempts: int = 0
+    error: Optional[str] = None
+    next_nodes: List[str] = []
+    step: Optional[int] = None
+    result: Optional[Dict[str, Any]] = None
+
+class PrivacyScanBatchResponse(BaseModel):
+    success: bool
+    count: int
+    texts: Dict[str, List[Any]]
+    spans: Dict[str, List[Any]]
+    scan_time_ms: int
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -62,27 +99,46 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "ai-agents",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "components_ready": len(get_registry().status()["components"])
     }
 
+# Prometheus metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Latency histograms and counters in the Prometheus text format
+    - Per workflow node, agent task and tool call (workflow/node/tool labels)
+    - Errors, bytes downloaded and LLM tokens
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Memory analysis endpoint
 @app.post("/api/v1/analyze-memory", response_model=MemoryAnalysisResponse)
 async def analyze_memory(request: MemoryAnalysisRequest):
     """
     Analyze uploaded memory (photo) with AI
     - Privacy check
-    - Vision AI captioning
-    - Face detection
+    - Vision AI captioning, face detection, EXIF and OCR in parallel
+    - Reuse of the analysis of a near-duplicate upload
     """
     try:
-        # TODO: Implement actual workflow
-        # For now, return placeholder
+        initial_state = {
+            "memory_id": request.memory_id,
+            "family_id": request.family_id,
+            "image_url": request.image_url,
+            "user_description": request.user_description or ""
+        }
+        loop = asyncio.get_running_loop()
+        # The first call may still be building the workflow; keep it off the event loop
+        state = await loop.run_in_executor(None, lambda: get_registry().memory_workflow().invoke(initial_state))
+        output = state.get("final_output") or {}
         return MemoryAnalysisResponse(
             success=True,
             memory_id=request.memory_id,
-            ai_caption="A joyful family gathering with smiling faces",
-            detected_faces=[],
-            privacy_approved=True
+            ai_caption=output.get("caption", ""),
+            detected_faces=output.get("faces", []),
+            privacy_approved=state["privacy_approved"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -109,6 +165,294 @@ async def generate_story(request: StoryGenerationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# A running job not updated for this long is taken as interrupted
+JOB_STALE_SECONDS = 600
+
+# State keys returned as the result of a completed job
+JOB_RESULT_KEYS = {
+    MEMORY_WORKFLOW: ("final_output",),
+    STORY_WORKFLOW: ("final_story", "withheld_paragraphs")
+}
+
+def job_response(runner, job_id: str) -> JobResponse:
+    status = runner.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    state = status["state"] or {}
+    result = {key: state.get(key) for key in JOB_RESULT_KEYS[runner.name]} if status["state"] else None
+    return JobResponse(
+        success=status["status"] != "failed",
+        job_id=job_id,
+        workflow=status["workflow"],
+        status=status["status"],
+        attempts=status["attempts"],
+        error=status["error"],
+        next_nodes=status["next_nodes"],
+        step=status["step"],
+        result=result
+    )
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """One Server-Sent Event: the "event" key names it, the rest is its JSON data"""
+    data = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming story generation endpoint
+@app.post("/api/v1/generate-story/stream")
+async def generate_story_stream(request: StoryGenerationRequest):
+    """
+    Generate AI story for family member, streamed as Server-Sent Events
+    - start: sent as soon as the request is accepted
+    - delta: privacy-reviewed story text, sentence by sentence
+    - paragraph: a paragraph is complete; "withheld" means the privacy
+      review removed it and its deltas must be dropped
+    - done: final story (the kept deltas joined) and generation time (or error)
+    """
+    state = {"person_id": request.person_id, "tone": request.tone, "memories": []}
+
+    def events() -> Iterator[str]:
+        # Runs in the threadpool; the comment line flushes the headers at once
+        yield ": stream open\n\n"
+        try:
+            run = get_registry().story_stream()
+        except Exception as e:
+            yield format_sse({"event": "error", "error": str(e)})
+            return
+        for event in run(state):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Durable workflow jobs (plain functions: FastAPI runs them in its threadpool,
+# so a first call building the runner does not block the event loop)
+@app.post("/api/v1/jobs/analyze-memory", response_model=JobResponse)
+def submit_memory_job(request: MemoryAnalysisRequest, background_tasks: BackgroundTasks):
+    """
+    Analyze a memory as a background job
+    - Returns a job ID at once; poll GET /api/v1/jobs/{job_id}
+    - State is checkpointed after every node
+    """
+    try:
+        runner = get_registry().runner(MEMORY_WORKFLOW)
+        job_id = runner.submit()
+        background_tasks.add_task(runner.run, job_id, {
+            "memory_id": request.memory_id,
+            "family_id": request.family_id,
+            "image_url": request.image_url,
+            "user_description": request.user_description or ""
+        })
+        return job_response(runner, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/jobs/generate-story", response_model=JobResponse)
+def submit_story_job(request: StoryGenerationRequest, background_tasks: BackgroundTasks):
+    """
+    Generate a story as a background job
+    - Returns a job ID at once; poll GET /api/v1/jobs/{job_id}
+    - A failed write_story is retried without gathering context again
+    """
+    try:
+        runner = get_registry().runner(STORY_WORKFLOW)
+        job_id = runner.submit()
+        background_tasks.add_task(runner.run, job_id, {
+            "person_id": request.person_id,
+            "tone": request.tone,
+            "memories": []
+        })
+        return job_response(runner, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _runner_of(job_id: str):
+    job = get_registry().job_store().get(job_id)
+    if job is None or job["workflow"] not in JOB_RESULT_KEYS:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return get_registry().runner(job["workflow"])
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    """Status, progress and (once completed) result of a workflow job"""
+    return job_response(_runner_of(job_id), job_id)
+
+@app.post("/api/v1/jobs/{job_id}/resume", response_model=JobResponse)
+def resume_job(job_id: str, background_tasks: BackgroundTasks):
+    """
+    Resume a failed or interrupted job
+    - Continues from the last completed node; finished nodes are not rerun
+    """
+    runner = _runner_of(job_id)
+    job = runner.jobs.get(job_id)
+    if job["status"] in ("pending", "running") and job["updated_at"] > time.time() - JOB_STALE_SECONDS:
+        raise HTTPException(status_code=409, detail="Job is still running")
+    if not runner.can_resume(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; nothing left to resume")
+    background_tasks.add_task(runner.resume, job_id)
+    return job_response(runner, job_id)
+
+# Family tree endpoint (plain function: loading a large family runs in the threadpool)
+@app.get("/api/v1/families/{family_id}/tree")
+def family_tree(family_id: str, focus_person_id: Optional[str] = None, refresh: bool = False):
+    """
+    Family tree for D3 (d3.hierarchy), built from the database rows
+    - Deterministic: no LLM, the same rows always give the same tree
+    - The family graph is cached (and kept current by /changes); refresh=true reloads it
+    - The tree JSON is written directly, not re-serialised per member
+    """
+    try:
+        graph = get_registry().genealogist_agent().family_graph(family_id, refresh=refresh)
+        with graph.lock:
+            tree = graph.d3_json(focus_person_id)
+            summary = {
+                "family_id": family_id,
+                "focus_person_id": focus_person_id,
+                "sibling_groups": graph.sibling_groups(),
+                "spouses": [list(pair) for pair in graph.spouse_pairs()],
+                "statistics": graph.statistics()
+            }
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(content=json.dumps(summary)[:-1] + ', "tree": ' + tree + "}",
+                    media_type="application/json")
+
+# Kinship endpoints
+@app.get("/api/v1/families/{family_id}/kinship")
+def kinship(family_id: str, person_id: str, relative_id: str):
+    """
+    How relative_id is related to person_id
+    - Named relation in English and Indonesian ("second cousin once removed", "sepupu dua kali")
+    - Blood, half-blood, in-law and step relations
+    - Answered from precomputed ancestor tables, no LLM
+    """
+    try:
+        return get_registry().genealogist_agent().relation(family_id, person_id, relative_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/families/{family_id}/members/{person_id}/relations")
+def member_relations(family_id: str, person_id: str):
+    """Every relative of a member with their relation, closest first"""
+    try:
+        relations = get_registry().genealogist_agent().relations_of(family_id, person_id)
+        return {"family_id": family_id, "person_id": person_id, "count": len(relations),
+                "relations": relations}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Family change feed endpoint
+@app.post("/api/v1/families/{family_id}/changes")
+def family_changes(family_id: str, request: FamilyChangesRequest):
+    """
+    Apply family_members / relationships changes to the cached family graph
+    - events: realtime payloads ({"table", "eventType", "new", "old"})
+    - Without events, rows edited since the graph's watermark are read back
+    - Only members below an edit are recomputed; no rebuild
+    """
+    try:
+        return get_registry().genealogist_agent().sync_family(family_id, request.events)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Face tag change endpoint
+@app.post("/api/v1/families/{family_id}/face-tags")
+def face_tag_changes(family_id: str, request: FaceTagChangesRequest):
+    """
+    Apply memory_people changes to the family's face index
+    - events: realtime payloads ({"table": "memory_people", "eventType", "new", "old"})
+    - Tagged faces with an embedding are suggested for new photos at once
+    - Families not loaded yet read their tags from the database on first use
+    """
+    try:
+        applied = get_registry().curator_agent().sync_face_tags(family_id, request.events)
+        return {"family_id": family_id, "applied": applied}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Memory location endpoints
+@app.get("/api/v1/families/{family_id}/memories/nearby")
+def memories_nearby(family_id: str, latitude: float, longitude: float, radius_km: float = 2.0):
+    """
+    Memories taken within radius_km of a place
+    - Grid index over memories.metadata.gps, built per family on first use
+    - Nearest first, with the distance in km
+    """
+    try:
+        memories = get_registry().curator_agent().memories_near(family_id, latitude, longitude, radius_km)
+        return {"family_id": family_id, "count": len(memories), "memories": memories}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/v1/families/{family_id}/memories/places")
+def memory_places(family_id: str, radius_km: float = 0.3, min_memories: int = 2):
+    """
+    Places where several of a family's memories were taken
+    - Memories closer than radius_km are linked into one place
+    - Each place has its memory IDs, centre and radius, largest first
+    """
+    try:
+        places = get_registry().curator_agent().memory_places(family_id, radius_km, min_memories)
+        return {"family_id": family_id, "count": len(places), "places": places}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Family validation endpoint
+@app.get("/api/v1/families/{family_id}/validation")
+def validate_family(family_id: str):
+    """
+    Check every relationship of a family at once
+    - Parent/child ages, lifetimes and marriage dates as array operations
+    - Ancestry cycles found in linear time
+    - Full report of violations, not just the first one
+    """
+    try:
+        return get_registry().genealogist_agent().validate_family(family_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batch privacy scan endpoint
+@app.post("/api/v1/privacy/scan-batch", response_model=PrivacyScanBatchResponse)
+async def privacy_scan_batch(request: PrivacyScanBatchRequest):
+    """
+    Scan many texts for PII (backfills of memories and stories)
+    - Rule-based scan, no LLM
+    - Spread across a process pool sized to the available cores
+    - Columnar results: one row per text, one row per detected item
+    """
+    try:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, scan_batch, request.texts)
+        return PrivacyScanBatchResponse(
+            success=True,
+            count=result["count"],
+            texts=result["texts"],
+            spans=result["spans"],
+            scan_time_ms=int((time.perf_counter() - started) * 1000)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.on_event("startup")
+async def warm_registry():
+    """Build agents and workflows in the background; /health answers meanwhile"""
+    if os.getenv("PRELOAD_WORKFLOWS", "true").lower() != "false":
+        threading.Thread(target=get_registry().warm, name="registry-warm", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_scan_pool():
+    """Release the PII scan and OCR worker processes"""
+    get_registry().shutdown()
+
 # Debug endpoint
 @app.get("/api/v1/debug")
 async def debug_info():
@@ -0,0 +1,232 @@
+"""
+Metrics - Latency histograms and counters for workflows, agents and tools
+Rendered in the Prometheus text format on /metrics. The workflow, node and
+tool being run are kept in context variables, so metrics recorded deep
+inside a call (bytes downloaded, LLM tokens) carry them as labels too.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Tuple
+import functools
+import threading
+import time
+
+# Seconds; from a rule-based privacy check up to a slow OCR document
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTEXT_LABELS = ("workflow", "node", "tool")
+
+_context: ContextVar[Mapping[str, str]] = ContextVar("bfl_metric_labels", default={})
+
+
+def current_labels() -> Mapping[str, str]:
+    """Labels of the workflow node / tool currently running"""
+    return _context.get()
+
+
+@contextmanager
+def scope(**labels: str) -> Iterator[None]:
+    """Run a block under extra context labels"""
+    token = _context.set({**_context.get(), **labels})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        context = _context.get()
+        return tuple(str(labels.get(name, context.get(name, ""))) for name in self.labelnames)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = CONTEXT_LABELS):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._label_text(key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = CONTEXT_LABELS,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = super().render()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{self._label_text(key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+NODE_SECONDS = Histogram("bfl_node_duration_seconds", "Time spent in a workflow node", ("workflow", "node"))
+NODE_ERRORS = Counter("bfl_node_errors_total", "Workflow nodes that raised", ("workflow", "node"))
+TOOL_SECONDS = Histogram("bfl_tool_duration_seconds", "Time spent in a tool call")
+TOOL_ERRORS = Counter("bfl_tool_errors_total", "Tool calls that raised or returned success=False")
+TASK_SECONDS = Histogram("bfl_agent_task_duration_seconds", "Time spent in an agent task",
+                         ("workflow", "node", "agent", "task"))
+TASK_ERRORS = Counter("bfl_agent_task_errors_total", "Agent tasks that raised",
+                      ("workflow", "node", "agent", "task"))
+BYTES_DOWNLOADED = Counter("bfl_bytes_downloaded_total", "Bytes fetched from remote URLs",
+                           CONTEXT_LABELS + ("source",))
+LLM_TOKENS = Counter("bfl_llm_tokens_total", "LLM tokens sent (prompt) and received (completion)",
+                     ("workflow", "node", "agent", "model", "direction"))
+
+METRICS = (NODE_SECONDS, NODE_ERRORS, TOOL_SECONDS, TOOL_ERRORS, TASK_SECONDS, TASK_ERRORS,
+           BYTES_DOWNLOADED, LLM_TOKENS)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_node(workflow: str, node: str, function: Callable) -> Callable:
+    """Graph node recording its latency and errors, run under its labels"""
+    @functools.wraps(function)
+    def wrapper(state):
+        with scope(workflow=workflow, node=node):
+            started = time.perf_counter()
+            try:
+                return function(state)
+            except Exception:
+                NODE_ERRORS.inc()
+                raise
+            finally:
+                NODE_SECONDS.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_tool(run: Callable) -> Callable:
+    """Decorator for BaseTool._run: latency and errors under the tool's name"""
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        with scope(tool=self.name):
+            started = time.perf_counter()
+            try:
+                result = run(self, *args, **kwargs)
+            except Exception:
+                TOOL_ERRORS.inc()
+                raise
+            finally:
+                TOOL_SECONDS.observe(time.perf_counter() - started)
+            if isinstance(result, dict) and result.get("success") is False:
+                TOOL_ERRORS.inc()
+            return result
+    return wrapper
+
+
+@contextmanager
+def track_task(agent: str, task: str) -> Iterator[None]:
+    """Record the latency and errors of one agent task"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        TASK_ERRORS.inc(agent=agent, task=task)
+        raise
+    finally:
+        TASK_SECONDS.observe(time.perf_counter() - started, agent=agent, task=task)
+
+
+def iter_scoped(items: Iterable, **labels: str) -> Iterator:
+    """
+    Iterate under extra labels without holding them across yields
+
+    For generators consumed piecemeal (e.g. by a streaming response, one
+    item per worker thread), where a scope around the loop would leak.
+    """
+    iterator = iter(items)
+    while True:
+        with scope(**labels):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def record_bytes(amount: int, source: str) -> None:
+    BYTES_DOWNLOADED.inc(amount, source=source)
+
+
+def record_tokens(agent: str, model: str, prompt: int = 0, completion: int = 0) -> None:
+    if prompt:
+        LLM_TOKENS.inc(prompt, agent=agent, model=model, direction="prompt")
+    if completion:
+        LLM_TOKENS.inc(completion, agent=agent, model=model, direction="completion")
@@ -0,0 +1,183 @@
+"""
+Registry - Process-wide agents and compiled workflows for the API
+Heavy frameworks (crewai, langchain, langgraph, OpenCV) are imported on
+first use, so the API process starts answering at once; agents, tools and
+compiled graphs are then built once and shared by every request.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+import os
+import sys
+import threading
+import time
+
+MEMORY_WORKFLOW = "analyze-memory"
+STORY_WORKFLOW = "generate-story"
+WORKFLOWS = (MEMORY_WORKFLOW, STORY_WORKFLOW)
+
+# Worker pools stopped on shutdown, if their module was ever loaded
+_POOL_SHUTDOWNS = (
+    ("tools.pii_batch", "shutdown_pool"),
+    ("tools.ocr_engine", "shutdown_ocr_pool")
+)
+
+
+def _build_privacy_agent():
+    from .agents.privacy_guard import PrivacyGuardAgent
+    return PrivacyGuardAgent()
+
+
+def _build_curator_agent():
+    from .agents.memory_curator import MemoryCuratorAgent
+    return MemoryCuratorAgent()
+
+
+def _build_genealogist_agent():
+    from .agents.genealogist import GeneologistAgent
+    return GeneologistAgent()
+
+
+def _build_biographer_agent():
+    from .agents.biographer import BiographerAgent
+    return BiographerAgent()
+
+
+class Registry:
+    """
+    Lazily built, process-wide components
+
+    Each component is built on first use under its own lock, so
+    concurrent first requests build it once, and a slow build does not
+    hold up requests for components that are ready. Agents, tools and
+    compiled graphs keep no per-request state (the graphs take it as
+    input), so the built objects are shared by all requests.
+    """
+
+    def __init__(self):
+        self._components: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._build_ms: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+
+    def get(self, name: str, build: Callable[[], Any]) -> Any:
+        """The component called name, built with build() the first time"""
+        component = self._components.get(name)
+        if component is not None:
+            return component
+        with self._lock_for(name):
+            component = self._components.get(name)
+            if component is None:
+                started = time.perf_counter()
+                component = build()
+                self._build_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+                self._components[name] = component
+                self._errors.pop(name, None)
+        return component
+
+    def privacy_agent(self):
+        return self.get("privacy_agent", _build_privacy_agent)
+
+    def curator_agent(self):
+        return self.get("curator_agent", _build_curator_agent)
+
+    def genealogist_agent(self):
+        return self.get("genealogist_agent", _build_genealogist_agent)
+
+    def biographer_agent(self):
+        return self.get("biographer_agent", _build_biographer_agent)
+
+    def memory_workflow(self):
+        """Compiled memory processing graph (no checkpointing)"""
+        return self.get("memory_workflow", lambda: self._compile(MEMORY_WORKFLOW, None))
+
+    def story_workflow(self):
+        """Compiled story generation graph (no checkpointing)"""
+        return self.get("story_workflow", lambda: self._compile(STORY_WORKFLOW, None))
+
+    def story_stream(self):
+        """Streaming story runner (see create_story_stream)"""
+        def build():
+            from .workflows.langgraph_workflows import create_story_stream
+            return create_story_stream(self.genealogist_agent(), self.curator_agent(),
+                                       self.biographer_agent(), self.privacy_agent())
+        return self.get("story_stream", build)
+
+    def checkpoints(self) -> Tuple[Any, Any]:
+        """(checkpointer, job store) shared by all workflow jobs"""
+        def build():
+            from .workflows.checkpoints import checkpoint_backend
+            return checkpoint_backend()
+        return self.get("checkpoints", build)
+
+    def job_store(self):
+        return self.checkpoints()[1]
+
+    def runner(self, workflow: str):
+        """Durable job runner of a workflow, compiled with the shared checkpointer"""
+        if workflow not in WORKFLOWS:
+            raise ValueError(f"Unknown workflow: {workflow}")
+
+        def build():
+            from .workflows.checkpoints import WorkflowRunner, DEFAULT_MAX_ATTEMPTS
+            checkpointer, jobs = self.checkpoints()
+            max_attempts = int(os.getenv("WORKFLOW_MAX_ATTEMPTS", str(DEFAULT_MAX_ATTEMPTS)))
+            return WorkflowRunner(workflow, self._compile(workflow, checkpointer), jobs, max_attempts)
+        return self.get(f"runner:{workflow}", build)
+
+    def warm(self) -> None:
+        """Build everything now (run in the background after startup)"""
+        builders = (self.privacy_agent, self.curator_agent, self.genealogist_agent,
+                    self.biographer_agent, self.memory_workflow, self.story_workflow,
+                    self.story_stream, self._runners)
+        for builder in builders:
+            try:
+                builder()
+            except Exception as e:
+                # Not fatal: the first request needing it builds it again
+                self._errors[builder.__name__.lstrip("_")] = str(e)
+
+    def status(self) -> Dict[str, Any]:
+        """Which components are built and how long each took"""
+        return {
+            "components": sorted(self._components),
+            "build_ms": dict(self._build_ms),
+            "errors": dict(self._errors)
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pools of the modules in use"""
+        for module_name, function_name in _POOL_SHUTDOWNS:
+            module = sys.modules.get(f"{__package__}.{module_name}")
+            if module is not None:
+                getattr(module, function_name)()
+
+    def _runners(self) -> None:
+        for workflow in WORKFLOWS:
+            self.runner(workflow)
+
+    def _compile(self, workflow: str, checkpointer):
+        from .workflows.langgraph_workflows import create_memory_workflow, create_story_workflow
+        if workflow == MEMORY_WORKFLOW:
+            return create_memory_workflow(self.privacy_agent(), self.curator_agent(),
+                                          self.biographer_agent(), checkpointer=checkpointer)
+        return create_story_workflow(self.genealogist_agent(), self.curator_agent(),
+                                     self.biographer_agent(), self.privacy_agent(),
+                                     checkpointer=checkpointer)
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    """Process-wide registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry()
+        return _registry
@@ -5,11 +5,14 @@ Compliance Check Tool for Privacy Guard Agent
 from langchain.tools import BaseTool
 from typing import Dict, List, Any
 
+from ..metrics import instrument_tool
+
 
 class ComplianceCheckTool(BaseTool):
     name = "compliance_check"
     description = "Checks if data processing complies with privacy regulations"
     
+    @instrument_tool
     def _run(self, data_type: str, processing_purpose: str, user_consent: bool) -> Dict[str, Any]:
         """
         Check compliance with GDPR and privacy regulations
@@ -3,13 +3,18 @@ Data Redaction Tool for Privacy Guard Agent
 """
 
 from langchain.tools import BaseTool
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any
+
+from .pii_scanner import DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP
+from .redaction_engine import merge_spans, redact_text, redaction_label, iter_redacted
+from ..metrics import instrument_tool
 
 
 class DataRedactionTool(BaseTool):
     name = "data_redaction"
     description = "Redacts sensitive information from text"
     
+    @instrument_tool
     def _run(self, text: str, pii_list: List[Dict[str, Any]]) -> Dict[str, str]:
         """
         Redact PII from text
@@ -21,34 +26,32 @@ class DataRedactionTool(BaseTool):
         Returns:
             Dictionary with original and redacted text
         """
-        redacted_text = text
-        
-        # Sort PII by position (descending) to avoid index shifting
-        sorted_pii = sorted(pii_list, key=lambda x: x["start"], reverse=True)
-        
-        for pii_item in sorted_pii:
-            start = pii_item["start"]
-            end = pii_item["end"]
-            pii_type = pii_item["type"]
-            
-            # Replace with appropriate redaction
-            redaction_text = self._get_redaction_text(pii_type)
-            redacted_text = redacted_text[:start] + redaction_text + redacted_text[end:]
+        # Overlapping items (a KTP is also a phone run) collapse into one
+        # region labelled with the highest-risk type
+        regions = merge_spans(pii_list)
+        redacted_text = redact_text(text, regions)
         
         return {
             "original_text": text,
             "redacted_text": redacted_text,
-            "redactions_made": len(sorted_pii)
+            "redactions_made": len(regions)
         }
     
+    def redact_stream(self, source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      overlap: int = DEFAULT_OVERLAP) -> Iterator[str]:
+        """
+        Detect and redact PII in a large text chunk by chunk
+        
+        Args:
+            source: Text file object or iterable of text chunks
+            chunk_size: Characters scanned per window
+            overlap: Characters carried between windows
+            
+        Yields:
+            Consecutive pieces of the redacted text
+        """
+        return iter_redacted(source, chunk_size=chunk_size, overlap=overlap)
+    
     def _get_redaction_text(self, pii_type: str) -> str:
         """Get appropriate redaction text for PII type"""
-        redaction_map = {
-            "ktp_number": "[REDACTED_ID_NUMBER]",
-            "phone_number": "[REDACTED_PHONE]",
-            "email_address": "[REDACTED_EMAIL]",
-            "credit_card": "[REDACTED_CC]",
-            "detailed_address": "[REDACTED_ADDRESS]"
-        }
-        
-        return redaction_map.get(pii_type, "[REDACTED]")
+        return redaction_label(pii_type)
@@ -1,30 +1,256 @@
 """Database Query Tool - Query Supabase"""
 from langchain.tools import BaseTool
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
 import os
+import threading
 from supabase import create_client, Client
 
+from ..metrics import instrument_tool
+
+# Columns read unless params["columns"] asks otherwise ("*" for all): what
+# the graph, kinship and validation code use, so biography, metadata and
+# face data stay in the database
+MEMBER_COLUMNS = ("id, first_name, middle_name, last_name, nickname, gender, "
+                  "birth_date, death_date, is_deceased, is_active, updated_at")
+RELATIONSHIP_COLUMNS = "id, person1_id, person2_id, relationship_type, start_date, end_date, updated_at"
+MEMORY_COLUMNS = "id, title, description, memory_type, memory_date, location, thumbnail_url"
+MEMORY_PEOPLE_COLUMNS = "id, memory_id, family_member_id"
+MEMORY_TAG_COLUMNS = "id, memory_id, tag"
+
+# Rows per request (PostgREST's usual max-rows)
+DEFAULT_PAGE_SIZE = 1000
+
+# The server's max-rows: larger pages come back cut to it, and a short page
+# is taken as the last one, so page sizes are capped at it
+MAX_PAGE_SIZE = int(os.getenv("SUPABASE_MAX_ROWS", str(DEFAULT_PAGE_SIZE)))
+
+# Keyset each query is paged by (also its sort order)
+BY_ID = ("id",)
+BY_UPDATE = ("updated_at", "id")
+
+QUERY_TYPES = (
+    "get_family_members", "get_relationships", "get_member_changes", "get_relationship_changes",
+    "get_memory_hashes", "get_memory_locations", "get_member_residences", "get_tagged_faces",
+    "get_memories", "get_memory_people", "get_memory_tags"
+)
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+def get_supabase_client() -> Client:
+    """Process-wide Supabase client (one connection pool for every tool)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client(
+                os.getenv("SUPABASE_URL"),
+                os.getenv("SUPABASE_SERVICE_KEY")
+            )
+        return _client
+
+
+def _projection(columns: str, keys: Sequence[str]) -> str:
+    """Selected columns plus any keyset column they leave out"""
+    if columns.strip() == "*":
+        return columns
+    names = {column.strip() for column in columns.split(",")}
+    return columns + "".join(f", {key}" for key in keys if key not in names)
+
+
+def _after(query, keys: Sequence[str], after: Sequence[Any]):
+    """Rows strictly after a keyset cursor"""
+    if len(keys) == 1:
+        return query.gt(keys[0], after[0])
+    (first, second), (first_value, second_value) = keys, after
+    return query.or_(f'{first}.gt."{first_value}",'
+                     f'and({first}.eq."{first_value}",{second}.gt."{second_value}")')
+
+
+def _date_range(query, column: str, params: Dict[str, Any]):
+    if params.get("date_from"):
+        query = query.gte(column, params["date_from"])
+    if params.get("date_to"):
+        query = query.lte(column, params["date_to"])
+    return query
+
+
 class DatabaseQueryTool(BaseTool):
     name = "database_query"
-    description = "Queries Supabase for family data"
+    description = ("Queries Supabase for family data. Query types: family members, relationships, "
+                   "memories, memory_people and memory_tags (by person_id, date_from, date_to); "
+                   "pass page_size (and after) for one page at a time")
     
     def __init__(self):
         super().__init__()
-        self.supabase: Client = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_SERVICE_KEY")
-        )
+        self.supabase: Client = get_supabase_client()
     
+    @instrument_tool
     def _run(self, query_type: str, params: Dict[str, Any]) -> Dict:
-        """Execute database query"""
+        """
+        Execute database query
+
+        With "page_size" in params one page is returned, with "next_after"
+        to pass back as "after" for the next page (None after the last);
+        otherwise every row, fetched page by page.
+        """
         try:
-            if query_type == "get_family_members":
-                result = self.supabase.table("family_members").select("*").eq("family_id", params["family_id"]).execute()
-            elif query_type == "get_relationships":
-                result = self.supabase.table("relationships").select("*").eq("family_id", params["family_id"]).execute()
-            else:
+            if query_type not in QUERY_TYPES:
                 return {"success": False, "error": "Unknown query type"}
+            if params.get("page_size"):
+                rows, after = self._page(query_type, params, int(params["page_size"]), params.get("after"))
+                return {"success": True, "data": rows, "next_after": after}
             
-            return {"success": True, "data": result.data}
+            return {"success": True, "data": [row for page in self.iter_pages(query_type, params) for row in page]}
         except Exception as e:
             return {"success": False, "error": str(e)}
+
+    def iter_pages(self, query_type: str, params: Dict[str, Any],
+                   page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Rows of a query, one page at a time
+
+        Keyset pagination: each page is read from just after the last row
+        of the previous one, so a deep page costs the same as the first
+        and rows inserted meanwhile do not shift the pages. Errors are
+        raised, not returned.
+
+        Args:
+            query_type: One of QUERY_TYPES
+            params: family_id, plus person_id / date_from / date_to for
+                memory queries, since for change queries, and optionally
+                columns (comma-separated, "*" for all)
+            page_size: Rows per request (at most MAX_PAGE_SIZE)
+
+        Yields:
+            Lists of at most page_size rows, in keyset order
+        """
+        if query_type not in QUERY_TYPES:
+            raise ValueError(f"Unknown query type: {query_type}")
+        after = params.get("after")
+        while True:
+            rows, after = self._page(query_type, params, page_size, after)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
+    def iter_rows(self, query_type: str, params: Dict[str, Any],
+                  page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """iter_pages() flattened into rows"""
+        for page in self.iter_pages(query_type, params, page_size):
+            yield from page
+
+    def update_memory_metadata(self, memory_id: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merge keys into a memory's metadata
+
+        Read, merge and write back (PostgREST cannot merge jsonb), so other
+        metadata keys are kept. Errors are raised, not returned.
+
+        Returns:
+            The memory's new metadata
+        """
+        memories = self.supabase.table("memories")
+        rows = memories.select("metadata").eq("id", memory_id).limit(1).execute().data
+        if not rows:
+            raise KeyError(f"Memory not found: {memory_id}")
+        metadata = {**(rows[0].get("metadata") or {}), **values}
+        memories.update({"metadata": metadata}).eq("id", memory_id).execute()
+        return metadata
+
+    def update_memory_analysis(self, memory_id: str, ai_analysis: Dict[str, Any]) -> None:
+        """Store a memory's analysis in memories.ai_analysis (errors are raised)"""
+        self.supabase.table("memories").update({"ai_analysis": ai_analysis}).eq("id", memory_id).execute()
+
+    def _page(self, query_type: str, params: Dict[str, Any], page_size: int,
+              after: Any) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+        """One page and the cursor of the next (None if this one is the last)"""
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        query, keys = self._select(query_type, params)
+        if after is not None:
+            query = _after(query, keys, after if isinstance(after, (list, tuple)) else [after])
+        for key in keys:
+            query = query.order(key)
+        rows = query.limit(page_size).execute().data
+        return rows, [rows[-1][key] for key in keys] if len(rows) == page_size else None
+
+    def _select(self, query_type: str, params: Dict[str, Any]) -> Tuple[Any, Sequence[str]]:
+        """Filtered, projected select of a query type and the keyset it is paged by"""
+        table = self.supabase.table
+        family_id = params["family_id"]
+        columns = params.get("columns")
+        person_id = params.get("person_id")
+
+        if query_type in ("get_family_members", "get_member_changes"):
+            keys = BY_ID if query_type == "get_family_members" else BY_UPDATE
+            query = table("family_members").select(_projection(columns or MEMBER_COLUMNS, keys)).eq(
+                "family_id", family_id
+            )
+        elif query_type in ("get_relationships", "get_relationship_changes"):
+            keys = BY_ID if query_type == "get_relationships" else BY_UPDATE
+            query = table("relationships").select(_projection(columns or RELATIONSHIP_COLUMNS, keys)).eq(
+                "family_id", family_id
+            )
+        elif query_type == "get_memory_hashes":
+            # Photo memories with their stored perceptual hash (only that key of metadata)
+            # and analysis, for the duplicate index
+            keys = BY_ID
+            query = table("memories").select(_projection(
+                columns or "id, phash:metadata->>phash, ai_analysis", keys
+            )).eq("family_id", family_id).eq("memory_type", "photo").eq("is_active", True).not_.is_(
+                "metadata->phash", "null"
+            )
+        elif query_type == "get_memory_locations":
+            # Memories with GPS coordinates in metadata, for the geo index
+            keys = BY_ID
+            query = table("memories").select(_projection(columns or "id, gps:metadata->gps, memory_date", keys)).eq(
+                "family_id", family_id
+            ).not_.is_("metadata->gps", "null")
+        elif query_type == "get_member_residences":
+            # Members' home locations (only that key of metadata), for the private-residence check
+            keys = BY_ID
+            query = table("family_members").select(_projection(
+                columns or "id, home_location:metadata->home_location", keys
+            )).eq("family_id", family_id).not_.is_("metadata->home_location", "null")
+        elif query_type == "get_tagged_faces":
+            # memory_people rows of a family, for the face embedding index
+            keys = BY_ID
+            query = table("memory_people").select(_projection(
+                columns or "id, family_member_id, face_detection_data", keys
+            ) + ", memories!inner(family_id)").eq("memories.family_id", family_id).not_.is_(
+                "face_detection_data", "null"
+            )
+        elif query_type == "get_memories":
+            # Active memories of a family, optionally only those a person is tagged in
+            keys = BY_ID
+            select = _projection(columns or MEMORY_COLUMNS, keys)
+            if person_id:
+                select += ", memory_people!inner(family_member_id)"
+            query = table("memories").select(select).eq("family_id", family_id).eq("is_active", True)
+            if person_id:
+                query = query.eq("memory_people.family_member_id", person_id)
+            query = _date_range(query, "memory_date", params)
+        elif query_type == "get_memory_people":
+            # Who is tagged in which memory (face data left out unless asked for)
+            keys = BY_ID
+            query = table("memory_people").select(_projection(
+                columns or MEMORY_PEOPLE_COLUMNS, keys
+            ) + ", memories!inner(family_id, memory_date)").eq("memories.family_id", family_id)
+            if person_id:
+                query = query.eq("family_member_id", person_id)
+            query = _date_range(query, "memories.memory_date", params)
+        else:
+            # get_memory_tags: tags of a family's memories, optionally of those a person is in
+            keys = BY_ID
+            embed = "memories!inner(family_id, memory_date"
+            embed += ", memory_people!inner(family_member_id))" if person_id else ")"
+            query = table("memory_tags").select(_projection(columns or MEMORY_TAG_COLUMNS, keys) + ", " + embed).eq(
+                "memories.family_id", family_id
+            )
+            if person_id:
+                query = query.eq("memories.memory_people.family_member_id", person_id)
+            query = _date_range(query, "memories.memory_date", params)
+
+        if query_type in ("get_member_changes", "get_relationship_changes") and params.get("since"):
+            query = query.gt("updated_at", params["since"])
+        return query, keys
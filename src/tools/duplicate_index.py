@@ -0,0 +1,284 @@
+"""
+Duplicate Index - Perceptual-hash near-duplicate detection for memories
+Finds re-uploads (scans of prints, chat-app recompressions, resizes) of an
+already analysed photo so its ai_analysis can be reused
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+# Multi-index hashing: the 64-bit hash is split into 4 tables of 16 bits
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Hamming distance up to which two photos count as the same picture
+DEFAULT_MAX_DISTANCE = 10
+
+HASH_IMAGE_SIZE = 32
+HASH_LOW_FREQUENCIES = 8
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix(size: int = HASH_IMAGE_SIZE) -> np.ndarray:
+    """Orthonormal DCT-II basis (rows are frequencies)"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def perceptual_hash(image_path: str) -> int:
+    """
+    64-bit DCT perceptual hash (pHash) of an image
+
+    The upright image is shrunk to 32x32 greyscale; each bit says whether
+    one of the 8x8 lowest frequencies is above their median. Resizing,
+    recompression and small edits flip only a few bits.
+    """
+    with Image.open(image_path) as image:
+        # JPEG draft mode decodes greyscale at 1/2 to 1/8 scale
+        image.draft("L", (HASH_IMAGE_SIZE * 4, HASH_IMAGE_SIZE * 4))
+        image = ImageOps.exif_transpose(image).convert("L")
+        image = image.resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.Resampling.LANCZOS)
+        pixels = np.asarray(image, dtype=np.float32)
+
+    dct = _dct_matrix()
+    frequencies = (dct @ pixels @ dct.T)[:HASH_LOW_FREQUENCIES, :HASH_LOW_FREQUENCIES].reshape(-1)
+    # The DC term only reflects overall brightness; leave it out of the median
+    bits = frequencies > np.median(frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_to_hex(phash: int) -> str:
+    return f"{phash:016x}"
+
+
+def hash_from_hex(value: str) -> int:
+    return int(value, 16)
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(radius: int) -> Tuple[int, ...]:
+    """Every CHUNK_BITS-bit mask with at most radius bits set"""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            masks.append(sum(1 << position for position in positions))
+    return tuple(masks)
+
+
+def _chunks(phash: int) -> List[int]:
+    return [(phash >> (chunk * CHUNK_BITS)) & CHUNK_MASK for chunk in range(CHUNKS)]
+
+
+class DuplicateIndex:
+    """
+    Near-duplicate lookup over one family's memories
+
+    Multi-index hashing: if two hashes differ in at most r bits, one of
+    their 4 chunks differs in at most r // 4 bits, so probing each chunk
+    table with the few masks of that radius finds every candidate without
+    comparing against the whole family. Each memory can carry a payload
+    (its ai_analysis) to hand back on a match.
+    """
+
+    def __init__(self):
+        self._hashes: Dict[str, int] = {}
+        self._payloads: Dict[str, Any] = {}
+        self._tables: List[Dict[int, Set[str]]] = [defaultdict(set) for _ in range(CHUNKS)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, memory_id: str, phash: int, payload: Any = None) -> None:
+        """Index a memory (replaces its previous hash and payload)"""
+        with self._lock:
+            self._discard(memory_id)
+            self._hashes[memory_id] = phash
+            if payload is not None:
+                self._payloads[memory_id] = payload
+            for table, chunk in zip(self._tables, _chunks(phash)):
+                table[chunk].add(memory_id)
+
+    def remove(self, memory_id: str) -> bool:
+        """Drop a memory (returns False if it was not indexed)"""
+        with self._lock:
+            return self._discard(memory_id)
+
+    def payload(self, memory_id: str) -> Any:
+        return self._payloads.get(memory_id)
+
+    def query(self, phash: int, max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Tuple[str, int]]:
+        """
+        Memories within max_distance bits of a hash
+
+        Returns:
+            (memory_id, distance) pairs, closest first
+        """
+        masks = _flip_masks(max_distance // CHUNKS)
+        candidates: Set[str] = set()
+        with self._lock:
+            for table, chunk in zip(self._tables, _chunks(phash)):
+                for mask in masks:
+                    bucket = table.get(chunk ^ mask)
+                    if bucket:
+                        candidates.update(bucket)
+            hashes = {memory_id: self._hashes[memory_id] for memory_id in candidates}
+
+        matches = []
+        for memory_id, other in hashes.items():
+            distance = (phash ^ other).bit_count()
+            if distance <= max_distance:
+                matches.append((memory_id, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+    def duplicate_groups(self, max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Dict[str, Any]]:
+        """
+        Clusters of near-duplicate memories
+
+        Returns:
+            Groups of two or more memories linked by near-duplicate pairs,
+            largest first; "keep" is a member that already has an analysis
+        """
+        with self._lock:
+            hashes = dict(self._hashes)
+            analysed = set(self._payloads)
+
+        parent = {memory_id: memory_id for memory_id in hashes}
+
+        def find(memory_id: str) -> str:
+            while parent[memory_id] != memory_id:
+                parent[memory_id] = parent[parent[memory_id]]
+                memory_id = parent[memory_id]
+            return memory_id
+
+        closest: Dict[str, int] = {}
+        for memory_id, phash in hashes.items():
+            for other_id, distance in self.query(phash, max_distance):
+                if other_id == memory_id or other_id not in parent:
+                    continue
+                parent[find(other_id)] = find(memory_id)
+                closest[memory_id] = min(distance, closest.get(memory_id, HASH_BITS))
+
+        members: Dict[str, List[str]] = defaultdict(list)
+        for memory_id in hashes:
+            members[find(memory_id)].append(memory_id)
+
+        groups = []
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            group.sort()
+            keep = next((memory_id for memory_id in group if memory_id in analysed), group[0])
+            groups.append({
+                "memory_ids": group,
+                "keep": keep,
+                "max_pair_distance": max(closest.get(memory_id, 0) for memory_id in group)
+            })
+        groups.sort(key=lambda group: (-len(group["memory_ids"]), group["keep"]))
+        return groups
+
+    def _discard(self, memory_id: str) -> bool:
+        phash = self._hashes.pop(memory_id, None)
+        if phash is None:
+            return False
+        self._payloads.pop(memory_id, None)
+        for table, chunk in zip(self._tables, _chunks(phash)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(memory_id)
+                if not bucket:
+                    del table[chunk]
+        return True
+
+
+class DuplicateIndexStore:
+    """Per-family duplicate indexes, built from memories rows on first use"""
+
+    def __init__(self):
+        self._indexes: Dict[str, DuplicateIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, family_id: str,
+            load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> DuplicateIndex:
+        """
+        Index of a family
+
+        Args:
+            family_id: Family to look up
+            load: Returns the family's memories rows with a stored hash
+                (see build); called once, the first time the family is needed
+
+        Returns:
+            The index (empty, and not kept, if the family has never been
+            built and no load is given)
+        """
+        with self._lock:
+            index = self._indexes.get(family_id)
+        if index is not None:
+            return index
+        if load is None:
+            return DuplicateIndex()
+        return self.build(family_id, load())
+
+    def build(self, family_id: str, memories: Iterable[Dict[str, Any]]) -> DuplicateIndex:
+        """
+        Index a family's memories from their rows
+
+        Args:
+            family_id: Family the memories belong to
+            memories: memories rows (id, "phash" or metadata with "phash",
+                ai_analysis)
+
+        Returns:
+            The new index; rows without a stored hash are skipped
+        """
+        index = DuplicateIndex()
+        for memory in memories:
+            phash = memory.get("phash") or (memory.get("metadata") or {}).get("phash")
+            if phash:
+                index.add(memory["id"], hash_from_hex(phash), memory.get("ai_analysis") or None)
+        with self._lock:
+            self._indexes[family_id] = index
+        return index
+
+    def invalidate(self, family_id: str) -> None:
+        """Drop a family's index (rebuilt on next use)"""
+        with self._lock:
+            self._indexes.pop(family_id, None)
+
+    def report(self, family_id: str, max_distance: int = DEFAULT_MAX_DISTANCE,
+               load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+        """Bulk near-duplicate report of one family (see get for load)"""
+        index = self.get(family_id, load)
+        groups = index.duplicate_groups(max_distance)
+        return {
+            "family_id": family_id,
+            "memories_indexed": len(index),
+            "max_distance": max_distance,
+            "duplicate_groups": groups,
+            "redundant_memories": sum(len(group["memory_ids"]) - 1 for group in groups)
+        }
+
+
+_store: Optional[DuplicateIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_duplicate_index_store() -> DuplicateIndexStore:
+    """Process-wide duplicate index store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DuplicateIndexStore()
+        return _store
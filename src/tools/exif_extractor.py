@@ -3,18 +3,35 @@ EXIF Extractor Tool - Extract metadata from images
 """
 
 from langchain.tools import BaseTool
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import os
 from PIL import Image
 from PIL.ExifTags import TAGS
-import requests
-from io import BytesIO
+
+from .image_store import get_image_store
+from ..metrics import instrument_tool
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+
+# GPS IFD tags
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+GPS_ALTITUDE_REF = 5
+GPS_ALTITUDE = 6
 
 
 class ExifExtractorTool(BaseTool):
     name = "exif_extractor"
     description = "Extracts EXIF metadata from images"
     
+    def __init__(self):
+        super().__init__()
+        self.image_store = get_image_store()
+    
+    @instrument_tool
     def _run(self, image_url: str) -> Dict[str, Any]:
         """
         Extract EXIF data from image
@@ -25,37 +42,43 @@ class ExifExtractorTool(BaseTool):
         Returns:
             Dictionary with EXIF data
         """
+        source = None
         try:
-            # Load image
-            if image_url.startswith("http"):
-                response = requests.get(image_url)
-                image = Image.open(BytesIO(response.content))
+            # Metadata only: read the container header and EXIF/XMP
+            # segments, never the pixel data. Use the shared cache when
+            # another tool already fetched the image, else HTTP Range reads.
+            image_path = self.image_store.peek_path(image_url)
+            if image_path:
+                size_bytes = os.path.getsize(image_path)
+                image = Image.open(image_path)
             else:
-                image = Image.open(image_url)
-            
-            # Extract EXIF data
-            exif_data = {}
-            if hasattr(image, '_getexif') and image._getexif():
-                exif = image._getexif()
-                for tag_id, value in exif.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    exif_data[tag] = str(value)
+                source = self.image_store.open_range(image_url)
+                size_bytes = source.size
+                image = Image.open(source)
             
-            # Extract basic metadata
-            return {
-                "success": True,
-                "file_format": image.format,
-                "size_bytes": len(image.tobytes()) if image_url.startswith("http") else os.path.getsize(image_url),
-                "resolution": {
-                    "width": image.width,
-                    "height": image.height
-                },
-                "mode": image.mode,
-                "exif": exif_data,
-                "date_taken": exif_data.get("DateTime", None),
-                "camera_model": exif_data.get("Model", None),
-                "gps_info": self._extract_gps(exif_data)
-            }
+            with image:
+                exif_data, gps_ifd = self._read_exif(image)
+                xmp = image.info.get("xmp") or image.info.get("XML:com.adobe.xmp")
+                if isinstance(xmp, bytes):
+                    xmp = xmp.decode("utf-8", errors="replace")
+                
+                # Extract basic metadata
+                return {
+                    "success": True,
+                    "file_format": image.format,
+                    "size_bytes": size_bytes,
+                    "resolution": {
+                        "width": image.width,
+                        "height": image.height
+                    },
+                    "mode": image.mode,
+                    "exif": exif_data,
+                    "xmp": xmp,
+                    "date_taken": exif_data.get("DateTimeOriginal", exif_data.get("DateTime", None)),
+                    "camera_model": exif_data.get("Model", None),
+                    "gps_info": self._extract_gps(gps_ifd),
+                    "bytes_read": source.bytes_fetched if source else None
+                }
         
         except Exception as e:
             return {
@@ -63,13 +86,72 @@ class ExifExtractorTool(BaseTool):
                 "error": str(e),
                 "exif": {}
             }
+        finally:
+            if source:
+                source.close()
     
-    def _extract_gps(self, exif_data: Dict) -> Dict[str, Any]:
+    def _read_exif(self, image: Image.Image) -> Tuple[Dict[str, str], Dict[int, Any]]:
+        """Read EXIF tags (IFD0 plus the Exif sub-IFD) and the raw GPS IFD from the image header"""
+        # PNG getexif() decodes the image to look for a trailing eXIf chunk
+        if image.format == "PNG" and "exif" not in image.info:
+            return {}, {}
+        
+        exif = image.getexif()
+        exif_data = {}
+        for tag_id, value in exif.items():
+            exif_data[TAGS.get(tag_id, tag_id)] = str(value)
+        for tag_id, value in exif.get_ifd(EXIF_IFD).items():
+            exif_data[TAGS.get(tag_id, tag_id)] = str(value)
+        
+        gps_ifd = exif.get_ifd(GPS_IFD)
+        if gps_ifd:
+            exif_data["GPSInfo"] = str(gps_ifd)
+        
+        return exif_data, dict(gps_ifd)
+    
+    def _extract_gps(self, gps_ifd: Dict[int, Any]) -> Dict[str, Any]:
         """Extract GPS coordinates from EXIF if available"""
-        # Placeholder for GPS extraction
-        # TODO: Implement proper GPS coordinate extraction
+        latitude = self._to_degrees(gps_ifd.get(GPS_LATITUDE), gps_ifd.get(GPS_LATITUDE_REF), "S")
+        longitude = self._to_degrees(gps_ifd.get(GPS_LONGITUDE), gps_ifd.get(GPS_LONGITUDE_REF), "W")
+        if latitude is None or longitude is None or abs(latitude) > 90 or abs(longitude) > 180:
+            latitude = longitude = None
+        
+        altitude = self._to_float(gps_ifd.get(GPS_ALTITUDE))
+        if altitude is not None and gps_ifd.get(GPS_ALTITUDE_REF) in (1, b"\x01"):
+            altitude = -altitude  # below sea level
+        
         return {
-            "latitude": None,
-            "longitude": None,
-            "altitude": None
+            "latitude": latitude,
+            "longitude": longitude,
+            "altitude": altitude
         }
+    
+    def _to_degrees(self, value: Any, ref: Any, negative_ref: str) -> Optional[float]:
+        """Decimal degrees from EXIF (degrees, minutes, seconds) rationals"""
+        if value is None:
+            return None
+        parts = value if isinstance(value, (tuple, list)) else (value,)
+        numbers = [self._to_float(part) for part in parts[:3]]
+        if not numbers or any(number is None for number in numbers):
+            return None
+        
+        degrees = sum(number / 60 ** position for position, number in enumerate(numbers))
+        if isinstance(ref, bytes):
+            ref = ref.decode("ascii", errors="ignore")
+        if isinstance(ref, str) and ref.strip().upper() == negative_ref:
+            degrees = -degrees
+        return round(degrees, 7)
+    
+    @staticmethod
+    def _to_float(value: Any) -> Optional[float]:
+        """Float of an EXIF rational (None when missing or 0/0)"""
+        if value is None:
+            return None
+        try:
+            if isinstance(value, tuple) and len(value) == 2:
+                numerator, denominator = value
+                return float(numerator) / float(denominator)
+            number = float(value)
+        except (TypeError, ValueError, ZeroDivisionError):
+            return None
+        return None if number != number else number  # NaN from a 0/0 IFDRational
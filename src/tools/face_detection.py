@@ -3,48 +3,93 @@ Face Detection Tool - Detect faces in images
 """
 
 from langchain.tools import BaseTool
-from typing import Dict, List, Any
-import os
-import requests
+from typing import Dict, List, Any, Optional
+
+from .image_store import get_image_store
+from .database_query import DatabaseQueryTool
+from .face_engine import get_face_engine
+from .face_index import get_face_index_store, DEFAULT_TOP_K
+from ..metrics import instrument_tool
 
 
 class FaceDetectionTool(BaseTool):
     name = "face_detection"
-    description = "Detects faces in images and extracts bounding boxes"
+    description = (
+        "Detects faces in images and extracts bounding boxes; "
+        "with a family_id, suggests matching family members"
+    )
     
     def __init__(self):
         super().__init__()
-        self.hf_token = os.getenv("HF_TOKEN")
-        if not self.hf_token:
-            raise ValueError("HF_TOKEN environment variable is required")
+        # Detection runs locally on CPU; no per-photo API call
+        self.image_store = get_image_store()
+        self.engine = get_face_engine()
+        self.face_index_store = get_face_index_store()
+        self.db_tool = DatabaseQueryTool()
     
-    def _run(self, image_url: str) -> Dict[str, Any]:
+    @instrument_tool
+    def _run(self, image_url: str, family_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Detect faces in image
         
         Args:
             image_url: URL of the image
+            family_id: Family whose tagged faces are matched against
             
         Returns:
             Dictionary with detected faces and bounding boxes
         """
-        try:
-            # For MVP, we'll use a simpler approach
-            # In production, use RetinaFace or similar face detection model
+        return self.detect_batch([image_url], family_id=family_id)[0]
+    
+    def detect_batch(self, image_urls: List[str], family_id: Optional[str] = None,
+                     include_embeddings: bool = False, top_k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+        """
+        Detect faces in many images (album imports, large scans)
+        
+        Args:
+            image_urls: URLs of the images
+            family_id: Family whose face index supplies "suggested_matches"
+            include_embeddings: Add each face's embedding (to store in
+                memory_people.face_detection_data when the face is tagged)
+            top_k: Matches suggested per face
+            
+        Returns:
+            One result per URL, in input order; bbox is
+            {"x", "y", "width", "height"} in pixels of the upright image
+        """
+        embed = self.engine.can_embed and (family_id is not None or include_embeddings)
+        index = None
+        if embed and family_id:
+            # Tagged faces are loaded from memory_people the first time a family is searched
+            index = self.face_index_store.get(
+                family_id, load=lambda: self.db_tool.iter_rows("get_tagged_faces", {"family_id": family_id})
+            )
+        
+        results = []
+        for outcome in self.engine.detect_files(image_urls, resolve=self.image_store.get_path, embed=embed):
+            if "error" in outcome:
+                results.append({
+                    "success": False,
+                    "error": outcome["error"],
+                    "faces_detected": []
+                })
+                continue
             
-            # Placeholder implementation
-            # TODO: Integrate actual face detection model
+            faces = outcome["faces"]
+            if embed:
+                embeddings = outcome["embeddings"]
+                matches = index.search(embeddings, k=top_k) if index is not None else [[] for _ in faces]
+                for face, embedding, suggested in zip(faces, embeddings, matches):
+                    face["suggested_matches"] = suggested
+                    if include_embeddings:
+                        face["embedding"] = [round(float(value), 6) for value in embedding]
             
-            return {
+            results.append({
                 "success": True,
-                "faces_detected": [],
-                "total_count": 0,
-                "note": "Face detection integration pending - using placeholder"
-            }
-        
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "faces_detected": []
-            }
+                "faces_detected": faces,
+                "total_count": len(faces),
+                "image_size": {"width": outcome["width"], "height": outcome["height"]},
+                "detector": self.engine.backend_name,
+                "identity_matching": embed
+            })
+        return results
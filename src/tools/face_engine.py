@@ -0,0 +1,354 @@
+"""
+Face Engine - Local CPU face detection for FaceDetectionTool
+YuNet (ONNX, run by OpenCV) when the model file is present, otherwise the
+Haar cascade bundled with OpenCV. Large scans are tiled so small faces in
+group photos are found, and batches share one worker pool. With the SFace
+model present, detected faces also get identity embeddings.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, NamedTuple, Optional
+import contextvars
+import os
+import threading
+
+import cv2
+import numpy as np
+
+DEFAULT_MODEL_PATH = os.path.join("models", "face_detection_yunet_2023mar.onnx")
+DEFAULT_RECOGNITION_MODEL_PATH = os.path.join("models", "face_recognition_sface_2021dec.onnx")
+EMBEDDING_DIM = 128
+SFACE_INPUT_SIZE = (112, 112)
+SCORE_THRESHOLD = 0.7
+NMS_THRESHOLD = 0.3
+HAAR_MIN_NEIGHBORS = 5
+
+# Whole image is searched at this longest side (finds the large faces)
+OVERVIEW_SIDE = 1280
+# Bigger scans are also searched in full-resolution tiles; the overlap
+# is larger than the faces the tiles are there to find
+TILE_SIZE = 1024
+TILE_OVERLAP = 192
+EDGE_MARGIN = 2
+# Images decoded at once per batch (bounds memory on large albums)
+BATCH_SIZE = 16
+
+# Detections: float32 rows of x, y, width, height, score and five (x, y)
+# landmarks (eyes, nose tip, mouth corners); NaN where the detector has none
+DETECTION_COLUMNS = 15
+LANDMARK_X = slice(5, 15, 2)
+LANDMARK_Y = slice(6, 15, 2)
+EMPTY_DETECTIONS = np.empty((0, DETECTION_COLUMNS), dtype=np.float32)
+
+
+class Region(NamedTuple):
+    """Part of an image handed to the detector"""
+    x: int
+    y: int
+    width: int
+    height: int
+    scale: float        # < 1.0 for the downscaled overview
+    is_tile: bool
+
+
+class YuNetBackend:
+    """OpenCV FaceDetectorYN over the YuNet ONNX model"""
+
+    def __init__(self, model_path: str):
+        self.detector = cv2.FaceDetectorYN.create(
+            model_path, "", (320, 320), SCORE_THRESHOLD, NMS_THRESHOLD, 5000
+        )
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(image)
+        if faces is None:
+            return EMPTY_DETECTIONS.copy()
+        # YuNet rows: box, landmarks (columns 4-13), then the score
+        return faces[:, [0, 1, 2, 3, 14, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]].astype(np.float32)
+
+
+class HaarBackend:
+    """Frontal-face Haar cascade shipped with OpenCV (no model download)"""
+
+    def __init__(self):
+        self.classifier = cv2.CascadeClassifier(
+            os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        )
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        gray = cv2.equalizeHist(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        boxes, neighbors = self.classifier.detectMultiScale2(
+            gray, scaleFactor=1.1, minNeighbors=HAAR_MIN_NEIGHBORS, minSize=(24, 24)
+        )
+        if len(boxes) == 0:
+            return EMPTY_DETECTIONS.copy()
+        neighbors = np.asarray(neighbors, dtype=np.float32).reshape(-1)
+        # The cascade has no probability; more agreeing neighbours, more confidence
+        scores = neighbors / (neighbors + HAAR_MIN_NEIGHBORS)
+        landmarks = np.full((len(boxes), 10), np.nan, dtype=np.float32)
+        return np.column_stack([np.asarray(boxes, dtype=np.float32), scores, landmarks])
+
+
+def tile_starts(length: int) -> List[int]:
+    """Offsets of overlapping tiles covering length pixels"""
+    stride = TILE_SIZE - TILE_OVERLAP
+    starts = list(range(0, max(length - TILE_SIZE, 0) + 1, stride))
+    if starts[-1] + TILE_SIZE < length:
+        starts.append(length - TILE_SIZE)
+    return starts
+
+
+def plan_regions(width: int, height: int) -> List[Region]:
+    """Whole image for ordinary photos; overview plus tiles for large scans"""
+    longest = max(width, height)
+    if longest <= OVERVIEW_SIDE:
+        return [Region(0, 0, width, height, 1.0, False)]
+
+    regions = [Region(0, 0, width, height, OVERVIEW_SIDE / longest, False)]
+    for y in tile_starts(height):
+        for x in tile_starts(width):
+            regions.append(Region(x, y, min(TILE_SIZE, width - x), min(TILE_SIZE, height - y), 1.0, True))
+    return regions
+
+
+def non_max_suppression(detections: np.ndarray, threshold: float = NMS_THRESHOLD) -> np.ndarray:
+    """Drop detections overlapping a higher-scoring one by more than threshold IoU"""
+    order = np.argsort(-detections[:, 4])
+    x1, y1 = detections[:, 0], detections[:, 1]
+    x2, y2 = x1 + detections[:, 2], y1 + detections[:, 3]
+    areas = detections[:, 2] * detections[:, 3]
+
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        overlap_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        overlap_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = overlap_w * overlap_h
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-6)
+        order = rest[iou <= threshold]
+    return detections[keep]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (cosine similarity becomes a dot product)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def load_image(path: str) -> np.ndarray:
+    """Decode an image as BGR, upright per its EXIF orientation"""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Unsupported or unreadable image: {path}")
+    return image
+
+
+class FaceEngine:
+    """
+    Local face detector shared by all FaceDetectionTool instances
+
+    OpenCV releases the GIL during inference, so a thread pool runs
+    detections in parallel; each worker thread keeps its own detector.
+    A batch is flattened into one queue of (image, region) jobs, so tiles
+    of one large scan and photos of an album spread over the same workers.
+    """
+
+    def __init__(self, model_path: Optional[str] = None, recognition_model_path: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        self.model_path = model_path or os.getenv("FACE_DETECTION_MODEL", DEFAULT_MODEL_PATH)
+        self.backend_name = "yunet" if os.path.isfile(self.model_path) else "haar"
+        self.recognition_model_path = recognition_model_path or os.getenv(
+            "FACE_RECOGNITION_MODEL", DEFAULT_RECOGNITION_MODEL_PATH
+        )
+        self.can_embed = os.path.isfile(self.recognition_model_path)
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="face-engine")
+
+    def detect_image(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """Faces in one decoded BGR image"""
+        height, width = image.shape[:2]
+        jobs = [self._executor.submit(self._detect_region, image, region)
+                for region in plan_regions(width, height)]
+        return face_records(self._merge([job.result() for job in jobs], width, height))
+
+    def detect_files(self, refs: List[str], resolve: Callable[[str], str] = lambda ref: ref,
+                     embed: bool = False) -> List[Dict[str, Any]]:
+        """
+        Detect faces in many images
+
+        Args:
+            refs: Image references (paths, or URLs when resolve downloads them)
+            resolve: Maps a reference to a local file path
+            embed: Also compute an identity embedding per face (needs can_embed)
+
+        Returns:
+            Per reference, in input order: {"faces", "width", "height"} or
+            {"error"}; with embed, "embeddings" holds one unit-length row per face
+        """
+        if embed and not self.can_embed:
+            raise ValueError(f"Face recognition model not found: {self.recognition_model_path}")
+
+        results: List[Dict[str, Any]] = []
+        for batch_start in range(0, len(refs), BATCH_SIZE):
+            batch = refs[batch_start:batch_start + BATCH_SIZE]
+            # Downloads in the pool keep the caller's metric labels
+            loads = [self._executor.submit(contextvars.copy_context().run, self._load, resolve, ref)
+                     for ref in batch]
+            loaded = [load.result() for load in loads]
+
+            pending = []
+            for image in loaded:
+                if isinstance(image, Exception):
+                    pending.append(image)
+                    continue
+                height, width = image.shape[:2]
+                jobs = [self._executor.submit(self._detect_region, image, region)
+                        for region in plan_regions(width, height)]
+                pending.append((image, jobs, width, height))
+
+            for item in pending:
+                if isinstance(item, Exception):
+                    results.append({"error": str(item)})
+                    continue
+                image, jobs, width, height = item
+                try:
+                    detections = self._merge([job.result() for job in jobs], width, height)
+                    result = {"faces": face_records(detections), "width": width, "height": height}
+                    if embed:
+                        result["embeddings"] = self._executor.submit(self._embed, image, detections)
+                    results.append(result)
+                except Exception as e:
+                    results.append({"error": str(e)})
+
+            for result_index in range(batch_start, len(results)):
+                embeddings = results[result_index].get("embeddings")
+                if isinstance(embeddings, Future):
+                    try:
+                        results[result_index]["embeddings"] = embeddings.result()
+                    except Exception as e:
+                        results[result_index] = {"error": str(e)}
+        return results
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _load(resolve: Callable[[str], str], ref: str):
+        try:
+            return load_image(resolve(ref))
+        except Exception as e:
+            return e
+
+    def _backend(self):
+        backend = getattr(self._local, "backend", None)
+        if backend is None:
+            if self.backend_name == "yunet":
+                backend = YuNetBackend(self.model_path)
+            else:
+                backend = HaarBackend()
+            self._local.backend = backend
+        return backend
+
+    def _recognizer(self):
+        recognizer = getattr(self._local, "recognizer", None)
+        if recognizer is None:
+            recognizer = self._local.recognizer = cv2.FaceRecognizerSF.create(self.recognition_model_path, "")
+        return recognizer
+
+    def _embed(self, image: np.ndarray, detections: np.ndarray) -> np.ndarray:
+        """SFace embedding of each detected face"""
+        recognizer = self._recognizer()
+        embeddings = np.empty((len(detections), EMBEDDING_DIM), dtype=np.float32)
+        for row_index, row in enumerate(detections):
+            if np.isnan(row[5]):
+                # No landmarks (Haar): use the box without alignment
+                x, y, w, h = (int(round(value)) for value in row[:4])
+                face = cv2.resize(image[y:y + h, x:x + w], SFACE_INPUT_SIZE)
+            else:
+                face = recognizer.alignCrop(image, np.concatenate([row[:4], row[5:], row[4:5]]))
+            embeddings[row_index] = recognizer.feature(face).reshape(-1)
+        return normalize_rows(embeddings)
+
+    def _detect_region(self, image: np.ndarray, region: Region) -> np.ndarray:
+        crop = image[region.y:region.y + region.height, region.x:region.x + region.width]
+        if region.scale != 1.0:
+            crop = cv2.resize(crop, None, fx=region.scale, fy=region.scale, interpolation=cv2.INTER_AREA)
+
+        detections = self._backend().detect(crop)
+        if not len(detections):
+            return detections
+        detections[:, :4] /= region.scale
+        detections[:, 5:] /= region.scale
+
+        if region.is_tile:
+            # A face cut by an inner tile edge lies whole in the neighbouring tile
+            image_height, image_width = image.shape[:2]
+            x1, y1 = detections[:, 0], detections[:, 1]
+            x2, y2 = x1 + detections[:, 2], y1 + detections[:, 3]
+            cut = np.zeros(len(detections), dtype=bool)
+            if region.x > 0:
+                cut |= x1 <= EDGE_MARGIN
+            if region.y > 0:
+                cut |= y1 <= EDGE_MARGIN
+            if region.x + region.width < image_width:
+                cut |= x2 >= region.width - EDGE_MARGIN
+            if region.y + region.height < image_height:
+                cut |= y2 >= region.height - EDGE_MARGIN
+            detections = detections[~cut]
+
+        detections[:, 0] += region.x
+        detections[:, 1] += region.y
+        detections[:, LANDMARK_X] += region.x
+        detections[:, LANDMARK_Y] += region.y
+        return detections
+
+    @staticmethod
+    def _merge(detections: List[np.ndarray], width: int, height: int) -> np.ndarray:
+        """Merge region detections, boxes clipped to whole image pixels"""
+        merged = np.concatenate(detections) if detections else EMPTY_DETECTIONS
+        if not len(merged):
+            return merged
+        merged = non_max_suppression(merged)
+
+        x1 = np.clip(np.round(merged[:, 0]), 0, width)
+        y1 = np.clip(np.round(merged[:, 1]), 0, height)
+        x2 = np.clip(np.round(merged[:, 0] + merged[:, 2]), 0, width)
+        y2 = np.clip(np.round(merged[:, 1] + merged[:, 3]), 0, height)
+        merged[:, 0], merged[:, 1] = x1, y1
+        merged[:, 2], merged[:, 3] = x2 - x1, y2 - y1
+        return merged[(merged[:, 2] > 0) & (merged[:, 3] > 0)]
+
+
+def face_records(detections: np.ndarray) -> List[Dict[str, Any]]:
+    """Face dicts (bbox in image pixels) in the create_detect_faces_task format"""
+    faces = []
+    for row in detections:
+        face = {
+            "face_id": len(faces) + 1,
+            "bbox": {"x": int(row[0]), "y": int(row[1]), "width": int(row[2]), "height": int(row[3])},
+            "confidence": round(float(row[4]), 3)
+        }
+        if not np.isnan(row[5]):
+            face["landmarks"] = [[round(float(x), 1), round(float(y), 1)]
+                                 for x, y in zip(row[LANDMARK_X], row[LANDMARK_Y])]
+        faces.append(face)
+    return faces
+
+
+_engine: Optional[FaceEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_face_engine() -> FaceEngine:
+    """Process-wide face engine configured from the environment"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            workers = os.getenv("FACE_DETECTION_WORKERS")
+            _engine = FaceEngine(max_workers=int(workers) if workers else None)
+        return _engine
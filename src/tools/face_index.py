@@ -0,0 +1,345 @@
+"""
+Face Index - Per-family face embedding index for identity matching
+Embeddings of tagged faces (memory_people.face_detection_data) keyed by
+family_members.id, searched by cosine similarity in one matrix product
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .face_engine import EMBEDDING_DIM, normalize_rows
+from .family_sync import DELETE, normalize_event
+
+DEFAULT_INDEX_DIR = os.path.join(tempfile.gettempdir(), "bfl-face-index")
+DEFAULT_TOP_K = 3
+# A saved index older than this (since its last full rebuild) is rebuilt
+# from the database when a family is first used; tag changes made while
+# no process was running are picked up then
+DEFAULT_MAX_AGE_SECONDS = 24 * 60 * 60
+# SFace cosine similarity above which two faces are the same person
+MATCH_THRESHOLD = 0.363
+# Rows read per requested match; several rows usually belong to one person
+CANDIDATES_PER_MATCH = 8
+
+
+class FaceIndex:
+    """
+    Embedding matrix of one family's tagged faces
+
+    Rows are unit-length float32 embeddings; each row carries the
+    memory_people.id it came from (the key) and the family_members.id it
+    identifies. Deletes leave a tombstone and the matrix is compacted once
+    half of it is dead. A saved index is a plain .npy matrix plus a small
+    JSON sidecar, and is memory-mapped on load; the first insert copies it
+    into a growable in-memory buffer. built_at is when the rows were last
+    read in full from the database (0 if never).
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.built_at = 0.0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._live = np.empty(0, dtype=bool)
+        self._count = 0
+        self._keys: List[Optional[str]] = []
+        self._members: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, key: str, member_id: str, embedding: Iterable[float]) -> None:
+        """
+        Insert or replace the embedding of one tagged face
+
+        Args:
+            key: memory_people.id of the tag
+            member_id: family_members.id the face belongs to
+            embedding: Face embedding (any length scale)
+        """
+        vector = normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        if vector.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional embedding, got {vector.shape[1]}")
+
+        with self._lock:
+            self.remove(key)
+            if self._count == len(self._vectors):
+                self._grow()
+            self._vectors[self._count] = vector[0]
+            self._live[self._count] = True
+            self._keys.append(key)
+            self._members.append(member_id)
+            self._rows[key] = self._count
+            self._count += 1
+
+    def remove(self, key: str) -> bool:
+        """Delete the embedding of a tag (returns False if it was not indexed)"""
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return False
+            self._live[row] = False
+            self._keys[row] = self._members[row] = None
+            if len(self._rows) * 2 < self._count:
+                self._compact()
+            return True
+
+    def remove_member(self, member_id: str) -> int:
+        """Delete every embedding of a family member (returns how many)"""
+        with self._lock:
+            keys = [key for key, row in self._rows.items() if self._members[row] == member_id]
+            for key in keys:
+                self.remove(key)
+            return len(keys)
+
+    def search(self, embeddings: np.ndarray, k: int = DEFAULT_TOP_K,
+               min_similarity: float = MATCH_THRESHOLD) -> List[List[Dict[str, Any]]]:
+        """
+        Best matching family members for each query face
+
+        Args:
+            embeddings: Query embeddings, one row per detected face
+            k: Matches returned per face (distinct family members)
+            min_similarity: Cosine similarity below which matches are dropped
+
+        Returns:
+            Per query face, up to k {"family_member_id", "similarity"} dicts,
+            most similar first
+        """
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        with self._lock:
+            count = self._count
+            vectors = self._vectors[:count]
+            live = self._live[:count]
+            members = list(self._members)
+            indexed = len(self._rows)
+        if not indexed or not len(queries):
+            return [[] for _ in range(len(queries))]
+
+        similarities = queries @ vectors.T
+        similarities[:, ~live] = -np.inf
+        candidates = min(count, k * CANDIDATES_PER_MATCH)
+        top = np.argpartition(-similarities, candidates - 1, axis=1)[:, :candidates]
+
+        matches = []
+        for query_index, rows in enumerate(top):
+            scores = similarities[query_index, rows]
+            found: List[Dict[str, Any]] = []
+            seen = set()
+            for row, score in zip(rows[np.argsort(-scores)], np.sort(scores)[::-1]):
+                if score < min_similarity or len(found) == k:
+                    break
+                member_id = members[row]
+                if member_id in seen:
+                    continue
+                seen.add(member_id)
+                found.append({"family_member_id": member_id, "similarity": round(float(score), 4)})
+            matches.append(found)
+        return matches
+
+    def save(self, path: str) -> None:
+        """Write the live rows to <path>.npy and <path>.json (atomically)"""
+        with self._lock:
+            self._compact()
+            vectors = self._vectors[:self._count]
+            meta = {"dim": self.dim, "built_at": self.built_at, "keys": self._keys, "members": self._members}
+
+            directory = os.path.dirname(path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, vectors)
+            os.replace(temp_path, f"{path}.npy")
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".json.tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(temp_path, f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "FaceIndex":
+        """Open a saved index; the matrix stays on disk until it is modified"""
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        index = cls(meta["dim"])
+        index.built_at = meta.get("built_at", 0.0)
+        index._vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        index._count = len(index._vectors)
+        index._live = np.ones(index._count, dtype=bool)
+        index._keys = meta["keys"]
+        index._members = meta["members"]
+        index._rows = {key: row for row, key in enumerate(index._keys)}
+        return index
+
+    def _grow(self) -> None:
+        capacity = max(64, len(self._vectors) * 2)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[:self._count] = self._vectors[:self._count]
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._count] = self._live[:self._count]
+        self._vectors, self._live = vectors, live
+
+    def _compact(self) -> None:
+        live = self._live[:self._count]
+        if live.all():
+            return
+        rows = np.flatnonzero(live)
+        self._vectors = np.ascontiguousarray(self._vectors[rows])
+        self._live = np.ones(len(rows), dtype=bool)
+        self._keys = [self._keys[row] for row in rows]
+        self._members = [self._members[row] for row in rows]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._count = len(rows)
+
+
+def embeddings_from_tags(tags: Iterable[Dict[str, Any]]) -> Iterable[tuple]:
+    """
+    (key, member_id, embedding) of memory_people rows that carry an embedding
+
+    face_detection_data holds the tagged face as stored by FaceDetectionTool:
+    {"bbox": {...}, "embedding": [...]}
+    """
+    for tag in tags:
+        embedding = _embedding_of(tag)
+        if embedding is not None:
+            yield tag["id"], tag["family_member_id"], embedding
+
+
+def _embedding_of(tag: Dict[str, Any]) -> Optional[List[float]]:
+    data = tag.get("face_detection_data")
+    if isinstance(data, str):
+        data = json.loads(data)
+    if isinstance(data, dict) and data.get("embedding") and tag.get("family_member_id"):
+        return data["embedding"]
+    return None
+
+
+class FaceIndexStore:
+    """
+    Per-family indexes, saved under index_dir
+
+    A family's index is opened (memory-mapped) from its saved files when
+    they are younger than max_age, and otherwise built from the family's
+    memory_people rows and saved; apply_tag_events keeps it, and its
+    files, current.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, max_age: float = DEFAULT_MAX_AGE_SECONDS):
+        self.index_dir = index_dir
+        self.max_age = max_age
+        self._indexes: Dict[str, FaceIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, family_id: str, load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> FaceIndex:
+        """
+        Index of a family
+
+        Args:
+            family_id: Family to look up
+            load: Returns the family's memory_people rows (id,
+                family_member_id, face_detection_data); called only when
+                the family has no saved index, or a stale one
+
+        Returns:
+            The index (empty, and not kept, if the family has no saved
+            index and no load is given)
+        """
+        with self._lock:
+            index = self._indexes.get(family_id)
+        if index is not None:
+            return index
+        path = self._path(family_id)
+        saved = FaceIndex.load(path) if os.path.exists(f"{path}.json") else None
+        if load is not None and (saved is None or time.time() - saved.built_at > self.max_age):
+            return self.build(family_id, load())
+        if saved is None:
+            return FaceIndex()
+        with self._lock:
+            return self._indexes.setdefault(family_id, saved)
+
+    def apply_tag_events(self, family_id: str, events: Iterable[Dict[str, Any]]) -> int:
+        """
+        Apply memory_people changes to a family's index and save it
+
+        Tagging a face (insert, or an update that sets the member or
+        embedding) indexes it; untagging (delete, or an update that
+        clears them) removes it. A family with no index yet picks the
+        changes up from the database when it is first used.
+
+        Args:
+            family_id: Family the tags belong to
+            events: Change events on memory_people (see family_sync.normalize_event)
+
+        Returns:
+            Number of events applied
+        """
+        with self._lock:
+            loaded = family_id in self._indexes
+        if not loaded and not os.path.exists(f"{self._path(family_id)}.json"):
+            return 0
+        index = self.get(family_id)
+        applied = 0
+        for event in events:
+            table, operation, row = normalize_event(event)
+            if table != "memory_people" or row.get("id") is None:
+                continue
+            embedding = None if operation == DELETE else _embedding_of(row)
+            if embedding is None:
+                index.remove(row["id"])
+            else:
+                index.add(row["id"], row["family_member_id"], embedding)
+            applied += 1
+        if applied:
+            self.save(family_id)
+        return applied
+
+    def build(self, family_id: str, tags: Iterable[Dict[str, Any]]) -> FaceIndex:
+        """
+        Rebuild a family's index from its memory_people rows and save it
+
+        Args:
+            family_id: Family the tags belong to
+            tags: memory_people rows (id, family_member_id, face_detection_data)
+
+        Returns:
+            The new index
+        """
+        index = FaceIndex()
+        index.built_at = time.time()
+        for key, member_id, embedding in embeddings_from_tags(tags):
+            index.add(key, member_id, embedding)
+        index.save(self._path(family_id))
+        with self._lock:
+            self._indexes[family_id] = index
+        return index
+
+    def save(self, family_id: str) -> None:
+        """Persist incremental changes to a family's index"""
+        self.get(family_id).save(self._path(family_id))
+
+    def _path(self, family_id: str) -> str:
+        # family_id is a UUID; keep only safe characters for the file name
+        safe_id = "".join(c for c in family_id if c.isalnum() or c == "-")
+        return os.path.join(self.index_dir, safe_id)
+
+
+_store: Optional[FaceIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_face_index_store() -> FaceIndexStore:
+    """Process-wide face index store configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FaceIndexStore(
+                os.getenv("FACE_INDEX_DIR", DEFAULT_INDEX_DIR),
+                float(os.getenv("FACE_INDEX_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS))
+            )
+        return _store
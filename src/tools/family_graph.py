@@ -0,0 +1,735 @@
+"""
+Family Graph - Deterministic family tree engine
+Builds the parent, spouse and sibling structure of a family from its
+family_members and relationships rows into compact index arrays, and
+answers tree questions (ancestors, descendants, sibling groups,
+generations, statistics, D3 tree JSON) without the LLM. Row changes are
+applied to a cached graph in place (see family_sync), touching only the
+members below the edit.
+"""
+
+from bisect import insort
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import itertools
+import json
+import os
+import threading
+
+import numpy as np
+
+# relationships rows read "person1 is <relationship_type> of person2"
+PARENT = "parent"
+CHILD = "child"
+SPOUSE = "spouse"
+SIBLING = "sibling"
+
+INDEX_DTYPE = np.int32
+# Generation of members whose ancestry runs through a cycle
+NO_GENERATION = -1
+
+# Families whose graphs (and kinship indexes) stay cached; least recently
+# used ones are dropped and rebuilt from the database when next needed
+DEFAULT_MAX_FAMILIES = 128
+
+# Adjacency lists of a graph: neighbour array name -> offsets array name
+LINKS = {"parents": "parent_offsets", "children": "child_offsets",
+         "spouses": "spouse_offsets", "siblings": "sibling_offsets"}
+
+# One link between two members, however many rows record it:
+# (PARENT, parent, child) or (SPOUSE / SIBLING, lower index, higher index)
+Edge = Tuple[str, int, int]
+
+
+def full_name(member: Dict[str, Any]) -> str:
+    """Display name of a family_members row"""
+    parts = (member.get("first_name"), member.get("middle_name"), member.get("last_name"))
+    return " ".join(part for part in parts if part) or member.get("nickname") or member.get("id", "")
+
+
+def csr_from_edges(sources: np.ndarray, targets: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(offsets, neighbours) of an edge list: node i's are neighbours[offsets[i]:offsets[i + 1]]"""
+    order = np.lexsort((targets, sources))
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=offsets[1:])
+    return offsets, targets[order].astype(INDEX_DTYPE)
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    """np.unique by sorting (faster than its hash path on large integer arrays)"""
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]] if values.size else values
+
+
+def _unique_edges(edges: np.ndarray, size: int) -> np.ndarray:
+    """Distinct (source, target) rows, sorted"""
+    keys = sorted_unique(edges[:, 0].astype(np.int64) * size + edges[:, 1])
+    return np.stack([keys // max(size, 1), keys % max(size, 1)], axis=1).astype(INDEX_DTYPE)
+
+
+def gather_neighbours(offsets: np.ndarray, neighbours: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Neighbours of many nodes at once, with the node each one came from"""
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=INDEX_DTYPE), np.empty(0, dtype=INDEX_DTYPE)
+    # Position of every neighbour: its row start plus its rank inside the row
+    rank = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return neighbours[np.repeat(starts, counts) + rank], np.repeat(nodes, counts)
+
+
+class FamilyGraph:
+    """
+    One family's members and relationships as index arrays
+
+    Members are numbered 0..n-1 in the order given; parent, child, spouse
+    and sibling links are kept in CSR form (an offsets array plus one
+    flat neighbour array per link type), so every traversal step is a few
+    array operations over a whole frontier instead of a Python loop over
+    members. Rows naming unknown members are counted and skipped.
+    """
+
+    def __init__(self, members: Iterable[Dict[str, Any]], relationships: Iterable[Dict[str, Any]]):
+        # Soft-deleted members (is_active false) are left out
+        self.members: List[Dict[str, Any]] = [member for member in members if member.get("is_active") is not False]
+        self.ids: List[str] = [str(member["id"]) for member in self.members]
+        self.index: Dict[str, int] = {member_id: i for i, member_id in enumerate(self.ids)}
+        size = len(self.ids)
+        # Held while applying row changes; readers of a synced graph take it too
+        self.lock = threading.RLock()
+
+        self.birth = np.array([member.get("birth_date") or None for member in self.members],
+                              dtype="datetime64[D]")
+        self.death = np.array([member.get("death_date") or None for member in self.members],
+                              dtype="datetime64[D]")
+        self.deceased = np.array([bool(member.get("is_deceased")) for member in self.members],
+                                 dtype=bool) | ~np.isnat(self.death)
+        # False for removed members (their index is not reused)
+        self.active = np.ones(size, dtype=bool)
+
+        # Rows are tracked per edge: both directions of a link may be
+        # stored as two rows, and deleting one must keep the link
+        self._rows: Dict[str, Edge] = {}
+        self._edge_rows: Dict[Edge, List[Optional[str]]] = {}
+        self._skipped: Dict[str, Dict[str, Any]] = {}
+        self._skipped_without_id = 0
+        self.watermark = max((str(member.get("updated_at") or "") for member in self.members), default="")
+        for row in relationships:
+            self.watermark = max(self.watermark, str(row.get("updated_at") or ""))
+            edge = self._edge(row)
+            row_id = None if row.get("id") is None else str(row["id"])
+            if edge is None:
+                self._skip(row)
+                continue
+            self._edge_rows.setdefault(edge, []).append(row_id)
+            if row_id is not None:
+                self._rows[row_id] = edge
+
+        edges: Dict[str, List[Tuple[int, int]]] = {PARENT: [], SPOUSE: [], SIBLING: []}
+        for kind, first, second in self._edge_rows:
+            edges[kind].append((first, second))
+        parent_edges = _unique_edges(np.array(edges[PARENT], dtype=INDEX_DTYPE).reshape(-1, 2), size)
+        self.parent_of, self.child_of = parent_edges[:, 0], parent_edges[:, 1]
+        self.child_offsets, self.children = csr_from_edges(self.parent_of, self.child_of, size)
+        self.parent_offsets, self.parents = csr_from_edges(self.child_of, self.parent_of, size)
+        self.spouse_offsets, self.spouses = self._symmetric(edges[SPOUSE], size)
+        self.sibling_offsets, self.siblings = self._symmetric(edges[SIBLING], size)
+        self.generation = self._generations()
+
+        # Edits not yet folded into the CSR arrays: link name -> member -> neighbours
+        self._pending: Dict[str, Dict[int, List[int]]] = {name: {} for name in LINKS}
+        # Counts behind statistics(), kept up to date by every edit
+        self._per_generation = Counter(self.generation.tolist())
+        self._deceased_count = int(self.deceased.sum())
+        self._edge_count = {kind: len(pairs) for kind, pairs in edges.items()}
+        self._fragments: Optional[np.ndarray] = None
+        self._stale: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def skipped_rows(self) -> int:
+        """Relationship rows naming unknown members or an unknown type"""
+        return len(self._skipped) + self._skipped_without_id
+
+    def _edge(self, row: Dict[str, Any]) -> Optional[Edge]:
+        """The link a relationships row records, or None if it cannot be placed"""
+        first = self.index.get(str(row.get("person1_id")))
+        second = self.index.get(str(row.get("person2_id")))
+        kind = row.get("relationship_type")
+        if first is None or second is None or first == second:
+            return None
+        if kind == PARENT:
+            return PARENT, first, second
+        if kind == CHILD:
+            return PARENT, second, first
+        if kind in (SPOUSE, SIBLING):
+            return kind, min(first, second), max(first, second)
+        return None
+
+    def _skip(self, row: Dict[str, Any]) -> None:
+        if row.get("id") is None:
+            self._skipped_without_id += 1
+        else:
+            self._skipped[str(row["id"])] = row
+
+    @staticmethod
+    def _symmetric(pairs: List[Tuple[int, int]], size: int) -> Tuple[np.ndarray, np.ndarray]:
+        edges = np.array(pairs, dtype=INDEX_DTYPE).reshape(-1, 2)
+        edges = _unique_edges(np.concatenate([edges, edges[:, ::-1]]), size)
+        return csr_from_edges(edges[:, 0], edges[:, 1], size)
+
+    def _generations(self) -> np.ndarray:
+        """
+        Generation of every member: 0 for members without recorded parents,
+        otherwise one more than their youngest-generation parent
+
+        Kahn's algorithm run a whole level at a time: a member is released
+        once all its parents are, so the level equals its generation.
+        Members on or below an ancestry cycle are never released and keep
+        NO_GENERATION.
+        """
+        size = len(self.ids)
+        generation = np.full(size, NO_GENERATION, dtype=INDEX_DTYPE)
+        waiting = np.diff(self.parent_offsets)
+        frontier = np.flatnonzero(waiting == 0)
+        level = 0
+        while frontier.size:
+            generation[frontier] = level
+            children, _ = gather_neighbours(self.child_offsets, self.children, frontier)
+            if not children.size:
+                break
+            released = np.bincount(children, minlength=size)
+            touched = np.flatnonzero(released)
+            waiting[touched] -= released[touched]
+            frontier = touched[waiting[touched] == 0]
+            level += 1
+        return generation
+
+    def links(self, name: str, i: int) -> List[int]:
+        """Member i's neighbours in one adjacency list ("parents", "children", "spouses", "siblings")"""
+        pending = self._pending[name].get(i)
+        if pending is not None:
+            return pending
+        offsets = getattr(self, LINKS[name])
+        if i + 1 >= offsets.size:
+            return []
+        return getattr(self, name)[offsets[i]:offsets[i + 1]].tolist()
+
+    def compact(self) -> None:
+        """
+        Fold edits made since the last call into the CSR arrays
+
+        Single edits only touch small per-member lists; whole-family
+        operations call this first, paying one linear pass (no traversal)
+        for any number of edits.
+        """
+        size = len(self.ids)
+        if not any(self._pending.values()) and self.parent_offsets.size == size + 1:
+            return
+        for name, offsets_name in LINKS.items():
+            offsets, neighbours = getattr(self, offsets_name), getattr(self, name)
+            owners = np.repeat(np.arange(offsets.size - 1, dtype=INDEX_DTYPE), np.diff(offsets))
+            pending = self._pending[name]
+            if pending:
+                edited = np.fromiter(pending, dtype=INDEX_DTYPE, count=len(pending))
+                keep = ~np.isin(owners, edited)
+                owners = np.concatenate([owners[keep], np.repeat(edited, [len(row) for row in pending.values()])])
+                added = np.fromiter(itertools.chain.from_iterable(pending.values()), dtype=INDEX_DTYPE)
+                neighbours = np.concatenate([neighbours[keep], added])
+                pending.clear()
+            new_offsets, new_neighbours = csr_from_edges(owners, neighbours, size)
+            setattr(self, offsets_name, new_offsets)
+            setattr(self, name, new_neighbours)
+        self.parent_of = np.repeat(np.arange(size, dtype=INDEX_DTYPE), np.diff(self.child_offsets))
+        self.child_of = self.children
+
+    def _nodes(self, member_ids: Iterable[str]) -> np.ndarray:
+        try:
+            return np.array([self.index[str(member_id)] for member_id in member_ids], dtype=INDEX_DTYPE)
+        except KeyError as e:
+            raise KeyError(f"Unknown family member: {e.args[0]}") from None
+
+    def _walk(self, offsets: np.ndarray, neighbours: np.ndarray, start: np.ndarray,
+              max_depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Breadth-first walk from start along one link type
+
+        Returns:
+            (nodes, depth, via): the members reached (start excluded) in
+            the order found, their distance, and the member they were
+            first reached from
+        """
+        self.compact()
+        seen = np.zeros(len(self.ids), dtype=bool)
+        seen[start] = True
+        found, depths, vias = [], [], []
+        frontier, depth = start, 0
+        while frontier.size and (max_depth is None or depth < max_depth):
+            reached, via = gather_neighbours(offsets, neighbours, frontier)
+            fresh = ~seen[reached]
+            reached, via = reached[fresh], via[fresh]
+            # The first path to reach a member wins
+            reached, first = np.unique(reached, return_index=True)
+            via = via[first]
+            seen[reached] = True
+            depth += 1
+            found.append(reached)
+            depths.append(np.full(reached.size, depth, dtype=INDEX_DTYPE))
+            vias.append(via)
+            frontier = reached
+        if not found:
+            empty = np.empty(0, dtype=INDEX_DTYPE)
+            return empty, empty, empty
+        return np.concatenate(found), np.concatenate(depths), np.concatenate(vias)
+
+    def ancestors(self, member_id: str, max_depth: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(member ID, generations up) of every ancestor, nearest first"""
+        nodes, depth, _ = self._walk(self.parent_offsets, self.parents, self._nodes([member_id]), max_depth)
+        return list(zip([self.ids[i] for i in nodes.tolist()], depth.tolist()))
+
+    def descendants(self, member_id: str, max_depth: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(member ID, generations down) of every descendant, nearest first"""
+        nodes, depth, _ = self._walk(self.child_offsets, self.children, self._nodes([member_id]), max_depth)
+        return list(zip([self.ids[i] for i in nodes.tolist()], depth.tolist()))
+
+    def parents_of(self, member_id: str) -> List[str]:
+        return [self.ids[j] for j in self.links("parents", self.index[member_id])]
+
+    def children_of(self, member_id: str) -> List[str]:
+        return [self.ids[j] for j in self.links("children", self.index[member_id])]
+
+    def spouses_of(self, member_id: str) -> List[str]:
+        return [self.ids[j] for j in self.links("spouses", self.index[member_id])]
+
+    def sibling_groups(self) -> List[List[str]]:
+        """
+        Groups of two or more full siblings
+
+        Members sharing exactly the same recorded parents form a group;
+        members without recorded parents are grouped through explicit
+        sibling rows instead. Half-siblings share only some parents and
+        end up in different groups.
+        """
+        self.compact()
+        size = len(self.ids)
+        counts = np.diff(self.parent_offsets)
+        label = np.arange(size, dtype=np.int64)
+
+        # Up to two parents: the (lowest, highest) parent pair is the parent set
+        with_parents = np.flatnonzero((counts > 0) & (counts <= 2))
+        if with_parents.size:
+            starts = self.parent_offsets[with_parents]
+            low = self.parents[starts].astype(np.int64)
+            high = self.parents[starts + counts[with_parents] - 1].astype(np.int64)
+            _, first, inverse = np.unique(low * size + high, return_index=True, return_inverse=True)
+            label[with_parents] = with_parents[first][inverse.reshape(-1)]
+        # More than two recorded parents (adoption, corrections) is rare
+        sets: Dict[Tuple[int, ...], int] = {}
+        for i in np.flatnonzero(counts > 2).tolist():
+            key = tuple(self.parents[self.parent_offsets[i]:self.parent_offsets[i + 1]].tolist())
+            label[i] = sets.setdefault(key, i)
+
+        # Explicit sibling rows between members with no recorded parents
+        for i, j in zip(*self._sibling_pairs_without_parents(counts)):
+            root_i, root_j = self._find(label, i), self._find(label, j)
+            if root_i != root_j:
+                label[max(root_i, root_j)] = min(root_i, root_j)
+        # Point every member straight at its group's representative
+        while True:
+            jumped = label[label]
+            if np.array_equal(jumped, label):
+                break
+            label = jumped
+
+        order = np.argsort(label, kind="stable")
+        boundaries = np.flatnonzero(np.diff(label[order])) + 1
+        return [[self.ids[i] for i in group.tolist()]
+                for group in np.split(order, boundaries) if group.size > 1]
+
+    def _sibling_pairs_without_parents(self, counts: np.ndarray) -> Tuple[List[int], List[int]]:
+        owners = np.repeat(np.arange(len(self.ids), dtype=INDEX_DTYPE), np.diff(self.sibling_offsets))
+        keep = (counts[owners] == 0) & (counts[self.siblings] == 0) & (owners < self.siblings)
+        return owners[keep].tolist(), self.siblings[keep].tolist()
+
+    @staticmethod
+    def _find(label: np.ndarray, i: int) -> int:
+        while label[i] != i:
+            label[i] = label[label[i]]
+            i = int(label[i])
+        return i
+
+    def spouse_pairs(self) -> List[Tuple[str, str]]:
+        self.compact()
+        owners = np.repeat(np.arange(len(self.ids), dtype=INDEX_DTYPE), np.diff(self.spouse_offsets))
+        keep = owners < self.spouses
+        return [(self.ids[i], self.ids[j]) for i, j in zip(owners[keep].tolist(), self.spouses[keep].tolist())]
+
+    def statistics(self) -> Dict[str, Any]:
+        """Member, generation and living/deceased counts (kept as counters, so O(generations))"""
+        generations = max((g + 1 for g, count in self._per_generation.items() if count and g >= 0), default=0)
+        total = len(self.index)
+        return {
+            "total_members": total,
+            "living": total - self._deceased_count,
+            "deceased": self._deceased_count,
+            "generations": generations,
+            "members_per_generation": [self._per_generation[g] for g in range(generations)],
+            "parent_child_links": self._edge_count[PARENT],
+            "spouse_pairs": self._edge_count[SPOUSE],
+            # Members on or below an ancestry cycle (see validation)
+            "unplaced_members": self._per_generation[NO_GENERATION],
+            "skipped_relationships": self.skipped_rows
+        }
+
+    def to_d3(self, focus_person_id: Optional[str] = None) -> Dict[str, Any]:
+        """d3_json() parsed (for Python callers; the API sends the text as is)"""
+        return json.loads(self.d3_json(focus_person_id))
+
+    def d3_json(self, focus_person_id: Optional[str] = None) -> str:
+        """
+        Nested {"id", "name", ..., "children": [...]} tree for d3.hierarchy, as JSON
+
+        Without a focus person the root is the whole family and every
+        member appears once, under a parent one generation above (members
+        without parents, or on an ancestry cycle, sit at the top). With a
+        focus person the tree holds the focus person and their
+        descendants; a child of two members both in the tree is placed
+        under the first one reached. Spouses are listed on each node
+        rather than nested.
+
+        The text is assembled from per-member fragments (formatted once
+        per graph) in an order computed with array operations, one tree
+        level at a time, so no dict is built per member.
+        """
+        self.compact()
+        size = len(self.ids)
+        tree_parent = np.full(size, -1, dtype=np.int64)
+        depth = np.zeros(size, dtype=np.int64)
+        if focus_person_id is None:
+            generation = self.generation
+            step = (generation[self.child_of] == generation[self.parent_of] + 1) & (generation[self.parent_of] >= 0)
+            # Reversed so the parent earliest in member order wins
+            tree_parent[self.child_of[step][::-1]] = self.parent_of[step][::-1]
+            nodes = np.flatnonzero(self.active)
+            depth[tree_parent >= 0] = generation[tree_parent >= 0]
+        else:
+            focus = self._nodes([focus_person_id])
+            reached, reached_depth, via = self._walk(self.child_offsets, self.children, focus)
+            tree_parent[reached] = via
+            depth[reached] = reached_depth
+            nodes = np.concatenate([focus, reached])
+        if not nodes.size:
+            return '{"id": "family", "name": "Family", "generation": -1, "children": []}'
+
+        # Nodes of each level, grouped by tree parent (member or BFS order within)
+        by_depth = nodes[np.argsort(depth[nodes], kind="stable")]
+        bounds = np.searchsorted(depth[by_depth], np.arange(1, int(depth[by_depth[-1]]) + 1))
+        levels = [at_level[np.argsort(tree_parent[at_level], kind="stable")]
+                  for at_level in np.split(by_depth, bounds)]
+
+        # Subtree sizes, bottom-up
+        subtree = np.zeros(size, dtype=np.int64)
+        subtree[nodes] = 1
+        for at_level in reversed(levels[1:]):
+            subtree += np.bincount(tree_parent[at_level], weights=subtree[at_level], minlength=size).astype(np.int64)
+
+        # Pre-order positions, top-down: a node follows its parent and the
+        # subtrees of its earlier siblings
+        position = np.zeros(size, dtype=np.int64)
+        first_child = np.zeros(size, dtype=bool)
+        for level, at_level in enumerate(levels):
+            sizes = subtree[at_level]
+            before = np.cumsum(sizes) - sizes
+            starts = np.flatnonzero(np.r_[True, tree_parent[at_level][1:] != tree_parent[at_level][:-1]])
+            before -= np.repeat(before[starts], np.diff(np.r_[starts, at_level.size]))
+            first_child[at_level[starts]] = True
+            position[at_level] = before if level == 0 else position[tree_parent[at_level]] + 1 + before
+
+        order = np.empty(nodes.size, dtype=np.int64)
+        order[position[nodes]] = nodes
+        # Children lists closed right after each position: one per subtree ending there
+        closes = np.bincount(position[nodes] + subtree[nodes] - 1, minlength=nodes.size)
+
+        pieces = np.empty(3 * nodes.size, dtype=object)
+        pieces[0::3] = np.array([", ", ""], dtype=object)[first_child[order].astype(np.int64)]
+        pieces[1::3] = self._d3_fragments()[order]
+        closers = np.array(["]}" * count for count in range(int(closes.max()) + 1)], dtype=object)
+        pieces[2::3] = closers[closes]
+        body = "".join(pieces.tolist())
+        if focus_person_id is not None:
+            return body
+        return '{"id": "family", "name": "Family", "generation": -1, "children": [' + body + "]}"
+
+    def _d3_fragments(self) -> np.ndarray:
+        """Opening '{"id": ..., "children": [' of every member's D3 node (edited members re-formatted)"""
+        if self._fragments is None:
+            generation = self.generation.tolist()
+            deceased = self.deceased.tolist()
+            spouse_offsets = self.spouse_offsets.tolist()
+            spouses = self.spouses.tolist()
+            fragments = np.empty(len(self.ids), dtype=object)
+            for i in range(len(self.ids)):
+                fragments[i] = self._fragment(i, generation[i], deceased[i],
+                                              spouses[spouse_offsets[i]:spouse_offsets[i + 1]])
+            self._fragments = fragments
+        else:
+            if self._fragments.size < len(self.ids):
+                grown = np.empty(len(self.ids) - self._fragments.size, dtype=object)
+                self._fragments = np.concatenate([self._fragments, grown])
+            for i in self._stale:
+                self._fragments[i] = self._fragment(i, int(self.generation[i]), bool(self.deceased[i]),
+                                                    self.links("spouses", i))
+        self._stale.clear()
+        return self._fragments
+
+    def _fragment(self, i: int, generation: int, deceased: bool, spouses: List[int]) -> str:
+        spouse_ids = [self.ids[j] for j in spouses]
+        return (f'{{"id": {json.dumps(self.ids[i])}, "name": {json.dumps(full_name(self.members[i]))}, '
+                f'"generation": {generation}, "is_deceased": {json.dumps(deceased)}, '
+                f'"spouses": {json.dumps(spouse_ids)}, "children": [')
+
+    # Row changes. Each returns the members whose parents changed ("roots");
+    # refresh_generations(roots) then renumbers the generations below them.
+
+    def upsert_member(self, member: Dict[str, Any]) -> Tuple[int, bool]:
+        """
+        Add a member or replace the row of an existing one
+
+        Returns:
+            (member index, whether the member is new)
+        """
+        member_id = str(member["id"])
+        birth = np.datetime64(member.get("birth_date") or None, "D")
+        death = np.datetime64(member.get("death_date") or None, "D")
+        deceased = bool(member.get("is_deceased")) or not np.isnat(death)
+        i = self.index.get(member_id)
+        new = i is None
+        if new:
+            i = self.index[member_id] = len(self.ids)
+            self.ids.append(member_id)
+            self.members.append(member)
+            self.birth = np.append(self.birth, birth)
+            self.death = np.append(self.death, death)
+            self.deceased = np.append(self.deceased, False)
+            self.active = np.append(self.active, True)
+            self.generation = np.append(self.generation, np.array([0], dtype=INDEX_DTYPE))
+            self._per_generation[0] += 1
+        else:
+            self.members[i] = member
+            self.birth[i], self.death[i] = birth, death
+        if deceased != self.deceased[i]:
+            self.deceased[i] = deceased
+            self._deceased_count += 1 if deceased else -1
+        self._stale.add(i)
+        return i, new
+
+    def remove_member(self, member_id: str) -> List[int]:
+        """Drop a member and every link to them; returns their children and siblings"""
+        i = self.index.pop(str(member_id), None)
+        if i is None:
+            return []
+        edges = ([(PARENT, j, i) for j in self.links("parents", i)] +
+                 [(PARENT, i, j) for j in self.links("children", i)] +
+                 [(SPOUSE, min(i, j), max(i, j)) for j in self.links("spouses", i)] +
+                 [(SIBLING, min(i, j), max(i, j)) for j in self.links("siblings", i)])
+        roots = []
+        for edge in edges:
+            # Rows still naming the member are skipped from now on, as in a rebuild
+            for row_id in self._edge_rows.pop(edge):
+                kind, first, second = edge
+                self._skip({"id": row_id, "person1_id": self.ids[first], "person2_id": self.ids[second],
+                            "relationship_type": kind})
+                if row_id is not None:
+                    del self._rows[row_id]
+            roots += self._link(edge, add=False)
+        self.active[i] = False
+        self._per_generation[int(self.generation[i])] -= 1
+        self.generation[i] = NO_GENERATION
+        if self.deceased[i]:
+            self.deceased[i] = False
+            self._deceased_count -= 1
+        return [j for j in roots if j != i]
+
+    def add_relationship(self, row: Dict[str, Any]) -> List[int]:
+        """Insert a relationships row, or apply an update to one (matched by its id)"""
+        row_id = None if row.get("id") is None else str(row["id"])
+        edge = self._edge(row)
+        roots = []
+        if row_id is not None:
+            if edge is not None and self._rows.get(row_id) == edge:
+                return []
+            roots += self.remove_relationship(row_id)
+        if edge is None:
+            self._skip(row)
+            return roots
+        if row_id is not None:
+            self._rows[row_id] = edge
+        rows = self._edge_rows.setdefault(edge, [])
+        rows.append(row_id)
+        if len(rows) == 1:
+            roots += self._link(edge, add=True)
+        return roots
+
+    def remove_relationship(self, row_id: Any) -> List[int]:
+        """Delete a relationships row by id"""
+        row_id = str(row_id)
+        self._skipped.pop(row_id, None)
+        edge = self._rows.pop(row_id, None)
+        if edge is None:
+            return []
+        rows = self._edge_rows[edge]
+        rows.remove(row_id)
+        if rows:
+            return []
+        del self._edge_rows[edge]
+        return self._link(edge, add=False)
+
+    def retry_skipped(self) -> List[int]:
+        """Place skipped rows whose members have since been added"""
+        roots = []
+        for row in list(self._skipped.values()):
+            if self._edge(row) is not None:
+                roots += self.add_relationship(row)
+        return roots
+
+    def _editable(self, name: str, i: int) -> List[int]:
+        row = self._pending[name].get(i)
+        if row is None:
+            row = self._pending[name][i] = list(self.links(name, i))
+        return row
+
+    def _link(self, edge: Edge, add: bool) -> List[int]:
+        """
+        Add or remove one link in both members' adjacency lists
+
+        Returns the members whose parents changed: the child of a parent
+        link, or both ends of a sibling link (which stands for a shared
+        parent that is not recorded).
+        """
+        kind, first, second = edge
+        if kind == PARENT:
+            sides = (("children", first, second), ("parents", second, first))
+        else:
+            name = "spouses" if kind == SPOUSE else "siblings"
+            sides = ((name, first, second), (name, second, first))
+        for name, owner, other in sides:
+            row = self._editable(name, owner)
+            if add:
+                insort(row, other)
+            else:
+                row.remove(other)
+        self._edge_count[kind] += 1 if add else -1
+        if kind == SPOUSE:
+            self._stale.update((first, second))
+        if kind == SIBLING:
+            return [first, second]
+        return [second] if kind == PARENT else []
+
+    def _set_generation(self, i: int, generation: int) -> None:
+        old = int(self.generation[i])
+        if old != generation:
+            self._per_generation[old] -= 1
+            self._per_generation[generation] += 1
+            self.generation[i] = generation
+            self._stale.add(i)
+
+    def refresh_generations(self, roots: Iterable[int]) -> Set[int]:
+        """
+        Renumber the generations of roots and everything below them
+
+        Kahn's algorithm restricted to the roots' descendants, reading the
+        (already correct) generations of parents outside that set; cost is
+        the size of the affected subtrees, not of the family.
+
+        Returns:
+            Members whose generation changed
+        """
+        affected: Set[int] = set()
+        stack = [i for i in roots if self.active[i]]
+        while stack:
+            i = stack.pop()
+            if i not in affected:
+                affected.add(i)
+                stack.extend(self.links("children", i))
+
+        waiting = {i: sum(1 for j in self.links("parents", i) if j in affected) for i in affected}
+        ready = [i for i, count in waiting.items() if not count]
+        placed: Dict[int, int] = {}
+        while ready:
+            i = ready.pop()
+            parents = [placed[j] if j in affected else int(self.generation[j]) for j in self.links("parents", i)]
+            placed[i] = (NO_GENERATION if NO_GENERATION in parents else max(parents) + 1) if parents else 0
+            for child in self.links("children", i):
+                waiting[child] -= 1
+                if not waiting[child]:
+                    ready.append(child)
+
+        changed = set()
+        for i in affected:
+            # Never released: on or below a cycle inside the affected set
+            generation = placed.get(i, NO_GENERATION)
+            if generation != self.generation[i]:
+                self._set_generation(i, generation)
+                changed.add(i)
+        return changed
+
+
+class FamilyGraphStore:
+    """
+    Graphs of recently used families, kept current by family_sync or rebuilt on demand
+
+    At most max_families graphs are kept, with LRU eviction.
+    """
+
+    def __init__(self, max_families: int = DEFAULT_MAX_FAMILIES):
+        self.max_families = max_families
+        self._graphs: "OrderedDict[str, FamilyGraph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, family_id: str) -> Optional[FamilyGraph]:
+        with self._lock:
+            graph = self._graphs.get(family_id)
+            if graph is not None:
+                self._graphs.move_to_end(family_id)
+            return graph
+
+    def build(self, family_id: str, members: Iterable[Dict[str, Any]],
+              relationships: Iterable[Dict[str, Any]]) -> FamilyGraph:
+        """
+        Build a family's graph from its rows and cache it
+
+        Args:
+            family_id: Family the rows belong to
+            members: family_members rows (id, names, birth/death dates, is_deceased)
+            relationships: relationships rows (person1_id, person2_id, relationship_type)
+
+        Returns:
+            The new graph
+        """
+        graph = FamilyGraph(members, relationships)
+        with self._lock:
+            self._graphs[family_id] = graph
+            self._graphs.move_to_end(family_id)
+            while len(self._graphs) > self.max_families:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def invalidate(self, family_id: str) -> None:
+        with self._lock:
+            self._graphs.pop(family_id, None)
+
+
+_store: Optional[FamilyGraphStore] = None
+_store_lock = threading.Lock()
+
+
+def get_family_graph_store() -> FamilyGraphStore:
+    """Process-wide family graph store configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FamilyGraphStore(int(os.getenv("FAMILY_GRAPH_CACHE_SIZE", DEFAULT_MAX_FAMILIES)))
+        return _store
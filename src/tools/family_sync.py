@@ -0,0 +1,111 @@
+"""
+Family Sync - Apply family_members and relationships changes to cached graphs
+Takes change events (Supabase realtime payloads, or rows edited after the
+graph's watermark) and patches the cached FamilyGraph and its kinship
+index in place, so an edit costs time proportional to the members below
+it rather than a rebuild of the whole family.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .family_graph import FamilyGraph
+from .kinship import KinshipIndex
+
+MEMBERS = "family_members"
+RELATIONSHIPS = "relationships"
+
+INSERT = "INSERT"
+UPDATE = "UPDATE"
+DELETE = "DELETE"
+
+
+def normalize_event(event: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    (table, operation, row) of a change event
+
+    Accepts realtime payloads ({"table", "eventType", "new", "old"}, or
+    "type" / "record" / "old_record" as sent by database webhooks).
+    Updates and inserts carry the new row, deletes the old one.
+    """
+    table = event.get("table") or ""
+    operation = str(event.get("eventType") or event.get("type") or UPDATE).upper()
+    if operation == DELETE:
+        row = event.get("old") or event.get("old_record") or {}
+    else:
+        row = event.get("new") or event.get("record") or {}
+    return table, operation, row
+
+
+def change_events(member_rows: Iterable[Dict[str, Any]],
+                  relationship_rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Events for rows read back by updated_at (see get_*_changes queries)
+
+    Such a feed only shows rows that still exist: soft-deleted members
+    (is_active false) are removed, but hard-deleted relationships need
+    DELETE events or a rebuild.
+    """
+    return ([{"table": MEMBERS, "eventType": UPDATE, "new": row} for row in member_rows] +
+            [{"table": RELATIONSHIPS, "eventType": UPDATE, "new": row} for row in relationship_rows])
+
+
+def apply_changes(graph: FamilyGraph, events: Iterable[Dict[str, Any]],
+                  kinship: Optional[KinshipIndex] = None) -> Dict[str, Any]:
+    """
+    Apply change events to a family graph (and its kinship index)
+
+    Member events go first, so relationships added in the same batch
+    find their members. Generations and kinship tables are then
+    recomputed only below the members whose parents changed.
+
+    Args:
+        graph: Cached graph of the family
+        events: Change events, oldest first (see normalize_event)
+        kinship: The graph's kinship index, if one is built
+
+    Returns:
+        Dictionary with the number of "applied" and "ignored" events,
+        "generation_changes", "kinship_tables" recomputed and the new
+        "watermark"
+    """
+    changes = [normalize_event(event) for event in events]
+    member_changes = [change for change in changes if change[0] == MEMBERS]
+    relationship_changes = [change for change in changes if change[0] == RELATIONSHIPS]
+    ignored = len(changes) - len(member_changes) - len(relationship_changes)
+
+    with graph.lock:
+        roots, edited = set(), set()
+        added = False
+        for _table, operation, row in member_changes:
+            if row.get("id") is None:
+                ignored += 1
+            elif operation == DELETE or row.get("is_active") is False:
+                roots.update(graph.remove_member(row["id"]))
+            else:
+                i, new = graph.upsert_member(row)
+                edited.add(i)
+                if new:
+                    roots.add(i)
+                    added = True
+        if added:
+            roots.update(graph.retry_skipped())
+        for _table, operation, row in relationship_changes:
+            if operation == DELETE:
+                if row.get("id") is None:
+                    ignored += 1
+                else:
+                    roots.update(graph.remove_relationship(row["id"]))
+            else:
+                roots.update(graph.add_relationship(row))
+
+        for _table, _operation, row in changes:
+            graph.watermark = max(graph.watermark, str(row.get("updated_at") or ""))
+        changed = graph.refresh_generations(roots)
+        tables = kinship.update(roots, edited) if kinship is not None else 0
+        return {
+            "applied": len(changes) - ignored,
+            "ignored": ignored,
+            "generation_changes": len(changed),
+            "kinship_tables": tables,
+            "watermark": graph.watermark or None
+        }
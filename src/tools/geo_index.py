@@ -0,0 +1,295 @@
+"""
+Geo Index - Grid spatial index over memory locations
+Radius queries ("photos within 2 km of this village"), place clustering,
+and the private-residence check of the Privacy Guard
+"""
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Grid cell of 0.01 degrees (about 1.1 km north-south)
+DEFAULT_CELL_DEGREES = 0.01
+# Distance within which a photo location counts as "at" a private residence
+PRIVATE_RADIUS_KM = 0.5
+# Distance linking two memories into the same place
+PLACE_RADIUS_KM = 0.3
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances from one point to many"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def location_of(data: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from a gps_info-style dict, or None"""
+    if not data:
+        return None
+    latitude = data.get("latitude", data.get("lat"))
+    longitude = data.get("longitude", data.get("lng"))
+    if latitude is None or longitude is None:
+        return None
+    return float(latitude), float(longitude)
+
+
+class GeoIndex:
+    """
+    Points bucketed into a fixed latitude/longitude grid
+
+    A radius query only visits the cells overlapping the circle's bounding
+    box (widened in longitude towards the poles, wrapped at the
+    antimeridian) and measures exact distances for the points found there.
+    """
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.lon_cells = int(round(360 / cell_degrees))
+        self._points: Dict[str, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, key: str, lat: float, lon: float) -> None:
+        """Index a location (replaces the key's previous location)"""
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Invalid coordinates: {lat}, {lon}")
+        with self._lock:
+            self._discard(key)
+            self._points[key] = (lat, lon)
+            self._cells[self._cell(lat, lon)].add(key)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            return self._discard(key)
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[str, float]]:
+        """
+        Points within radius_km of a location
+
+        Returns:
+            (key, distance_km) pairs, nearest first
+        """
+        with self._lock:
+            cells = self._candidate_cells(lat, lon, radius_km)
+            if cells is None:
+                keys = list(self._points)
+            else:
+                keys = [key for cell in cells for key in self._cells.get(cell, ())]
+            coordinates = np.array([self._points[key] for key in keys], dtype=np.float64).reshape(-1, 2)
+
+        if not keys:
+            return []
+        distances = haversine_km(lat, lon, coordinates[:, 0], coordinates[:, 1])
+        order = np.argsort(distances, kind="stable")
+        return [(keys[i], round(float(distances[i]), 4)) for i in order if distances[i] <= radius_km]
+
+    def nearest(self, lat: float, lon: float, radius_km: float) -> Optional[Tuple[str, float]]:
+        """Closest point within radius_km, if any"""
+        matches = self.within(lat, lon, radius_km)
+        return matches[0] if matches else None
+
+    def clusters(self, radius_km: float = PLACE_RADIUS_KM, min_points: int = 2) -> List[Dict[str, Any]]:
+        """
+        Group points into places
+
+        Points closer than radius_km are linked, and linked points form one
+        place (single linkage). Places smaller than min_points are left out.
+
+        Returns:
+            Places with their keys, centre and radius, largest first
+        """
+        with self._lock:
+            points = dict(self._points)
+
+        parent = {key: key for key in points}
+
+        def find(key: str) -> str:
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, (lat, lon) in points.items():
+            for other, _distance in self.within(lat, lon, radius_km):
+                if other in parent:
+                    parent[find(other)] = find(key)
+
+        groups: Dict[str, List[str]] = defaultdict(list)
+        for key in points:
+            groups[find(key)].append(key)
+
+        places = []
+        for keys in groups.values():
+            if len(keys) < min_points:
+                continue
+            coordinates = np.array([points[key] for key in keys])
+            center_lat, center_lon = self._centroid(coordinates)
+            radius = haversine_km(center_lat, center_lon, coordinates[:, 0], coordinates[:, 1]).max()
+            places.append({
+                "keys": sorted(keys),
+                "center": {"latitude": round(center_lat, 6), "longitude": round(center_lon, 6)},
+                "radius_km": round(float(radius), 4),
+                "count": len(keys)
+            })
+        places.sort(key=lambda place: (-place["count"], place["keys"][0]))
+        return places
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = int(math.floor((lat + 90) / self.cell_degrees))
+        column = int(math.floor((lon + 180) / self.cell_degrees)) % self.lon_cells
+        return row, column
+
+    def _candidate_cells(self, lat: float, lon: float, radius_km: float) -> Optional[List[Tuple[int, int]]]:
+        """Cells overlapping the query circle (None: cheaper to scan every point)"""
+        delta_lat = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(90.0, abs(lat) + delta_lat)))
+        if cos_lat < 1e-6:
+            return None
+        delta_lon = delta_lat / cos_lat
+        if delta_lon >= 180:
+            return None
+
+        first_row = self._cell(max(-90.0, lat - delta_lat), 0.0)[0]
+        last_row = self._cell(min(90.0, lat + delta_lat), 0.0)[0]
+        # Unwrapped column numbers; the modulo wraps them at the antimeridian
+        first_column = int(math.floor((lon - delta_lon + 180) / self.cell_degrees))
+        last_column = int(math.floor((lon + delta_lon + 180) / self.cell_degrees))
+        if (last_row - first_row + 1) * (last_column - first_column + 1) > len(self._cells):
+            return None
+        return [(row, column % self.lon_cells)
+                for row in range(first_row, last_row + 1)
+                for column in range(first_column, last_column + 1)]
+
+    @staticmethod
+    def _centroid(coordinates: np.ndarray) -> Tuple[float, float]:
+        """Mean position on the sphere (safe across the antimeridian)"""
+        lats, lons = np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+        x = (np.cos(lats) * np.cos(lons)).mean()
+        y = (np.cos(lats) * np.sin(lons)).mean()
+        z = np.sin(lats).mean()
+        return (math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x)))
+
+    def _discard(self, key: str) -> bool:
+        point = self._points.pop(key, None)
+        if point is None:
+            return False
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+        return True
+
+
+def _field(row: Dict[str, Any], key: str) -> Any:
+    """A metadata key, selected on its own (key:metadata->key) or inside metadata"""
+    return row[key] if key in row else (row.get("metadata") or {}).get(key)
+
+
+class GeoIndexStore:
+    """
+    Per-family geo indexes: memory locations (memories.metadata["gps"])
+    and private residences (family_members.metadata["home_location"]),
+    each built from the family's rows the first time it is needed
+    """
+
+    def __init__(self):
+        self._memories: Dict[str, GeoIndex] = {}
+        self._residences: Dict[str, GeoIndex] = {}
+        self._lock = threading.Lock()
+
+    def memories(self, family_id: str,
+                 load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> GeoIndex:
+        """
+        A family's memory index, built from load() (memories rows) on first use
+
+        Without load, a family that is not indexed yet gets an empty
+        index that is not kept.
+        """
+        return self._index(self._memories, family_id, load, self.build_memories)
+
+    def residences(self, family_id: str,
+                   load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None) -> GeoIndex:
+        """A family's residence index, built from load() (family_members rows) on first use"""
+        return self._index(self._residences, family_id, load, self.build_residences)
+
+    def _index(self, indexes: Dict[str, GeoIndex], family_id: str,
+               load: Optional[Callable[[], Iterable[Dict[str, Any]]]],
+               build: Callable[[str, Iterable[Dict[str, Any]]], GeoIndex]) -> GeoIndex:
+        with self._lock:
+            index = indexes.get(family_id)
+        if index is not None:
+            return index
+        return build(family_id, load()) if load is not None else GeoIndex()
+
+    def add_memory(self, family_id: str, memory_id: str, lat: float, lon: float) -> None:
+        """Index a newly analysed memory (families not indexed yet pick it up when built)"""
+        with self._lock:
+            index = self._memories.get(family_id)
+        if index is not None:
+            index.add(memory_id, lat, lon)
+
+    def invalidate(self, family_id: str) -> None:
+        """Forget a family's indexes; they are rebuilt on next use"""
+        with self._lock:
+            self._memories.pop(family_id, None)
+            self._residences.pop(family_id, None)
+
+    def invalidate_residences(self, family_id: str) -> None:
+        """Forget a family's residence index (members changed); rebuilt on next use"""
+        with self._lock:
+            self._residences.pop(family_id, None)
+
+    def build_memories(self, family_id: str, memories: Iterable[Dict[str, Any]]) -> GeoIndex:
+        """Index the memories rows of a family that carry GPS coordinates"""
+        index = GeoIndex()
+        for memory in memories:
+            location = location_of(_field(memory, "gps"))
+            if location:
+                index.add(memory["id"], *location)
+        with self._lock:
+            self._memories[family_id] = index
+        return index
+
+    def build_residences(self, family_id: str, members: Iterable[Dict[str, Any]]) -> GeoIndex:
+        """Index the home locations of a family's members"""
+        index = GeoIndex()
+        for member in members:
+            location = location_of(_field(member, "home_location"))
+            if location:
+                index.add(member["id"], *location)
+        with self._lock:
+            self._residences[family_id] = index
+        return index
+
+    def private_residence_near(self, family_id: str, lat: float, lon: float,
+                               radius_km: float = PRIVATE_RADIUS_KM,
+                               load: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None
+                               ) -> Optional[Tuple[str, float]]:
+        """(family_members.id, distance_km) of a residence within radius_km, if any"""
+        return self.residences(family_id, load).nearest(lat, lon, radius_km)
+
+
+_store: Optional[GeoIndexStore] = None
+_store_lock = threading.Lock()
+
+
+def get_geo_index_store() -> GeoIndexStore:
+    """Process-wide geo index store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = GeoIndexStore()
+        return _store
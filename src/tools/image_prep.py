@@ -0,0 +1,36 @@
+"""
+Image Preparation - Shrink images to model size before inference
+"""
+
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# BLIP-large works at 384px; a little headroom keeps captions sharp
+MODEL_MAX_SIDE = 512
+MODEL_JPEG_QUALITY = 85
+
+
+def prepare_image(image_path: str, max_side: int = MODEL_MAX_SIDE,
+                  quality: int = MODEL_JPEG_QUALITY) -> bytes:
+    """
+    Decode an image at reduced size and re-encode it as a compact JPEG
+
+    Args:
+        image_path: Local path of the original image
+        max_side: Longest side of the prepared image in pixels
+        quality: JPEG quality of the prepared image
+
+    Returns:
+        JPEG bytes, upright (EXIF orientation applied) and at most max_side
+    """
+    with Image.open(image_path) as image:
+        # JPEG draft mode decodes straight at 1/2, 1/4 or 1/8 scale
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
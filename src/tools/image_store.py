@@ -0,0 +1,382 @@
+"""
+Image Store - Shared image acquisition for the Memory Curator image tools
+Pooled HTTP fetches, coalesced concurrent downloads and a bounded,
+content-addressed on-disk cache with LRU eviction
+"""
+
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+import hashlib
+import io
+import mmap
+import os
+import re
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..metrics import record_bytes
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "bfl-image-cache")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+REQUEST_TIMEOUT = (5, 60)  # connect, read (seconds)
+RANGE_BLOCK_SIZE = 64 * 1024
+
+
+def is_remote(image_url: str) -> bool:
+    """True for http(s) URLs, False for local paths"""
+    return image_url.startswith("http")
+
+
+class ImageStore:
+    """
+    Content-addressed image cache shared by all image tools
+
+    Blobs live under <cache_dir>/blobs/<sha256 of content>, and each URL maps
+    to its blob through <cache_dir>/urls/<sha256 of URL>. The same photo
+    reached through several URLs is stored once. Blob modification times
+    record last use, and the least recently used blobs are evicted once the
+    cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 session: Optional[requests.Session] = None, pool_size: int = 16):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.url_dir = os.path.join(cache_dir, "urls")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.url_dir, exist_ok=True)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(self.blob_dir) if entry.is_file()
+        )
+
+    def get_path(self, image_url: str) -> str:
+        """
+        Local file holding the image
+
+        Args:
+            image_url: URL or local path of the image
+
+        Returns:
+            Path of the cached blob (remote images) or the path itself
+        """
+        if not is_remote(image_url):
+            return image_url
+
+        url_key = hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+        path = self._cached_blob(url_key)
+        if path:
+            return path
+
+        # Coalesce concurrent fetches of the same URL into one download
+        with self._lock:
+            future = self._inflight.get(url_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[url_key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            path = self._cached_blob(url_key) or self._download(image_url, url_key)
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(url_key, None)
+
+    def peek_path(self, image_url: str) -> Optional[str]:
+        """Local file for the image if it is available without downloading"""
+        if not is_remote(image_url):
+            return image_url
+        return self._cached_blob(hashlib.sha256(image_url.encode("utf-8")).hexdigest())
+
+    def open_range(self, image_url: str, block_size: int = RANGE_BLOCK_SIZE) -> "HTTPRangeFile":
+        """Seekable file over a remote image that only fetches the blocks read"""
+        return HTTPRangeFile(self.session, image_url, block_size)
+
+    def get_bytes(self, image_url: str) -> bytes:
+        """Image content as bytes"""
+        with open(self.get_path(image_url), "rb") as f:
+            return f.read()
+
+    def open_mmap(self, image_url: str) -> mmap.mmap:
+        """Read-only memory-mapped view of the image (caller closes it)"""
+        with open(self.get_path(image_url), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_derived(self, image_url: str, variant: str, build: Callable[[str], bytes]) -> bytes:
+        """
+        Derived artifact of an image (e.g. a model-sized copy), cached next to it
+
+        Args:
+            image_url: URL or local path of the original image
+            variant: Name of the derivation, part of the cache key
+            build: Produces the artifact from the original's local path
+
+        Returns:
+            Artifact bytes, built once per image content and variant
+        """
+        path = self.get_path(image_url)
+        derived_path = os.path.join(self.blob_dir, f"{self.digest(image_url)}.{variant}")
+        try:
+            with open(derived_path, "rb") as f:
+                data = f.read()
+            os.utime(derived_path)
+            return data
+        except OSError:
+            pass
+
+        data = build(path)
+        temp_path = f"{derived_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            existed = os.path.exists(derived_path)
+            os.replace(temp_path, derived_path)
+            if not existed:
+                self._total_bytes += len(data)
+        self._evict(keep=derived_path)
+        return data
+
+    def digest(self, image_url: str) -> str:
+        """SHA-256 of the image content"""
+        path = self.get_path(image_url)
+        if os.path.dirname(path) == self.blob_dir:
+            return os.path.basename(path)
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def _cached_blob(self, url_key: str) -> Optional[str]:
+        """Blob path for a URL already in the cache (marks it as used)"""
+        try:
+            with open(os.path.join(self.url_dir, url_key)) as f:
+                path = os.path.join(self.blob_dir, f.read().strip())
+            os.utime(path)
+            return path
+        except OSError:
+            return None
+
+    def _download(self, image_url: str, url_key: str) -> str:
+        """Stream the image to disk while hashing it, then file it by content"""
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with self.session.get(image_url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    response.raise_for_status()
+                    for block in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        hasher.update(block)
+                        f.write(block)
+
+            digest = hasher.hexdigest()
+            blob_path = os.path.join(self.blob_dir, digest)
+            size = os.path.getsize(temp_path)
+            record_bytes(size, "http")
+            with self._lock:
+                if os.path.exists(blob_path):
+                    os.remove(temp_path)
+                    os.utime(blob_path)
+                else:
+                    os.replace(temp_path, blob_path)
+                    self._total_bytes += size
+            self._write_url_entry(url_key, digest)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._evict(keep=blob_path)
+        return blob_path
+
+    def _write_url_entry(self, url_key: str, digest: str) -> None:
+        entry_path = os.path.join(self.url_dir, url_key)
+        temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(digest)
+        os.replace(temp_path, entry_path)
+
+    def _evict(self, keep: str) -> None:
+        """Remove least recently used blobs until the cache fits max_bytes"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            entries = sorted(
+                (entry for entry in os.scandir(self.blob_dir) if entry.is_file()),
+                key=lambda entry: entry.stat().st_mtime
+            )
+            for entry in entries:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if entry.path == keep:
+                    continue
+                size = entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self._total_bytes -= size
+        # URL entries pointing at evicted blobs are treated as misses
+
+
+class HTTPRangeFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a remote file backed by HTTP Range requests
+
+    Blocks are fetched on first access, so parsing an image header costs a
+    few kilobytes whatever the image size. Servers that ignore Range are
+    read sequentially and the connection is dropped once the reader stops.
+    """
+
+    def __init__(self, session: requests.Session, url: str, block_size: int = RANGE_BLOCK_SIZE):
+        super().__init__()
+        self.session = session
+        self.url = url
+        self.block_size = block_size
+        self.size: Optional[int] = None
+        self.bytes_fetched = 0
+        self._position = 0
+        self._blocks: Dict[int, bytes] = {}
+        self._stream = None       # response of a server without Range support
+        self._stream_data = bytearray()
+
+        response = self._get_range(0, block_size - 1, stream=True)
+        if response.status_code == 206:
+            self.size = self._total_size(response)
+            self._store_block(0, response.content)
+            response.close()
+        else:
+            self._stream = response
+            self._stream_chunks = response.iter_content(block_size)
+            length = response.headers.get("Content-Length")
+            self.size = int(length) if length else None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                raise OSError("size of remote file is unknown")
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self._read_at(self._position, len(view))
+        view[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        super().close()
+
+    def _read_at(self, position: int, length: int) -> bytes:
+        if self.size is not None:
+            length = max(0, min(length, self.size - position))
+        if length == 0:
+            return b""
+        if self._stream is not None or self._stream_data:
+            return self._read_sequential(position, length)
+
+        parts = []
+        end = position + length
+        while position < end:
+            index = position // self.block_size
+            block = self._blocks.get(index)
+            if block is None:
+                block = self._fetch_block(index)
+            offset = position - index * self.block_size
+            piece = block[offset:offset + end - position]
+            if not piece:
+                break
+            parts.append(piece)
+            position += len(piece)
+        return b"".join(parts)
+
+    def _read_sequential(self, position: int, length: int) -> bytes:
+        while len(self._stream_data) < position + length and self._stream is not None:
+            chunk = next(self._stream_chunks, b"")
+            if not chunk:
+                self._stream.close()
+                self._stream = None
+                break
+            self._stream_data += chunk
+            self.bytes_fetched += len(chunk)
+            record_bytes(len(chunk), "range")
+        return bytes(self._stream_data[position:position + length])
+
+    def _fetch_block(self, index: int) -> bytes:
+        start = index * self.block_size
+        response = self._get_range(start, start + self.block_size - 1)
+        response.raise_for_status()
+        self._store_block(index, response.content)
+        return self._blocks[index]
+
+    def _store_block(self, index: int, data: bytes) -> None:
+        self._blocks[index] = data
+        self.bytes_fetched += len(data)
+        record_bytes(len(data), "range")
+
+    def _get_range(self, start: int, end: int, stream: bool = False) -> requests.Response:
+        response = self.session.get(
+            self.url, headers={"Range": f"bytes={start}-{end}"},
+            stream=stream, timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code not in (200, 206):
+            response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _total_size(response: requests.Response) -> Optional[int]:
+        match = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+
+
+_store: Optional[ImageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """Process-wide image store configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore(
+                cache_dir=os.getenv("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            )
+        return _store
@@ -0,0 +1,615 @@
+"""
+Kinship - Named relations between any two family members
+Answers "how am I related to X?" from precomputed ancestor tables of the
+family graph, in English and Indonesian, for one pair or for everyone
+related to a member at once.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import os
+import threading
+
+import numpy as np
+
+from .family_graph import DEFAULT_MAX_FAMILIES, FamilyGraph, gather_neighbours, sorted_unique
+
+# Generations searched upwards from each member (5 reaches fourth cousins)
+DEFAULT_MAX_GENERATIONS = 6
+# Tables recomputed after graph edits before they are merged back into the arrays
+PATCH_LIMIT = 1024
+
+BLOOD = "blood"
+SELF = "self"
+SPOUSE = "spouse"
+# A blood relative of the member's spouse (parent-in-law, stepchild)
+SPOUSE_RELATIVE = "spouse_relative"
+# The spouse of a blood relative (child-in-law, stepparent)
+RELATIVE_SPOUSE = "relative_spouse"
+UNRELATED = "unrelated"
+
+_ORDINALS = ("", "first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth")
+_REMOVED = ("", " once removed", " twice removed")
+_ID_ANCESTORS = ("", "orang tua", "kakek/nenek", "buyut", "canggah", "wareng")
+_ID_DESCENDANTS = ("", "anak", "cucu", "cicit", "piut")
+_ID_COUSIN_DEGREES = ("", "sepupu", "sepupu dua kali", "sepupu tiga kali")
+
+
+def _gendered(gender: Optional[str], neutral: str, male: str, female: str) -> str:
+    return male if gender == "male" else female if gender == "female" else neutral
+
+
+def _greats(extra: int, word: str) -> str:
+    """great-grandparent, 2x great-grandparent, ... (extra = number of greats)"""
+    if extra <= 0:
+        return word
+    return ("great-" if extra == 1 else f"{extra}x great-") + word
+
+
+def _english(up: int, down: int, half: bool, gender: Optional[str]) -> str:
+    """Blood relation of someone `down` generations below the common
+    ancestor, seen from someone `up` generations below it"""
+    if up == 0 and down == 0:
+        return "self"
+    if down == 0:
+        word = _gendered(gender, "parent", "father", "mother")
+        return word if up == 1 else _greats(up - 2, "grand" + word)
+    if up == 0:
+        word = _gendered(gender, "child", "son", "daughter")
+        return word if down == 1 else _greats(down - 2, "grand" + word)
+    prefix = "half-" if half else ""
+    if up == 1 and down == 1:
+        return prefix + _gendered(gender, "sibling", "brother", "sister")
+    if up == 1:
+        word = _gendered(gender, "nibling", "nephew", "niece")
+        return prefix + (word if down == 2 else _greats(down - 3, "grand" + word))
+    if down == 1:
+        word = _gendered(gender, "pibling", "uncle", "aunt")
+        return prefix + _greats(up - 2, word)
+    degree, removed = min(up, down) - 1, abs(up - down)
+    ordinal = _ORDINALS[degree] if degree < len(_ORDINALS) else f"{degree}th"
+    removed_text = _REMOVED[removed] if removed < len(_REMOVED) else f" {removed} times removed"
+    return ("half " if half else "") + f"{ordinal} cousin{removed_text}"
+
+
+def _indonesian(up: int, down: int, half: bool, gender: Optional[str],
+                older: Optional[bool], shared_gender: Optional[str]) -> str:
+    """Indonesian term for the same relation (kakak/adik from birth order)"""
+    if up == 0 and down == 0:
+        return "diri sendiri"
+    if down == 0:
+        if up == 1:
+            return _gendered(gender, "orang tua", "ayah", "ibu")
+        if up == 2:
+            return _gendered(gender, "kakek/nenek", "kakek", "nenek")
+        return _ID_ANCESTORS[up] if up < len(_ID_ANCESTORS) else f"leluhur ({up} generasi)"
+    if up == 0:
+        if down == 1:
+            return _gendered(gender, "anak", "anak laki-laki", "anak perempuan")
+        return _ID_DESCENDANTS[down] if down < len(_ID_DESCENDANTS) else f"keturunan ({down} generasi)"
+    if up == 1 and down == 1:
+        if half:
+            return _gendered(shared_gender, "saudara satu orang tua", "saudara seayah", "saudara seibu")
+        if older is None:
+            return "saudara kandung"
+        word = "kakak" if older else "adik"
+        return word + _gendered(gender, "", " laki-laki", " perempuan")
+    if up == 1:
+        return "keponakan" if down == 2 else "cucu keponakan" if down == 3 else f"keturunan saudara ({down - 1} generasi)"
+    if down == 1:
+        if up == 2:
+            return _gendered(gender, "paman/bibi", "paman", "bibi")
+        return "saudara kakek/nenek" if up == 3 else f"saudara leluhur ({up - 1} generasi)"
+    degree, removed = min(up, down) - 1, abs(up - down)
+    word = _ID_COUSIN_DEGREES[degree] if degree < len(_ID_COUSIN_DEGREES) else f"sepupu {degree} kali"
+    return word + (f" (beda {removed} generasi)" if removed else "")
+
+
+@lru_cache(maxsize=4096)
+def describe(kind: str, up: int, down: int, half: bool = False, gender: Optional[str] = None,
+             older: Optional[bool] = None, shared_gender: Optional[str] = None) -> Tuple[str, str]:
+    """
+    (English, Indonesian) name of a relation
+
+    Args:
+        kind: BLOOD, SPOUSE, SPOUSE_RELATIVE, RELATIVE_SPOUSE or UNRELATED
+        up: Generations from the member up to the common ancestor
+        down: Generations from the relative up to the common ancestor
+        half: Only one common ancestor at that distance (half-sibling)
+        gender: Gender of the relative
+        older: Whether the relative is older than the member (None if unknown)
+        shared_gender: Gender of the one shared parent of half-siblings
+
+    For SPOUSE_RELATIVE, up/down relate the spouse to the relative; for
+    RELATIVE_SPOUSE, the member to the relative the spouse is married to.
+    """
+    if kind == UNRELATED:
+        return "not related", "tidak ada hubungan keluarga"
+    if kind == SPOUSE:
+        return _gendered(gender, "spouse", "husband", "wife"), _gendered(gender, "pasangan", "suami", "istri")
+    if kind == BLOOD or kind == SELF:
+        return _english(up, down, half, gender), _indonesian(up, down, half, gender, older, shared_gender)
+
+    if kind == SPOUSE_RELATIVE:
+        if (up, down) == (1, 0):
+            return (_gendered(gender, "parent-in-law", "father-in-law", "mother-in-law"),
+                    _gendered(gender, "mertua", "ayah mertua", "ibu mertua"))
+        if (up, down) == (1, 1):
+            return (_gendered(gender, "sibling-in-law", "brother-in-law", "sister-in-law"),
+                    "ipar" if older is None else ("kakak ipar" if older else "adik ipar"))
+        if (up, down) == (0, 1):
+            return (_gendered(gender, "stepchild", "stepson", "stepdaughter"), "anak tiri")
+        english, indonesian = _english(up, down, half, gender), _indonesian(up, down, half, gender, None, None)
+        return f"spouse's {english}", f"{indonesian} dari pasangan"
+
+    # RELATIVE_SPOUSE: the relative is married to the member's blood relative
+    if (up, down) == (0, 1):
+        return (_gendered(gender, "child-in-law", "son-in-law", "daughter-in-law"), "menantu")
+    if (up, down) == (1, 1):
+        return (_gendered(gender, "sibling-in-law", "brother-in-law", "sister-in-law"),
+                "ipar" if older is None else ("kakak ipar" if older else "adik ipar"))
+    if (up, down) == (1, 0):
+        return (_gendered(gender, "stepparent", "stepfather", "stepmother"),
+                _gendered(gender, "orang tua tiri", "ayah tiri", "ibu tiri"))
+    if down == 1 and up >= 2:
+        # An uncle's wife is an aunt by marriage
+        return (_english(up, down, False, gender) + " by marriage",
+                _indonesian(up, down, False, gender, None, None))
+    english, indonesian = _english(up, down, half, None), _indonesian(up, down, half, None, None, None)
+    return f"{english}'s spouse", f"pasangan {indonesian}"
+
+
+class KinshipIndex:
+    """
+    Depth-bounded ancestor tables of a family graph
+
+    Family graphs are not trees (everyone has two parents), so instead of
+    binary-lifting jump pointers every member gets a sorted table of all
+    their ancestors up to max_generations, with the distance to each,
+    built for the whole family one generation at a time. Two members'
+    closest common ancestors are then the intersection of two short
+    sorted arrays, independent of family size. The same rows sorted by
+    ancestor (descendant tables) give a member's entire relation list in
+    a handful of array operations.
+
+    Members without recorded parents who are linked by sibling rows share
+    an unknown parent, as in FamilyGraph.sibling_groups: it is added to
+    the tables at lookup time as a negative id, one per group.
+
+    After the graph is edited, update() recomputes only the tables the
+    edit can reach and keeps them aside ("patched") until there are
+    enough to merge back into the arrays.
+    """
+
+    def __init__(self, graph: FamilyGraph, max_generations: int = DEFAULT_MAX_GENERATIONS):
+        self.graph = graph
+        self.max_generations = max_generations
+        graph.compact()
+        size = len(graph)
+        members = np.arange(size, dtype=np.int64)
+        # (member, ancestor) pairs as member * size + ancestor, one generation at a time
+        levels, depths = [members * size + members], [np.zeros(size, dtype=np.int8)]
+        current_member, current_ancestor = members, members
+        for depth in range(1, max_generations + 1):
+            ancestor, _ = gather_neighbours(graph.parent_offsets, graph.parents, current_ancestor)
+            if not ancestor.size:
+                break
+            counts = graph.parent_offsets[current_ancestor + 1] - graph.parent_offsets[current_ancestor]
+            keys = sorted_unique(np.repeat(current_member, counts) * size + ancestor)
+            current_member, current_ancestor = keys // size, keys % size
+            levels.append(keys)
+            depths.append(np.full(keys.size, depth, dtype=np.int8))
+
+        keys, depth = np.concatenate(levels), np.concatenate(depths)
+        # Pedigree collapse: keep each ancestor at its closest distance (the
+        # levels are in depth order, so a stable sort puts it first)
+        order = np.argsort(keys, kind="stable")
+        keys, depth = keys[order], depth[order]
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        keys, depth = keys[first], depth[first]
+        self._set_tables(keys // size, keys % size, depth)
+
+        # Sibling-row group of each member (-1 if none) and the groups' members
+        self._sibling_label = np.full(size, -1, dtype=np.int64)
+        self._sibling_groups: Dict[int, List[int]] = {}
+        self._regroup_siblings(graph._sibling_pairs_without_parents(np.diff(graph.parent_offsets))[0])
+
+        self.gender = [member_row.get("gender") for member_row in graph.members]
+        known = ~np.isnat(graph.birth)
+        self._birth_day = [day if is_known else None for day, is_known in
+                           zip(graph.birth.astype(np.int64).tolist(), known.tolist())]
+
+    def _set_tables(self, member: np.ndarray, ancestor: np.ndarray, depth: np.ndarray) -> None:
+        """Table arrays from (member, ancestor, depth) rows sorted by member then ancestor"""
+        size = len(self.graph)
+        # Ancestor tables, sorted by member then ancestor
+        self.ancestor_offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(member, minlength=size), out=self.ancestor_offsets[1:])
+        self.ancestors = ancestor.astype(np.int32)
+        self.ancestor_depth = depth
+        # Descendant tables, sorted by ancestor then member
+        order = np.argsort(ancestor * size + member)
+        self.descendant_offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ancestor, minlength=size), out=self.descendant_offsets[1:])
+        self.descendants = member[order].astype(np.int32)
+        self.descendant_depth = depth[order]
+        # Tables recomputed since: member -> (ancestors, depth)
+        self._patched: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def update(self, roots: Iterable[int], members: Iterable[int] = ()) -> int:
+        """
+        Catch up with edits applied to the graph
+
+        An edit changes the tables of the members whose parents changed
+        (roots) and of their descendants up to max_generations - 1 levels
+        below; only those are recomputed, each by a short upward walk.
+
+        Args:
+            roots: Members whose parents changed (new members included,
+                and both ends of changed sibling rows)
+            members: Members whose rows changed (gender, birth date)
+
+        Returns:
+            Number of tables recomputed
+        """
+        graph = self.graph
+        for i in members:
+            self._refresh_member(i)
+        reached = set(roots)
+        self._regroup_siblings(reached)
+        frontier = list(reached)
+        for _ in range(self.max_generations - 1):
+            below = []
+            for i in frontier:
+                for child in graph.links("children", i):
+                    if child not in reached:
+                        reached.add(child)
+                        below.append(child)
+            frontier = below
+        for i in reached:
+            self._patched[i] = self._ancestor_table(i)
+        if len(self._patched) > PATCH_LIMIT:
+            self._merge_patches()
+        return len(reached)
+
+    def _refresh_member(self, i: int) -> None:
+        graph = self.graph
+        while len(self.gender) <= i:
+            self.gender.append(None)
+            self._birth_day.append(None)
+        self.gender[i] = graph.members[i].get("gender")
+        born = graph.birth[i]
+        self._birth_day[i] = None if np.isnat(born) else int(born.astype(np.int64))
+
+    def _ancestor_table(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """One member's table from the graph's current parent lists"""
+        depth_of = {i: 0}
+        frontier = [i]
+        for depth in range(1, self.max_generations + 1):
+            above = []
+            for j in frontier:
+                for parent in self.graph.links("parents", j):
+                    if parent not in depth_of:
+                        depth_of[parent] = depth
+                        above.append(parent)
+            frontier = above
+        ancestors = sorted(depth_of)
+        return (np.array(ancestors, dtype=np.int32),
+                np.array([depth_of[a] for a in ancestors], dtype=np.int8))
+
+    def _regroup_siblings(self, seeds: Iterable[int]) -> None:
+        """Recompute the sibling-row groups that contain any of seeds"""
+        graph = self.graph
+        if self._sibling_label.size < len(graph):
+            grown = np.full(len(graph) - self._sibling_label.size, -1, dtype=np.int64)
+            self._sibling_label = np.concatenate([self._sibling_label, grown])
+        seeds = set(seeds)
+        for i in list(seeds):
+            label = int(self._sibling_label[i])
+            if label >= 0:
+                for member in self._sibling_groups.pop(label, ()):
+                    self._sibling_label[member] = -1
+                    seeds.add(member)
+
+        def parentless(k: int) -> bool:
+            return bool(graph.active[k]) and not graph.links("parents", k)
+
+        seen: Set[int] = set()
+        for seed in seeds:
+            if seed in seen or not parentless(seed):
+                continue
+            seen.add(seed)
+            group, stack = [], [seed]
+            while stack:
+                k = stack.pop()
+                group.append(k)
+                for other in graph.links("siblings", k):
+                    if other not in seen and parentless(other):
+                        seen.add(other)
+                        stack.append(other)
+            if len(group) > 1:
+                label = min(group)
+                self._sibling_groups[label] = sorted(group)
+                self._sibling_label[group] = label
+
+    def _with_unknown_parents(self, ancestors: np.ndarray, depth: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """A table plus the unknown parent (-1 - label) of each sibling-row group in it"""
+        if not self._sibling_groups:
+            return ancestors, depth
+        labels = self._sibling_label[ancestors]
+        grouped = (labels >= 0) & (depth < self.max_generations)
+        if not grouped.any():
+            return ancestors, depth
+        unknown, unknown_depth = -1 - labels[grouped], depth[grouped] + 1
+        # Closest distance of each (the ids are negative, so they sort first)
+        order = np.lexsort((unknown_depth, unknown))
+        unknown, unknown_depth = unknown[order], unknown_depth[order]
+        first = np.r_[True, unknown[1:] != unknown[:-1]]
+        return (np.concatenate([unknown[first].astype(ancestors.dtype), ancestors]),
+                np.concatenate([unknown_depth[first].astype(depth.dtype), depth]))
+
+    def _merge_patches(self) -> None:
+        """Rebuild the table arrays with the patched tables in place (removed members dropped)"""
+        size = len(self.graph)
+        member = np.repeat(np.arange(self.ancestor_offsets.size - 1, dtype=np.int64), np.diff(self.ancestor_offsets))
+        patched = np.fromiter(self._patched, dtype=np.int64, count=len(self._patched))
+        tables = list(self._patched.values())
+        keep = ~np.isin(member, patched)
+        member = np.concatenate([member[keep], np.repeat(patched, [table.size for table, _ in tables])])
+        ancestor = np.concatenate([self.ancestors[keep]] + [table for table, _ in tables]).astype(np.int64)
+        depth = np.concatenate([self.ancestor_depth[keep]] + [depth for _, depth in tables])
+        live = self.graph.active[member]
+        member, ancestor, depth = member[live], ancestor[live], depth[live]
+        order = np.argsort(member * size + ancestor)
+        self._set_tables(member[order], ancestor[order], depth[order])
+
+    def _position(self, member_id: str) -> int:
+        try:
+            return self.graph.index[str(member_id)]
+        except KeyError:
+            raise KeyError(f"Unknown family member: {member_id}") from None
+
+    def _table(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        patched = self._patched.get(i)
+        if patched is not None:
+            return self._with_unknown_parents(*patched)
+        start, end = self.ancestor_offsets[i], self.ancestor_offsets[i + 1]
+        return self._with_unknown_parents(self.ancestors[start:end], self.ancestor_depth[start:end])
+
+    def _blood(self, i: int, j: int) -> Optional[Tuple[int, int, np.ndarray]]:
+        """(up, down, closest common ancestors) of two members, or None"""
+        ancestors_i, depth_i = self._table(i)
+        ancestors_j, depth_j = self._table(j)
+        common, in_i, in_j = np.intersect1d(ancestors_i, ancestors_j, assume_unique=True, return_indices=True)
+        if not common.size:
+            return None
+        up, down = depth_i[in_i].astype(np.int64), depth_j[in_j].astype(np.int64)
+        # Closest, then most even, then fewest generations up from i; the
+        # ancestor decides any remaining tie, so the pick never depends on
+        # the order the tables were built in
+        best = np.lexsort((common, up, np.abs(up - down), up + down))[0]
+        closest = (up == up[best]) & (down == down[best])
+        return int(up[best]), int(down[best]), common[closest]
+
+    def _older(self, i: int, j: int) -> Optional[bool]:
+        """Whether j was born before i (None if either date is unknown)"""
+        born_i, born_j = self._birth_day[i], self._birth_day[j]
+        if born_i is None or born_j is None:
+            return None
+        return born_j < born_i
+
+    def _half(self, i: int, j: int, up: int, down: int, via: Optional[np.ndarray]) -> bool:
+        """
+        Whether a blood relation runs through only one of two known parents
+
+        Needs a single closest common ancestor and, on both lines, a child
+        of that ancestor with two recorded parents: a missing parent is
+        not taken as a different one.
+        """
+        if up == 0 or down == 0 or via is None or via.size != 1 or via[0] < 0:
+            return False
+        ancestor = int(via[0])
+        line = self._line(i, ancestor, up) + self._line(j, ancestor, down)
+        return bool(line) and all(len(self.graph.links("parents", k)) == 2 for k in line)
+
+    def _line(self, i: int, ancestor: int, depth: int) -> List[int]:
+        """i's ancestors (or i) that are children of an ancestor depth generations up"""
+        if depth == 1:
+            return [i]
+        ancestors, ancestor_depth = self._table(i)
+        return [k for k in ancestors[ancestor_depth == depth - 1].tolist()
+                if k >= 0 and ancestor in self.graph.links("parents", k)]
+
+    def _result(self, i: int, j: int, kind: str, up: int = 0, down: int = 0,
+                via: Optional[np.ndarray] = None, through: Optional[int] = None) -> Dict[str, Any]:
+        half = kind == BLOOD and self._half(i, j, up, down, via)
+        shared_gender = self.gender[int(via[0])] if half else None
+        english, indonesian = describe(kind, up, down, half, self.gender[j], self._older(i, j), shared_gender)
+        ids = self.graph.ids
+        result = {
+            "person_id": ids[i],
+            "relative_id": ids[j],
+            "relation": english,
+            "relation_indonesian": indonesian,
+            "kind": kind,
+            "generations_up": up,
+            "generations_down": down
+        }
+        if via is not None and kind == BLOOD:
+            # Unknown parents of sibling-row groups have no id
+            result["common_ancestors"] = [ids[k] for k in via.tolist() if k >= 0]
+        if through is not None:
+            result["through"] = ids[through]
+        return result
+
+    def relation(self, person_id: str, relative_id: str) -> Dict[str, Any]:
+        """
+        What relative_id is to person_id
+
+        Blood relations come first, then marriage: the spouse, the
+        spouse's blood relatives, and the spouses of blood relatives
+        ("through" names the spouse or relative the link runs through).
+        """
+        i, j = self._position(person_id), self._position(relative_id)
+        if i == j:
+            return self._result(i, j, SELF)
+        blood = self._blood(i, j)
+        if blood is not None:
+            return self._result(i, j, BLOOD, *blood)
+
+        spouses_i = self._spouses(i)
+        if j in spouses_i:
+            return self._result(i, j, SPOUSE)
+        candidates = []
+        for spouse in spouses_i:
+            link = self._blood(spouse, j)
+            if link is not None:
+                candidates.append((link[0] + link[1], SPOUSE_RELATIVE, link, spouse))
+        for spouse in self._spouses(j):
+            link = self._blood(i, spouse)
+            if link is not None:
+                candidates.append((link[0] + link[1], RELATIVE_SPOUSE, link, spouse))
+        if candidates:
+            _distance, kind, (up, down, _via), through = min(candidates, key=lambda c: (c[0], c[1]))
+            return self._result(i, j, kind, up, down, through=through)
+        return self._result(i, j, UNRELATED)
+
+    def relations_of(self, person_id: str) -> List[Dict[str, Any]]:
+        """
+        Everyone related to a member within the searched generations, closest first
+
+        Blood relatives come from the descendant tables of the member's
+        own ancestors in one pass; relatives by marriage are added from
+        the spouses' tables and the spouses of blood relatives.
+        """
+        i = self._position(person_id)
+        assigned: Dict[int, Dict[str, Any]] = {}
+
+        members, up, down, via = self._blood_all(i)
+        for j, u, d, common in zip(members.tolist(), up.tolist(), down.tolist(), via):
+            if j != i:
+                assigned[j] = self._result(i, j, BLOOD, u, d, common)
+
+        for spouse in self._spouses(i):
+            if spouse not in assigned:
+                assigned[spouse] = self._result(i, spouse, SPOUSE)
+        for spouse in self._spouses(i):
+            members, up, down, _via = self._blood_all(spouse)
+            for j, u, d in zip(members.tolist(), up.tolist(), down.tolist()):
+                if j != i and j not in assigned:
+                    assigned[j] = self._result(i, j, SPOUSE_RELATIVE, u, d, through=spouse)
+        # Spouses of blood relatives, nearest relatives first
+        blood_relatives = sorted((r["generations_up"] + r["generations_down"], j)
+                                 for j, r in assigned.items() if r["kind"] == BLOOD)
+        for _distance, relative in blood_relatives:
+            record = assigned[relative]
+            for spouse in self._spouses(relative):
+                if spouse != i and spouse not in assigned:
+                    assigned[spouse] = self._result(i, spouse, RELATIVE_SPOUSE, record["generations_up"],
+                                                    record["generations_down"], through=relative)
+
+        return sorted(assigned.values(),
+                      key=lambda r: (r["generations_up"] + r["generations_down"], r["kind"] != BLOOD,
+                                     self.graph.index[r["relative_id"]]))
+
+    def _blood_all(self, i: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[np.ndarray]]:
+        """Every blood relative of i with (up, down) and closest common ancestors"""
+        ancestors, ancestor_up = self._table(i)
+        # Members added since the arrays were built have no descendant table there
+        in_arrays = (ancestors >= 0) & (ancestors < self.descendant_offsets.size - 1)
+        relatives, up, down, via = self._descendant_rows(ancestors[in_arrays], ancestor_up[in_arrays])
+        # An unknown parent's descendants are those of its sibling-row group, one level further down
+        for unknown, unknown_up in zip(ancestors[ancestors < 0].tolist(), ancestor_up[ancestors < 0].tolist()):
+            group = np.array([k for k in self._sibling_groups[-1 - unknown]
+                              if k < self.descendant_offsets.size - 1], dtype=np.int64)
+            group_relatives, _up, group_down, _via = self._descendant_rows(group, np.zeros(group.size))
+            near = group_down < self.max_generations
+            relatives = np.concatenate([relatives, group_relatives[near]])
+            up = np.concatenate([up, np.full(int(near.sum()), unknown_up, dtype=np.int64)])
+            down = np.concatenate([down, group_down[near] + 1])
+            via = np.concatenate([via, np.full(int(near.sum()), unknown, dtype=via.dtype)])
+        if self._patched:
+            # Rows of patched (or removed) members are stale; add their current ones
+            keep = self.graph.active[relatives] & ~np.isin(relatives, np.fromiter(self._patched, dtype=np.int64))
+            parts = [(relatives[keep], up[keep], down[keep], via[keep])]
+            for j, patched in self._patched.items():
+                table, depth = self._with_unknown_parents(*patched)
+                common, in_j, in_i = np.intersect1d(table, ancestors, assume_unique=True, return_indices=True)
+                if common.size and self.graph.active[j]:
+                    parts.append((np.full(common.size, j, dtype=np.int64), ancestor_up[in_i].astype(np.int64),
+                                  depth[in_j].astype(np.int64), common))
+            relatives, up, down, via = (np.concatenate(column) for column in zip(*parts))
+        else:
+            keep = self.graph.active[relatives]
+            relatives, up, down, via = relatives[keep], up[keep], down[keep], via[keep]
+
+        # Best common ancestor per relative, picked as in _blood
+        order = np.lexsort((via, up, np.abs(up - down), up + down, relatives))
+        relatives, up, down, via = relatives[order], up[order], down[order], via[order]
+        starts = np.flatnonzero(np.r_[True, relatives[1:] != relatives[:-1]])
+        group = np.repeat(np.arange(starts.size), np.diff(np.r_[starts, relatives.size]))
+        closest = (up == up[starts][group]) & (down == down[starts][group])
+        common = np.split(via[closest], np.cumsum(np.bincount(group[closest], minlength=starts.size))[:-1])
+        return relatives[starts], up[starts], down[starts], common
+
+    def _descendant_rows(self, ancestors: np.ndarray,
+                         ancestor_up: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(relative, up, down, via) rows of the descendant tables of some ancestors"""
+        starts = self.descendant_offsets[ancestors]
+        counts = self.descendant_offsets[ancestors + 1] - starts
+        total = int(counts.sum())
+        rank = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + rank
+        return (self.descendants[positions].astype(np.int64),
+                np.repeat(ancestor_up.astype(np.int64), counts),
+                self.descendant_depth[positions].astype(np.int64),
+                np.repeat(ancestors, counts))
+
+    def _spouses(self, i: int) -> List[int]:
+        return self.graph.links("spouses", i)
+
+
+class KinshipStore:
+    """
+    Kinship index of each cached family graph, rebuilt when the graph is replaced
+
+    At most max_families indexes are kept, with LRU eviction (an index
+    holds its graph, so this must not be larger than the graph store's).
+    """
+
+    def __init__(self, max_generations: int = DEFAULT_MAX_GENERATIONS,
+                 max_families: int = DEFAULT_MAX_FAMILIES):
+        self.max_generations = max_generations
+        self.max_families = max_families
+        self._indexes: "OrderedDict[str, KinshipIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, family_id: str, graph: FamilyGraph) -> KinshipIndex:
+        with self._lock:
+            index = self._indexes.get(family_id)
+            if index is None or index.graph is not graph:
+                index = self._indexes[family_id] = KinshipIndex(graph, self.max_generations)
+            self._indexes.move_to_end(family_id)
+            while len(self._indexes) > self.max_families:
+                self._indexes.popitem(last=False)
+            return index
+
+    def peek(self, family_id: str, graph: FamilyGraph) -> Optional[KinshipIndex]:
+        """The family's index if one is already built for this graph"""
+        with self._lock:
+            index = self._indexes.get(family_id)
+            return index if index is not None and index.graph is graph else None
+
+
+_store: Optional[KinshipStore] = None
+_store_lock = threading.Lock()
+
+
+def get_kinship_store() -> KinshipStore:
+    """Process-wide kinship store, sized like the family graph store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KinshipStore(max_families=int(os.getenv("FAMILY_GRAPH_CACHE_SIZE", DEFAULT_MAX_FAMILIES)))
+        return _store
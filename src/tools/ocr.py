@@ -3,36 +3,42 @@ OCR Tool - Extract text from images
 """
 
 from langchain.tools import BaseTool
-from typing import Dict, List, Any
-import os
+from typing import Dict, List, Any, Iterator
+
+from .image_store import get_image_store
+from .ocr_engine import get_ocr_engine, pii_regions
+from ..metrics import instrument_tool
 
 
 class OCRTool(BaseTool):
     name = "ocr"
-    description = "Extracts text from images using OCR"
+    description = "Extracts text from images and scanned documents using local OCR"
     
     def __init__(self):
         super().__init__()
-        self.hf_token = os.getenv("HF_TOKEN")
+        # Recognition runs locally in a process pool; no per-call API
+        self.image_store = get_image_store()
+        self.engine = get_ocr_engine()
     
+    @instrument_tool
     def _run(self, image_url: str) -> Dict[str, Any]:
         """
         Extract text from image
         
         Args:
-            image_url: URL of the image
+            image_url: URL of the image or multi-page document
             
         Returns:
             Dictionary with extracted text
         """
         try:
-            # Placeholder implementation
-            # TODO: Integrate TrOCR or similar OCR model
+            pages = list(self.iter_pages(image_url))
             
             return {
                 "success": True,
-                "extracted_text": [],
-                "note": "OCR integration pending - using placeholder"
+                "extracted_text": [line["text"] for page in pages for line in page["lines"]],
+                "pages": pages,
+                "page_count": len(pages)
             }
         
         except Exception as e:
@@ -41,3 +47,19 @@ class OCRTool(BaseTool):
                 "error": str(e),
                 "extracted_text": []
             }
+    
+    def iter_pages(self, image_url: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream OCR results of a document page by page
+        
+        Args:
+            image_url: URL of the image or multi-page document (PDF, TIFF)
+            
+        Yields:
+            Page dict with "text", positioned "lines" and "pii_regions"
+            (PII in the text, located by line boxes for redaction)
+        """
+        path = self.image_store.get_path(image_url)
+        for page in self.engine.iter_document(path):
+            page["pii_regions"] = pii_regions(page)
+            yield page
@@ -0,0 +1,290 @@
+"""
+OCR Engine - Local text detection and recognition for OCRTool
+Text regions are found with a DB detector and read with a CRNN recogniser
+(both ONNX, run by OpenCV) in a process pool. Multi-page documents are
+processed page by page, and every line keeps its box so PII found in the
+text can be mapped back onto the page.
+"""
+
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import multiprocessing
+import os
+import threading
+
+import cv2
+import numpy as np
+import pypdfium2 as pdfium
+from PIL import Image, ImageOps, ImageSequence
+
+from .pii_batch import available_cores
+from .pii_scanner import scan_spans
+
+DEFAULT_DETECTION_MODEL = os.path.join("models", "DB_TD500_resnet18.onnx")
+DEFAULT_RECOGNITION_MODEL = os.path.join("models", "crnn_cs.onnx")
+DEFAULT_VOCABULARY = os.path.join("models", "alphabet_94.txt")
+
+# Pages are searched for text at this longest side (multiple of 32 for DB)
+DETECTION_MAX_SIDE = 1536
+DETECTION_MEAN = (122.67891434, 116.66876762, 104.00698793)
+RECOGNITION_INPUT = (100, 32)
+PDF_DPI = 200
+# Text lines read per pool job, and pages whose detection runs ahead
+REGIONS_PER_JOB = 32
+PAGES_IN_FLIGHT = 2
+
+# Models of the current pool worker process, loaded on first use
+_worker_models: Dict[str, Any] = {}
+
+
+def _init_worker(detection_model: str, recognition_model: str, vocabulary: str) -> None:
+    # One core per worker; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _worker_models["paths"] = (detection_model, recognition_model, vocabulary)
+
+
+def _detect_text(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Text line quadrilaterals of a (downscaled) page (runs in a pool worker)"""
+    detector = _worker_models.get("detector")
+    if detector is None:
+        detector = cv2.dnn_TextDetectionModel_DB(_worker_models["paths"][0])
+        detector.setBinaryThreshold(0.3).setPolygonThreshold(0.5)
+        detector.setUnclipRatio(2.0).setMaxCandidates(500)
+        _worker_models["detector"] = detector
+
+    height, width = image.shape[:2]
+    size = (max(32, width // 32 * 32), max(32, height // 32 * 32))
+    detector.setInputParams(1.0 / 255.0, size, DETECTION_MEAN, True)
+    quads, confidences = detector.detect(image)
+    return (np.asarray(quads, dtype=np.float32).reshape(-1, 4, 2),
+            np.asarray(confidences, dtype=np.float32).reshape(-1))
+
+
+def _recognize_text(crops: List[np.ndarray]) -> List[str]:
+    """Text of each cropped line (runs in a pool worker)"""
+    recognizer = _worker_models.get("recognizer")
+    if recognizer is None:
+        _, model_path, vocabulary_path = _worker_models["paths"]
+        with open(vocabulary_path, encoding="utf-8") as f:
+            vocabulary = [line.rstrip("\n") for line in f if line.rstrip("\n")]
+        recognizer = cv2.dnn_TextRecognitionModel(model_path)
+        recognizer.setDecodeType("CTC-greedy")
+        recognizer.setVocabulary(vocabulary)
+        recognizer.setInputParams(1.0 / 127.5, RECOGNITION_INPUT, (127.5, 127.5, 127.5))
+        _worker_models["recognizer"] = recognizer
+    return [recognizer.recognize(crop) for crop in crops]
+
+
+def iter_pages(path: str) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decode a document one page at a time
+
+    PDFs are rendered at PDF_DPI; multi-page TIFFs yield every frame;
+    other images are a single upright page.
+
+    Yields:
+        (page number from 1, BGR image)
+    """
+    with open(path, "rb") as f:
+        is_pdf = f.read(5) == b"%PDF-"
+
+    if is_pdf:
+        document = pdfium.PdfDocument(path)
+        try:
+            for index in range(len(document)):
+                page = document[index]
+                try:
+                    image = page.render(scale=PDF_DPI / 72).to_pil().convert("RGB")
+                finally:
+                    page.close()
+                yield index + 1, cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+        finally:
+            document.close()
+        return
+
+    with Image.open(path) as document:
+        for index, frame in enumerate(ImageSequence.Iterator(document)):
+            image = ImageOps.exif_transpose(frame).convert("RGB")
+            yield index + 1, cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+
+def crop_line(image: np.ndarray, quad: np.ndarray) -> np.ndarray:
+    """Straighten one detected line to the recogniser's input size"""
+    width, height = RECOGNITION_INPUT
+    # DB quads run bottom-left, top-left, top-right, bottom-right
+    target = np.array([[0, height - 1], [0, 0], [width - 1, 0], [width - 1, height - 1]], dtype=np.float32)
+    transform = cv2.getPerspectiveTransform(quad.astype(np.float32), target)
+    return cv2.warpPerspective(image, transform, (width, height))
+
+
+def reading_order(quads: np.ndarray) -> np.ndarray:
+    """Indices of the lines top to bottom, then left to right"""
+    if not len(quads):
+        return np.empty(0, dtype=int)
+    tops = quads[:, :, 1].min(axis=1)
+    bottoms = quads[:, :, 1].max(axis=1)
+    lefts = quads[:, :, 0].min(axis=1)
+    line_height = max(1.0, float(np.median(bottoms - tops)))
+    rows = np.round((tops + bottoms) / 2 / line_height)
+    return np.lexsort((lefts, rows))
+
+
+def pii_regions(page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    PII found in a page's text, located on the page
+
+    Each item has the PII type and risk level, and one box per line it
+    spans, narrowed to the matched characters (assuming evenly spaced
+    characters along the line), ready for redaction.
+    """
+    lines = page["lines"]
+    starts = [line["start"] for line in lines]
+    regions = []
+    for span in scan_spans(page["text"]):
+        boxes = []
+        first = max(0, bisect_right(starts, span.start) - 1)
+        for line in lines[first:]:
+            if line["start"] >= span.end:
+                break
+            length = max(1, line["end"] - line["start"])
+            begin = max(span.start, line["start"]) - line["start"]
+            finish = min(span.end, line["end"]) - line["start"]
+            if finish <= begin:
+                continue
+            bbox = line["bbox"]
+            x1 = bbox["x"] + bbox["width"] * begin // length
+            x2 = bbox["x"] + -(-bbox["width"] * finish // length)
+            boxes.append({"x": x1, "y": bbox["y"], "width": x2 - x1, "height": bbox["height"]})
+        regions.append({"type": span.type, "risk_level": span.risk_level, "boxes": boxes})
+    return regions
+
+
+class OCREngine:
+    """
+    Local OCR over a shared process pool
+
+    Detection of the next page runs while the lines of the current page
+    are recognised, and each page's lines are split into jobs of
+    REGIONS_PER_JOB so a dense page spreads over every worker.
+    """
+
+    def __init__(self, detection_model: Optional[str] = None, recognition_model: Optional[str] = None,
+                 vocabulary: Optional[str] = None, max_workers: Optional[int] = None):
+        self.detection_model = detection_model or os.getenv("OCR_DETECTION_MODEL", DEFAULT_DETECTION_MODEL)
+        self.recognition_model = recognition_model or os.getenv("OCR_RECOGNITION_MODEL", DEFAULT_RECOGNITION_MODEL)
+        self.vocabulary = vocabulary or os.getenv("OCR_VOCABULARY", DEFAULT_VOCABULARY)
+        self.max_workers = max_workers or available_cores()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """True when all model files are present"""
+        return all(os.path.isfile(path) for path in
+                   (self.detection_model, self.recognition_model, self.vocabulary))
+
+    def iter_document(self, path: str) -> Iterator[Dict[str, Any]]:
+        """
+        OCR a document page by page
+
+        Args:
+            path: Local image, multi-page TIFF or PDF
+
+        Yields:
+            Per page: {"page", "width", "height", "text", "lines"}; each line
+            has "text", "bbox" {x, y, width, height}, "polygon" and its
+            "start"/"end" offsets in the page text
+        """
+        if not self.available:
+            raise ValueError("OCR models not found; set OCR_DETECTION_MODEL, "
+                             "OCR_RECOGNITION_MODEL and OCR_VOCABULARY")
+
+        pool = self._get_pool()
+        in_flight: Deque[Tuple[int, np.ndarray, float, Future]] = deque()
+        for page_number, image in iter_pages(path):
+            height, width = image.shape[:2]
+            scale = min(1.0, DETECTION_MAX_SIDE / max(height, width))
+            small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+            in_flight.append((page_number, image, scale, pool.submit(_detect_text, small)))
+            if len(in_flight) >= PAGES_IN_FLIGHT:
+                yield self._read_page(pool, *in_flight.popleft())
+        while in_flight:
+            yield self._read_page(pool, *in_flight.popleft())
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is not safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.detection_model, self.recognition_model, self.vocabulary)
+                )
+            return self._pool
+
+    @staticmethod
+    def _read_page(pool: ProcessPoolExecutor, page_number: int, image: np.ndarray,
+                   scale: float, detection: Future) -> Dict[str, Any]:
+        height, width = image.shape[:2]
+        quads, _confidences = detection.result()
+        quads = quads / scale
+        quads = quads[reading_order(quads)]
+
+        crops = [crop_line(image, quad) for quad in quads]
+        jobs = [pool.submit(_recognize_text, crops[start:start + REGIONS_PER_JOB])
+                for start in range(0, len(crops), REGIONS_PER_JOB)]
+        texts = [text for job in jobs for text in job.result()]
+
+        lines, offset = [], 0
+        for quad, text in zip(quads, texts):
+            text = text.strip()
+            if not text:
+                continue
+            x1, y1 = np.clip(np.floor(quad.min(axis=0)), 0, [width, height]).astype(int)
+            x2, y2 = np.clip(np.ceil(quad.max(axis=0)), 0, [width, height]).astype(int)
+            lines.append({
+                "text": text,
+                "bbox": {"x": int(x1), "y": int(y1), "width": int(x2 - x1), "height": int(y2 - y1)},
+                "polygon": [[round(float(x), 1), round(float(y), 1)] for x, y in quad],
+                "start": offset,
+                "end": offset + len(text)
+            })
+            offset += len(text) + 1
+
+        return {
+            "page": page_number,
+            "width": width,
+            "height": height,
+            "text": "\n".join(line["text"] for line in lines),
+            "lines": lines
+        }
+
+
+_engine: Optional[OCREngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine() -> OCREngine:
+    """Process-wide OCR engine configured from the environment"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            workers = os.getenv("OCR_WORKERS")
+            _engine = OCREngine(max_workers=int(workers) if workers else None)
+        return _engine
+
+
+def shutdown_ocr_pool() -> None:
+    """Stop the OCR worker processes (e.g. on application shutdown)"""
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown()
@@ -0,0 +1,130 @@
+"""
+PII Batch Scanner - Process-pool PII scanning for backfills
+Scans many texts with the PIIDetectionTool rules and returns columnar results
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Sequence
+import multiprocessing
+import os
+import threading
+
+from .pii_scanner import scan_spans, highest_risk
+
+# Below this many texts the pool round-trip costs more than the scan
+MIN_PARALLEL_BATCH = 256
+# Slices per worker, so a slow slice does not leave the other cores idle
+SLICES_PER_WORKER = 4
+
+# One pool per worker count: a pool may still be running another call's
+# futures, so a call asking for a different size gets its own
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def available_cores() -> int:
+    """Number of CPU cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def _get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return the shared scan pool of this size, creating it on first use"""
+    with _pool_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            # spawn: forking a threaded server process is not safe
+            pool = _pools[max_workers] = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def shutdown_pool() -> None:
+    """Stop the shared scan pools (e.g. on application shutdown)"""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+def _empty_columns() -> Dict[str, Dict[str, List[Any]]]:
+    return {
+        "texts": {
+            "total_count": [],
+            "risk_level": [],
+            "requires_redaction": []
+        },
+        "spans": {
+            "text_index": [],
+            "type": [],
+            "start": [],
+            "end": [],
+            "risk_level": []
+        }
+    }
+
+
+def _scan_slice(first_index: int, texts: Sequence[str]) -> Dict[str, Dict[str, List[Any]]]:
+    """Scan a contiguous slice of texts (runs inside a pool worker)"""
+    columns = _empty_columns()
+    text_columns = columns["texts"]
+    span_columns = columns["spans"]
+
+    for index, text in enumerate(texts, first_index):
+        spans = scan_spans(text or "")
+        text_columns["total_count"].append(len(spans))
+        text_columns["risk_level"].append(highest_risk(spans))
+        text_columns["requires_redaction"].append(bool(spans))
+
+        for span in spans:
+            span_columns["text_index"].append(index)
+            span_columns["type"].append(span.type)
+            span_columns["start"].append(span.start)
+            span_columns["end"].append(span.end)
+            span_columns["risk_level"].append(span.risk_level)
+
+    return columns
+
+
+def scan_batch(texts: Sequence[str], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Scan many texts for PII across a process pool
+
+    Args:
+        texts: Texts to scan (memory descriptions, stories, ...)
+        max_workers: Worker processes (defaults to the available cores)
+
+    Returns:
+        Columnar result: per-text columns under "texts" (row i is texts[i])
+        and one row per detected PII item under "spans". Matched values are
+        not echoed back; callers already hold the texts.
+    """
+    texts = list(texts)
+    workers = max_workers or available_cores()
+
+    if workers <= 1 or len(texts) < MIN_PARALLEL_BATCH:
+        columns = _scan_slice(0, texts)
+    else:
+        pool = _get_pool(workers)
+        slice_size = -(-len(texts) // (workers * SLICES_PER_WORKER))
+        futures = [
+            pool.submit(_scan_slice, start, texts[start:start + slice_size])
+            for start in range(0, len(texts), slice_size)
+        ]
+
+        columns = _empty_columns()
+        for future in futures:
+            part = future.result()
+            for group in ("texts", "spans"):
+                for name, values in part[group].items():
+                    columns[group][name].extend(values)
+
+    return {
+        "count": len(texts),
+        "texts": columns["texts"],
+        "spans": columns["spans"]
+    }
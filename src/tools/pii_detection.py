@@ -3,14 +3,20 @@ PII Detection Tool for Privacy Guard Agent
 """
 
 from langchain.tools import BaseTool
-from typing import Dict, List, Any
-import re
+from typing import Dict, Iterator, List, Any, Optional, Sequence
+
+from .pii_scanner import (
+    scan_spans, iter_spans, PIISpan, RISK_ORDER, DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP
+)
+from .pii_batch import scan_batch
+from ..metrics import instrument_tool
 
 
 class PIIDetectionTool(BaseTool):
     name = "pii_detection"
     description = "Detects personally identifiable information (PII) in text"
     
+    @instrument_tool
     def _run(self, text: str) -> Dict[str, Any]:
         """
         Detect PII in text
@@ -21,67 +27,7 @@ class PIIDetectionTool(BaseTool):
         Returns:
             Dictionary with detected PII types and locations
         """
-        detected_pii = []
-        
-        # Indonesian KTP (16 digits)
-        ktp_pattern = r'\b\d{16}\b'
-        ktp_matches = re.finditer(ktp_pattern, text)
-        for match in ktp_matches:
-            detected_pii.append({
-                "type": "ktp_number",
-                "value": match.group(),
-                "start": match.start(),
-                "end": match.end(),
-                "risk_level": "high"
-            })
-        
-        # Phone numbers
-        phone_pattern = r'\+?[\d\s\-\(\)]{10,}'
-        phone_matches = re.finditer(phone_pattern, text)
-        for match in phone_matches:
-            detected_pii.append({
-                "type": "phone_number",
-                "value": match.group(),
-                "start": match.start(),
-                "end": match.end(),
-                "risk_level": "medium"
-            })
-        
-        # Email addresses
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_matches = re.finditer(email_pattern, text)
-        for match in email_matches:
-            detected_pii.append({
-                "type": "email_address",
-                "value": match.group(),
-                "start": match.start(),
-                "end": match.end(),
-                "risk_level": "medium"
-            })
-        
-        # Credit card numbers (simple check)
-        cc_pattern = r'\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b'
-        cc_matches = re.finditer(cc_pattern, text)
-        for match in cc_matches:
-            detected_pii.append({
-                "type": "credit_card",
-                "value": match.group(),
-                "start": match.start(),
-                "end": match.end(),
-                "risk_level": "critical"
-            })
-        
-        # Detailed addresses with numbers
-        address_pattern = r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Road|Rd|Avenue|Ave|Jalan|Jl)\b'
-        address_matches = re.finditer(address_pattern, text, re.IGNORECASE)
-        for match in address_matches:
-            detected_pii.append({
-                "type": "detailed_address",
-                "value": match.group(),
-                "start": match.start(),
-                "end": match.end(),
-                "risk_level": "medium"
-            })
+        detected_pii = [span._asdict() for span in scan_spans(text)]
         
         return {
             "detected_pii": detected_pii,
@@ -90,18 +36,37 @@ class PIIDetectionTool(BaseTool):
             "requires_redaction": len(detected_pii) > 0
         }
     
+    def scan_stream(self, source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    overlap: int = DEFAULT_OVERLAP) -> Iterator[PIISpan]:
+        """
+        Detect PII in a large text (OCR dumps, imported notes) chunk by chunk
+        
+        Args:
+            source: Text file object or iterable of text chunks
+            chunk_size: Characters scanned per window
+            overlap: Characters carried between windows
+            
+        Yields:
+            PIISpan with absolute offsets, without holding the whole text
+        """
+        return iter_spans(source, chunk_size=chunk_size, overlap=overlap)
+    
+    def scan_batch(self, texts: Sequence[str], max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Detect PII in many texts at once across a process pool
+        
+        Args:
+            texts: Texts to scan
+            max_workers: Worker processes (defaults to the available cores)
+            
+        Returns:
+            Columnar scan result (see pii_batch.scan_batch)
+        """
+        return scan_batch(texts, max_workers=max_workers)
+    
     def _calculate_risk_level(self, pii_list: List[Dict]) -> str:
         """Calculate overall risk level"""
         if not pii_list:
             return "none"
         
-        risk_levels = [item["risk_level"] for item in pii_list]
-        
-        if "critical" in risk_levels:
-            return "critical"
-        elif "high" in risk_levels:
-            return "high"
-        elif "medium" in risk_levels:
-            return "medium"
-        else:
-            return "low"
+        return max((item["risk_level"] for item in pii_list), key=RISK_ORDER.__getitem__)
@@ -0,0 +1,325 @@
+"""
+PII Scanner - Shared single-pass PII scanning engine
+Used by PIIDetectionTool and the Privacy Guard quick scan
+"""
+
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+import re
+
+
+class PIIRule(NamedTuple):
+    """A single PII detection rule"""
+    pii_type: str
+    pattern: str
+    risk_level: str
+    flags: int = 0
+
+
+class PIISpan(NamedTuple):
+    """A typed PII match with absolute offsets into the scanned text"""
+    type: str
+    value: str
+    start: int
+    end: int
+    risk_level: str
+
+
+# Every rule the Privacy Guard knows about, in reporting order. Each rule
+# must scan in linear time: no two adjacent sub-patterns may compete for
+# the same characters, and unbounded runs may only be entered once per
+# run (see benchmarks/pii_regex_bench.py).
+PII_RULES: Tuple[PIIRule, ...] = (
+    # Indonesian KTP (16 digits)
+    PIIRule("ktp_number", r"\b\d{16}\b", "high"),
+    # Phone numbers: 10+ characters, starting with "+", "(" or a digit and
+    # ending with a digit (bare runs of whitespace are not phone numbers)
+    PIIRule("phone_number", r"\+?[\d\(][\d\s\-\(\)]{8,}\d", "medium"),
+    # Email addresses, only tried from the start of a local-part run
+    PIIRule("email_address", r"(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b", "medium"),
+    # Credit card numbers (simple check)
+    PIIRule("credit_card", r"\b\d{4}[\s\-]?\d{4}[\s\-]?\d{4}[\s\-]?\d{4}\b", "critical"),
+    # Detailed addresses with numbers: house number, up to six words, street type
+    PIIRule("detailed_address", r"\b\d+\s+(?:[A-Za-z]+\s+){1,6}(?:Street|St|Road|Rd|Avenue|Ave|Jalan|Jl)\b", "medium", re.IGNORECASE),
+)
+
+RISK_ORDER: Dict[str, int] = {"none": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+RULES_BY_TYPE: Dict[str, PIIRule] = {rule.pii_type: rule for rule in PII_RULES}
+TYPE_ORDER: Dict[str, int] = {rule.pii_type: index for index, rule in enumerate(PII_RULES)}
+
+COMPILED_RULES: Dict[str, Pattern] = {
+    rule.pii_type: re.compile(rule.pattern, rule.flags) for rule in PII_RULES
+}
+
+# Rules that find the top-level regions of a scan. KTP and credit card
+# numbers are always contained in a phone-style digit run, so they are
+# resolved inside each region instead of costing a pass of their own.
+_PRIMARY_TYPES = ("email_address", "detailed_address", "phone_number")
+_NESTED_TYPES = {
+    "phone_number": ("ktp_number", "credit_card"),
+    "email_address": ("phone_number", "ktp_number", "credit_card"),
+    "detailed_address": ("phone_number", "ktp_number", "credit_card"),
+}
+
+
+def _group(rule: PIIRule) -> str:
+    pattern = rule.pattern
+    if rule.flags & re.IGNORECASE:
+        pattern = f"(?i:{pattern})"
+    return f"(?P<{rule.pii_type}>{pattern})"
+
+
+COMBINED_PATTERN: Pattern = re.compile(
+    "|".join(_group(RULES_BY_TYPE[pii_type]) for pii_type in _PRIMARY_TYPES)
+)
+
+
+def _make_span(pii_type: str, text: str, start: int, end: int) -> PIISpan:
+    return PIISpan(pii_type, text[start:end], start, end, RULES_BY_TYPE[pii_type].risk_level)
+
+
+def _probe_run_tail(text: str, start: int, end: int, endpos: int) -> List[PIISpan]:
+    """Find an address or email that begins inside the tail of a phone run"""
+    found: List[PIISpan] = []
+
+    # The run swallows the house number of "0812345678 12 Main Street"
+    tail = end
+    while tail > start and text[tail - 1].isdigit():
+        tail -= 1
+    if tail < end:
+        match = COMPILED_RULES["detailed_address"].match(text, tail, endpos)
+        if match:
+            found.append(_make_span("detailed_address", text, tail, match.end()))
+
+    # ...and the local part of "0812345678-john@mail.com"
+    if end < endpos and not text[end].isspace():
+        word_start = end
+        while word_start > start and text[word_start - 1] not in " \t\r\n\f\v()":
+            word_start -= 1
+        email = COMPILED_RULES["email_address"]
+        for candidate in range(word_start, end):
+            match = email.match(text, candidate, endpos)
+            if match:
+                found.append(_make_span("email_address", text, candidate, match.end()))
+                break
+
+    return found
+
+
+# Characters of an email local part (the email rule's lookbehind class)
+_LOCAL_PART_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._%+-")
+
+
+def _probe_region_tail(text: str, start: int, end: int, endpos: int) -> Optional[PIISpan]:
+    """Find an email whose local part begins in the last word of a region ("12 Main Street.budi@mail.com")"""
+    word_start = end
+    while word_start > start and text[word_start - 1] in _LOCAL_PART_CHARS:
+        word_start -= 1
+    if word_start == end and (end >= endpos or text[end] not in _LOCAL_PART_CHARS):
+        return None
+    match = COMPILED_RULES["email_address"].match(text, word_start, endpos)
+    if match and match.end() > end:
+        return _make_span("email_address", text, word_start, match.end())
+    return None
+
+
+def _add_nested(spans: List[PIISpan], text: str, pii_type: str, start: int, end: int, endpos: int,
+                after: int = -1) -> None:
+    """Add the matches of the rules resolved inside a region (those ending after "after")"""
+    # One character of right context keeps \b anchors honest
+    limit = min(end + 1, endpos)
+    for nested_type in _NESTED_TYPES[pii_type]:
+        for nested in COMPILED_RULES[nested_type].finditer(text, start, limit):
+            if after < nested.end() <= end:
+                spans.append(_make_span(nested_type, text, nested.start(), nested.end()))
+
+
+def scan_spans(text: str, pos: int = 0, endpos: Optional[int] = None) -> List[PIISpan]:
+    """
+    Scan text for PII in a single pass of the combined matcher
+
+    Args:
+        text: Text to scan
+        pos: Offset to start scanning from
+        endpos: Offset to stop scanning at (defaults to end of text)
+
+    Returns:
+        List of PIISpan ordered by start offset. The same characters may
+        be reported under several types (a KTP is also a phone run); other
+        partial overlaps between rule families resolve to the leftmost match.
+    """
+    if not text:
+        return []
+
+    if endpos is None or endpos > len(text):
+        endpos = len(text)
+
+    spans: List[PIISpan] = []
+    search = COMBINED_PATTERN.search
+
+    while pos < endpos:
+        match = search(text, pos, endpos)
+        if match is None:
+            break
+
+        pii_type = match.lastgroup
+        start, end = match.span()
+        spans.append(_make_span(pii_type, text, start, end))
+        _add_nested(spans, text, pii_type, start, end, endpos)
+
+        # Regions the scan resumes after: the match, and whatever the
+        # probes find starting inside it
+        regions = [(pii_type, end)]
+        if pii_type == "phone_number":
+            for tail_span in _probe_run_tail(text, start, end, endpos):
+                spans.append(tail_span)
+                _add_nested(spans, text, tail_span.type, tail_span.start, tail_span.end, endpos, end)
+                regions.append((tail_span.type, tail_span.end))
+
+        resume = end
+        for region_type, region_end in regions:
+            resume = max(resume, region_end)
+            if region_type == "detailed_address":
+                # The email's lookbehind cannot match once the scan resumes
+                # inside its local part
+                email = _probe_region_tail(text, start, region_end, endpos)
+                if email is not None:
+                    spans.append(email)
+                    _add_nested(spans, text, "email_address", email.start, email.end, endpos, region_end)
+                    resume = max(resume, email.end)
+
+        pos = resume
+
+    spans.sort(key=lambda span: (span.start, TYPE_ORDER[span.type]))
+    return spans
+
+
+def highest_risk(spans: Iterable[PIISpan]) -> str:
+    """Return the highest risk level among spans ("none" when empty)"""
+    level = "none"
+    for span in spans:
+        if RISK_ORDER[span.risk_level] > RISK_ORDER[level]:
+            level = span.risk_level
+    return level
+
+
+# Streaming scan --------------------------------------------------------------
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_OVERLAP = 256
+MAX_WINDOW_CHUNKS = 4
+
+# Window boundaries no match can cross: right after a character that no
+# rule accepts, or between a full stop and whitespace
+_SAFE_CUT = re.compile(r"[^\w\s.%+\-@()]|\.(?=\s)")
+
+
+def _iter_chunks(source, chunk_size: int) -> Iterator[str]:
+    """Normalise a string, file-like object or iterable of strings into chunks"""
+    if isinstance(source, str):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _safe_cut(buffer: str, floor: int, limit: int, step: int) -> int:
+    """Return the last safe window boundary in buffer[floor:limit], or 0"""
+    block_end = limit
+    while block_end > floor:
+        block_start = max(floor, block_end - step)
+        cut = 0
+        for match in _SAFE_CUT.finditer(buffer, block_start, min(block_end + 1, len(buffer))):
+            if match.end() <= block_end:
+                cut = match.end()
+        if cut:
+            return cut
+        block_end = block_start
+    return 0
+
+
+class ScanWindow(NamedTuple):
+    """One window of a streaming scan; spans are relative to text"""
+    text: str
+    offset: int   # absolute offset of text[0] in the stream
+    start: int    # text[:start] is left context already emitted
+    end: int      # text[end:] is carried into the next window
+    spans: List[PIISpan]
+
+
+def iter_windows(source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 overlap: int = DEFAULT_OVERLAP) -> Iterator[ScanWindow]:
+    """
+    Split a text stream into scanned windows that never split a match
+
+    Windows end on a boundary that no match can cross; only a run of
+    MAX_WINDOW_CHUNKS chunks without any such boundary is cut hard, and
+    there a match longer than the overlap may be found in part. Consecutive
+    windows cover the stream exactly once between start and end.
+    """
+    buffer = ""
+    offset = 0   # absolute offset of buffer[0]
+    context = 0  # leading characters kept only as \b context
+    max_window = chunk_size * MAX_WINDOW_CHUNKS
+
+    for chunk in _iter_chunks(source, chunk_size):
+        buffer += chunk
+        if len(buffer) - context < chunk_size + overlap:
+            continue
+
+        target = len(buffer) - overlap
+        cut = _safe_cut(buffer, context, target, max(overlap, 1))
+        if not cut:
+            if len(buffer) < max_window:
+                continue
+            # Pathological input with no boundary at all: cut hard, but
+            # still avoid splitting any match already found
+            cut = target
+
+        spans = scan_spans(buffer, context)
+        # Move the cut back to the start of every span crossing it (a span
+        # starting inside a longer one can cross a cut that the longer one
+        # does not); a span starting at the window start cannot be moved
+        # before, so it is emitted whole
+        for span in reversed(spans):
+            if context < span.start < cut < span.end:
+                cut = span.start
+        emitted = [span for span in spans if span.start < cut]
+        # Like the whole-text scan, the next window resumes after the
+        # spans already reported, so none is found twice or in part
+        end = max([cut] + [span.end for span in emitted])
+
+        yield ScanWindow(buffer, offset, context, end, emitted)
+
+        offset += end - 1
+        buffer = buffer[end - 1:]
+        context = 1
+
+    yield ScanWindow(buffer, offset, context, len(buffer), scan_spans(buffer, context))
+
+
+def iter_spans(source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               overlap: int = DEFAULT_OVERLAP) -> Iterator[PIISpan]:
+    """
+    Scan a large text for PII without holding it in memory
+
+    Args:
+        source: Text, file-like object opened in text mode, or iterable of text chunks
+        chunk_size: Number of characters scanned per window
+        overlap: Characters carried into the next window so that matches
+            crossing a chunk boundary (KTP, card numbers) are found exactly once
+
+    Yields:
+        PIISpan with offsets relative to the start of the whole stream
+    """
+    for window in iter_windows(source, chunk_size, overlap):
+        offset = window.offset
+        for span in window.spans:
+            yield span._replace(start=offset + span.start, end=offset + span.end)
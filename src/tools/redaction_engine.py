@@ -0,0 +1,122 @@
+"""
+Redaction Engine - Merges overlapping PII spans and redacts text in one pass
+Used by DataRedactionTool and for streaming redaction of large texts
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .pii_scanner import (
+    PIISpan, RISK_ORDER, RULES_BY_TYPE, TYPE_ORDER,
+    DEFAULT_CHUNK_SIZE, DEFAULT_OVERLAP, iter_windows
+)
+
+REDACTION_LABELS: Dict[str, str] = {
+    "ktp_number": "[REDACTED_ID_NUMBER]",
+    "phone_number": "[REDACTED_PHONE]",
+    "email_address": "[REDACTED_EMAIL]",
+    "credit_card": "[REDACTED_CC]",
+    "detailed_address": "[REDACTED_ADDRESS]"
+}
+DEFAULT_LABEL = "[REDACTED]"
+
+# (start, end, pii_type) of one merged region
+Region = Tuple[int, int, str]
+
+
+def redaction_label(pii_type: str) -> str:
+    """Get appropriate redaction text for PII type"""
+    return REDACTION_LABELS.get(pii_type, DEFAULT_LABEL)
+
+
+def _rank(pii_type: str, risk_level: Optional[str]) -> Tuple[int, int]:
+    """Sort key for the label of a merged region (higher wins)"""
+    if risk_level is None:
+        rule = RULES_BY_TYPE.get(pii_type)
+        risk_level = rule.risk_level if rule else "medium"
+    # On equal risk the earlier rule (e.g. ktp_number before phone_number) wins
+    return RISK_ORDER.get(risk_level, 0), -TYPE_ORDER.get(pii_type, len(TYPE_ORDER))
+
+
+def merge_spans(pii_items: Iterable[Union[PIISpan, Dict[str, Any]]]) -> List[Region]:
+    """
+    Merge overlapping PII items into disjoint regions
+
+    Args:
+        pii_items: PIISpan tuples or PIIDetectionTool dicts ("type", "start", "end")
+
+    Returns:
+        Regions ordered by start, each labelled with its highest-risk type
+    """
+    spans = []
+    for item in pii_items:
+        if isinstance(item, PIISpan):
+            spans.append((item.start, item.end, item.type, item.risk_level))
+        else:
+            spans.append((item["start"], item["end"], item["type"], item.get("risk_level")))
+    spans.sort(key=lambda span: span[0])
+
+    regions: List[Region] = []
+    current_start = current_end = -1
+    current_type = ""
+    current_rank = (0, 0)
+
+    for start, end, pii_type, risk_level in spans:
+        if end <= start:
+            continue
+        rank = _rank(pii_type, risk_level)
+        if start < current_end:
+            current_end = max(current_end, end)
+            if rank > current_rank:
+                current_type, current_rank = pii_type, rank
+            continue
+        if current_end > current_start >= 0:
+            regions.append((current_start, current_end, current_type))
+        current_start, current_end, current_type, current_rank = start, end, pii_type, rank
+
+    if current_end > current_start >= 0:
+        regions.append((current_start, current_end, current_type))
+    return regions
+
+
+def _redacted_parts(text: str, regions: List[Region], start: int, end: int) -> List[str]:
+    """Pieces of text[start:end] with every region replaced by its label"""
+    parts = []
+    position = start
+    for region_start, region_end, pii_type in regions:
+        region_start = max(region_start, position)
+        region_end = min(region_end, end)
+        if region_start >= region_end:
+            continue
+        parts.append(text[position:region_start])
+        parts.append(redaction_label(pii_type))
+        position = region_end
+    parts.append(text[position:end])
+    return parts
+
+
+def redact_text(text: str, regions: List[Region]) -> str:
+    """Write the redacted text in a single pass over the merged regions"""
+    return "".join(_redacted_parts(text, regions, 0, len(text)))
+
+
+def redact_range(text: str, regions: List[Region], start: int, end: int) -> str:
+    """Redacted text[start:end]; regions may extend past either end"""
+    return "".join(_redacted_parts(text, regions, start, end))
+
+
+def iter_redacted(source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  overlap: int = DEFAULT_OVERLAP) -> Iterator[str]:
+    """
+    Detect and redact PII in a text stream without materialising it
+
+    Args:
+        source: Text, file-like object opened in text mode, or iterable of text chunks
+        chunk_size: Characters scanned per window
+        overlap: Characters carried between windows
+
+    Yields:
+        Consecutive pieces of the redacted text
+    """
+    for window in iter_windows(source, chunk_size, overlap):
+        regions = merge_spans(window.spans)
+        yield "".join(_redacted_parts(window.text, regions, window.start, window.end))
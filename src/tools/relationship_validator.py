@@ -1,12 +1,30 @@
 """Relationship Validator Tool"""
 from langchain.tools import BaseTool
-from typing import Dict
+from typing import Any, Dict, Iterable, List, Tuple
 from datetime import datetime
 
+import numpy as np
+
+from ..metrics import instrument_tool
+from .family_graph import CHILD, PARENT, SIBLING, SPOUSE, csr_from_edges, gather_neighbours
+
+# Age difference between a parent and their child, in years
+PARENT_MIN_YEARS = 15
+PARENT_MAX_YEARS = 60
+# A father may die up to a pregnancy before his child is born
+POSTHUMOUS_BIRTH_DAYS = 280
+DAYS_PER_YEAR = 365.25
+# Kahn frontiers at least this wide are peeled as arrays, narrower ones member by member
+PEEL_BATCH = 64
+
+ERROR = "error"
+WARNING = "warning"
+
 class RelationshipValidatorTool(BaseTool):
     name = "relationship_validator"
     description = "Validates family relationships for logical consistency"
     
+    @instrument_tool
     def _run(self, person1_birth: str, person2_birth: str, relationship_type: str) -> Dict:
         """Validate relationship"""
         try:
@@ -15,10 +33,10 @@ class RelationshipValidatorTool(BaseTool):
             
             date1 = datetime.fromisoformat(person1_birth)
             date2 = datetime.fromisoformat(person2_birth)
-            age_diff_years = abs((date1 - date2).days / 365.25)
+            age_diff_years = abs((date1 - date2).days / DAYS_PER_YEAR)
             
             if relationship_type == "parent":
-                if 15 <= age_diff_years <= 60:
+                if PARENT_MIN_YEARS <= age_diff_years <= PARENT_MAX_YEARS:
                     return {"is_valid": True, "reason": "Age difference appropriate for parent-child"}
                 else:
                     return {"is_valid": False, "reason": f"Age difference ({age_diff_years:.1f} years) outside typical range"}
@@ -26,3 +44,252 @@ class RelationshipValidatorTool(BaseTool):
             return {"is_valid": True, "reason": "Validation passed"}
         except Exception as e:
             return {"is_valid": False, "error": str(e)}
+
+
+def _dates(values: Iterable[Any]) -> np.ndarray:
+    """ISO dates (or None) as datetime64[D], NaT where unknown"""
+    return np.array([value or None for value in values], dtype="datetime64[D]")
+
+
+def validate_relationships(members: Iterable[Dict[str, Any]],
+                           relationships: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Validate every relationship of a family at once
+
+    Dates are parsed once into arrays and every rule runs as one array
+    operation over all relationships; ancestry cycles are found in linear
+    time (level-wise Kahn peeling, then Tarjan's algorithm on whatever is
+    left).
+
+    Args:
+        members: family_members rows (id, gender, birth_date, death_date)
+        relationships: relationships rows (id, person1_id, person2_id,
+            relationship_type, start_date)
+
+    Returns:
+        Dictionary with "is_valid" (no errors), "violations" (rule,
+        severity, relationship and people concerned, detail), "cycles"
+        (members and relationship IDs of each ancestry cycle) and
+        per-rule "counts"
+    """
+    members = list(members)
+    relationships = list(relationships)
+    index = {str(member["id"]): i for i, member in enumerate(members)}
+    size = len(members)
+    birth = _dates(member.get("birth_date") for member in members)
+    death = _dates(member.get("death_date") for member in members)
+    female = np.array([member.get("gender") == "female" for member in members], dtype=bool)
+
+    first = np.array([index.get(str(row.get("person1_id")), -1) for row in relationships], dtype=np.int64)
+    second = np.array([index.get(str(row.get("person2_id")), -1) for row in relationships], dtype=np.int64)
+    kind = np.array([row.get("relationship_type") or "" for row in relationships], dtype=object)
+    start = _dates(row.get("start_date") for row in relationships)
+    row_ids = [row.get("id") for row in relationships]
+
+    report = _Report(relationships)
+    report.add("unknown_member", ERROR, np.flatnonzero((first < 0) | (second < 0)),
+               "Relationship names a person who is not a member of this family")
+    known = (first >= 0) & (second >= 0)
+
+    # Every parent link as (parent, child), whichever way the row is written
+    is_parent, is_child = known & (kind == PARENT), known & (kind == CHILD)
+    parent_rows = np.flatnonzero(is_parent | is_child)
+    parent = np.where(is_parent, first, second)[parent_rows]
+    child = np.where(is_parent, second, first)[parent_rows]
+
+    dated = ~np.isnat(birth[child]) & ~np.isnat(birth[parent])
+    gap_years = np.where(dated, (birth[child] - birth[parent]).astype(np.int64), 0) / DAYS_PER_YEAR
+    report.add("parent_younger_than_child", ERROR, parent_rows[dated & (gap_years <= 0)],
+               "Parent is not older than the child", gap_years[dated & (gap_years <= 0)])
+    too_young = dated & (gap_years > 0) & (gap_years < PARENT_MIN_YEARS)
+    report.add("parent_too_young", ERROR, parent_rows[too_young],
+               f"Parent was under {PARENT_MIN_YEARS} at the child's birth", gap_years[too_young])
+    too_old = dated & (gap_years > PARENT_MAX_YEARS)
+    report.add("parent_too_old", WARNING, parent_rows[too_old],
+               f"Parent was over {PARENT_MAX_YEARS} at the child's birth", gap_years[too_old])
+
+    # Dead before the child was born (fathers: before it was conceived)
+    allowance = np.where(female[parent], 0, POSTHUMOUS_BIRTH_DAYS).astype("timedelta64[D]")
+    posthumous = ~np.isnat(death[parent]) & ~np.isnat(birth[child]) & (death[parent] + allowance < birth[child])
+    report.add("parent_died_before_birth", ERROR, parent_rows[posthumous],
+               "Parent died before the child could be born")
+
+    # More than two parents of one child
+    parent_keys, parent_first = np.unique(parent.astype(np.int64) * max(size, 1) + child, return_index=True)
+    distinct_child = child[parent_first]
+    crowded = np.flatnonzero(np.bincount(distinct_child, minlength=size) > 2)
+    report.add("more_than_two_parents", WARNING, parent_rows[parent_first][np.isin(distinct_child, crowded)],
+               "Child has more than two recorded parents")
+
+    # Marriage outside both spouses' lifetimes
+    spouse_rows = np.flatnonzero(known & (kind == SPOUSE) & ~np.isnat(start))
+    a, b, married = first[spouse_rows], second[spouse_rows], start[spouse_rows]
+    unborn = (married < birth[a]) | (married < birth[b])
+    report.add("married_before_birth", ERROR, spouse_rows[unborn], "Marriage date is before a spouse was born")
+    dead = (married > death[a]) | (married > death[b])
+    report.add("married_after_death", ERROR, spouse_rows[dead], "Marriage date is after a spouse died")
+
+    # A parent and child who are also recorded as spouses or siblings
+    other_rows = np.flatnonzero(known & ((kind == SPOUSE) | (kind == SIBLING)))
+    other_keys = _pair_keys(first[other_rows], second[other_rows], size)
+    clash = np.isin(other_keys, _pair_keys(parent, child, size))
+    report.add("conflicting_relationships", ERROR, other_rows[clash],
+               "People linked as parent and child are also linked as spouses or siblings")
+
+    cycles = []
+    for cycle in _ancestry_cycles(parent_keys, size):
+        in_cycle = np.zeros(size, dtype=bool)
+        in_cycle[cycle] = True
+        rows = parent_rows[in_cycle[parent] & in_cycle[child]]
+        report.add("ancestry_cycle", ERROR, rows, "Person is recorded as their own ancestor")
+        cycles.append({
+            "members": [str(members[i]["id"]) for i in cycle],
+            "relationship_ids": [row_ids[r] for r in rows.tolist()]
+        })
+
+    return {
+        "is_valid": not any(v["severity"] == ERROR for v in report.violations),
+        "checked_relationships": len(relationships),
+        "violations": report.violations,
+        "cycles": cycles,
+        "counts": report.counts
+    }
+
+
+def _pair_keys(a: np.ndarray, b: np.ndarray, size: int) -> np.ndarray:
+    """Order-independent key of each (a, b) pair"""
+    return np.minimum(a, b).astype(np.int64) * max(size, 1) + np.maximum(a, b)
+
+
+def _ancestry_cycles(parent_keys: np.ndarray, size: int) -> List[List[int]]:
+    """
+    Groups of members that are each other's ancestors (strongly connected
+    components of the parent graph with more than one member)
+
+    Members with no remaining parents, then members with no remaining
+    children, are peeled off (Kahn's algorithm, once downwards and once
+    upwards); in a real family tree nothing is left. Tarjan's algorithm
+    then splits the remainder. Linear in the number of parent links.
+    """
+    if not parent_keys.size:
+        return []
+    parent = parent_keys // max(size, 1)
+    child = parent_keys % max(size, 1)
+    # Whatever is left going down still has a parent left, so one pass
+    # each way reaches the fixed point
+    left = ~_peel(parent, child, size)
+    keep = left[parent] & left[child]
+    left = ~_peel(child[keep], parent[keep], size)
+    keep &= left[parent] & left[child]
+    if not keep.any():
+        return []
+
+    offsets, neighbours = csr_from_edges(parent[keep], child[keep], size)
+    return [sorted(component) for component in _strong_components(offsets, neighbours, np.unique(parent[keep]))
+            if len(component) > 1]
+
+
+def _peel(sources: np.ndarray, targets: np.ndarray, size: int) -> np.ndarray:
+    """
+    Members Kahn's algorithm removes from a graph: those with no incoming
+    edge, then those whose incoming edges all came from removed members
+
+    Wide levels are handled an array at a time; once the frontier is
+    narrow (long single lines of descent) members are taken one by one,
+    so a deep family costs no more than a wide one.
+    """
+    offsets, neighbours = csr_from_edges(sources, targets, size)
+    degree = np.bincount(targets, minlength=size)
+    removed = degree == 0
+    frontier = np.flatnonzero(removed)
+    while frontier.size >= PEEL_BATCH:
+        reached, _ = gather_neighbours(offsets, neighbours, frontier)
+        reached, counts = np.unique(reached, return_counts=True)
+        degree[reached] -= counts
+        frontier = reached[degree[reached] == 0]
+        removed[frontier] = True
+
+    if frontier.size:
+        offset_list, neighbour_list, degree_list = offsets.tolist(), neighbours.tolist(), degree.tolist()
+        queue = frontier.tolist()
+        while queue:
+            node = queue.pop()
+            for nxt in neighbour_list[offset_list[node]:offset_list[node + 1]]:
+                degree_list[nxt] -= 1
+                if not degree_list[nxt]:
+                    removed[nxt] = True
+                    queue.append(nxt)
+    return removed
+
+
+def _strong_components(offsets: np.ndarray, neighbours: np.ndarray,
+                       starts: np.ndarray) -> List[List[int]]:
+    """Tarjan's strongly connected components, iterative (no recursion limit)"""
+    order: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    on_stack = set()
+    stack: List[int] = []
+    components = []
+    for root in starts.tolist():
+        if root in order:
+            continue
+        work: List[Tuple[int, int]] = [(root, int(offsets[root]))]
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, edge = work[-1]
+            if edge < offsets[node + 1]:
+                work[-1] = (node, edge + 1)
+                nxt = int(neighbours[edge])
+                if nxt not in order:
+                    order[nxt] = low[nxt] = len(order)
+                    stack.append(nxt)
+                    on_stack.add(nxt)
+                    work.append((nxt, int(offsets[nxt])))
+                elif nxt in on_stack:
+                    low[node] = min(low[node], order[nxt])
+                continue
+            work.pop()
+            if work:
+                above = work[-1][0]
+                low[above] = min(low[above], low[node])
+            if low[node] == order[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+class _Report:
+    """Violations collected rule by rule"""
+
+    def __init__(self, relationships: List[Dict[str, Any]]):
+        self.relationships = relationships
+        self.violations: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = {}
+
+    def add(self, rule: str, severity: str, rows: np.ndarray, detail: str, years: np.ndarray = None) -> None:
+        if not rows.size:
+            return
+        self.counts[rule] = self.counts.get(rule, 0) + int(rows.size)
+        years_list = years.tolist() if years is not None else [None] * rows.size
+        for row_index, gap in zip(rows.tolist(), years_list):
+            row = self.relationships[row_index]
+            violation = {
+                "rule": rule,
+                "severity": severity,
+                "relationship_id": row.get("id"),
+                "person1_id": row.get("person1_id"),
+                "person2_id": row.get("person2_id"),
+                "relationship_type": row.get("relationship_type"),
+                "detail": detail
+            }
+            if gap is not None:
+                violation["age_difference_years"] = round(gap, 1)
+            self.violations.append(violation)
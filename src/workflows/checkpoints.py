@@ -0,0 +1,236 @@
+"""
+Workflow Checkpoints - Durable jobs for the LangGraph workflows
+Graph state is checkpointed after every node by a LangGraph checkpointer
+(SQLite locally, any BaseCheckpointSaver in general), so a failed or
+interrupted job resumes from its last completed node. A job store tracks
+the status of each job for polling.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+DEFAULT_CHECKPOINT_DB = os.path.join(tempfile.gettempdir(), "bfl-workflows.sqlite")
+# Attempts per run; every retry continues from the last checkpoint
+DEFAULT_MAX_ATTEMPTS = 2
+
+
+class JobStore(ABC):
+    """
+    Status records of workflow jobs (the graph state lives in the checkpointer)
+
+    A job is "pending", "running", "completed" or "failed".
+    """
+
+    @abstractmethod
+    def create(self, workflow: str, job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Register a new pending job"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record, or None if unknown"""
+
+    @abstractmethod
+    def update(self, job_id: str, status: str, error: Optional[str] = None,
+               attempt: bool = False) -> None:
+        """Set a job's status (attempt=True counts one more run attempt)"""
+
+    @staticmethod
+    def _new_record(workflow: str, job_id: Optional[str]) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "job_id": job_id or str(uuid.uuid4()),
+            "workflow": workflow,
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store (development and tests)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, workflow: str, job_id: Optional[str] = None) -> Dict[str, Any]:
+        record = self._new_record(workflow, job_id)
+        with self._lock:
+            self._jobs[record["job_id"]] = record
+        return dict(record)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def update(self, job_id: str, status: str, error: Optional[str] = None,
+               attempt: bool = False) -> None:
+        with self._lock:
+            record = self._jobs[job_id]
+            record.update(status=status, error=error, updated_at=time.time())
+            if attempt:
+                record["attempts"] += 1
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in a local SQLite database (may share the checkpoint file)"""
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_DB):
+        self.path = path
+        self._conn = _connect(path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workflow_jobs ("
+                " job_id TEXT PRIMARY KEY, workflow TEXT NOT NULL, status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL, error TEXT,"
+                " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def create(self, workflow: str, job_id: Optional[str] = None) -> Dict[str, Any]:
+        record = self._new_record(workflow, job_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO workflow_jobs VALUES (:job_id, :workflow, :status, :attempts,"
+                " :error, :created_at, :updated_at)", record
+            )
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM workflow_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, status: str, error: Optional[str] = None,
+               attempt: bool = False) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE workflow_jobs SET status = ?, error = ?, updated_at = ?,"
+                " attempts = attempts + ? WHERE job_id = ?",
+                (status, error, time.time(), int(attempt), job_id)
+            )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Shared by request threads; every store serialises access with a lock
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets pollers read while a job is writing checkpoints
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def sqlite_checkpointer(path: str = DEFAULT_CHECKPOINT_DB) -> SqliteSaver:
+    """LangGraph checkpointer writing to a local SQLite database"""
+    saver = SqliteSaver(_connect(path))
+    saver.setup()
+    return saver
+
+
+class WorkflowRunner:
+    """
+    Runs one compiled workflow as durable jobs
+
+    The job ID is the LangGraph thread_id, so the checkpointer keeps the
+    state after every completed node of the job. A run that raises is
+    retried up to max_attempts times, and resume() continues a failed
+    job later; both pick up after the last checkpoint, so only the
+    failed node runs again.
+    """
+
+    def __init__(self, name: str, graph, jobs: JobStore, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        if graph.checkpointer is None:
+            raise ValueError(f"Workflow '{name}' must be compiled with a checkpointer")
+        self.name = name
+        self.graph = graph
+        self.jobs = jobs
+        self.max_attempts = max(1, max_attempts)
+
+    def submit(self, job_id: Optional[str] = None) -> str:
+        """Register a job to be run with run()"""
+        return self.jobs.create(self.name, job_id)["job_id"]
+
+    def run(self, job_id: str, initial_state: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run (initial_state given) or continue (None) a job to completion
+
+        Returns:
+            Final state, or None if every attempt failed (see status())
+        """
+        config = self._config(job_id)
+        graph_input = initial_state
+        for _attempt in range(self.max_attempts):
+            self.jobs.update(job_id, "running", attempt=True)
+            try:
+                result = self.graph.invoke(graph_input, config)
+            except Exception as e:
+                self.jobs.update(job_id, "failed", error=str(e))
+                # The next attempt starts from the last checkpoint
+                graph_input = None
+                continue
+            self.jobs.update(job_id, "completed")
+            return result
+        return None
+
+    def resume(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Continue a failed or interrupted job from its last completed node"""
+        return self.run(job_id, None)
+
+    def can_resume(self, job_id: str) -> bool:
+        """True if the job has a checkpoint with nodes left to run"""
+        return bool(self.graph.get_state(self._config(job_id)).next)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Job record plus its progress
+
+        Returns:
+            The job record with "next_nodes" (nodes still to run),
+            "completed_steps" and, once completed, the final "state";
+            None if the job is unknown
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job["workflow"] != self.name:
+            return None
+        snapshot = self.graph.get_state(self._config(job_id))
+        job["next_nodes"] = list(snapshot.next)
+        job["step"] = (snapshot.metadata or {}).get("step")
+        job["state"] = snapshot.values if job["status"] == "completed" else None
+        return job
+
+    @staticmethod
+    def _config(job_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": job_id}}
+
+
+def checkpoint_backend() -> Tuple[BaseCheckpointSaver, JobStore]:
+    """
+    Checkpointer and job store configured from the environment
+
+    WORKFLOW_CHECKPOINT_DB is the SQLite file; "memory" keeps both in
+    process (nothing survives a restart).
+    """
+    path = os.getenv("WORKFLOW_CHECKPOINT_DB", DEFAULT_CHECKPOINT_DB)
+    if path == "memory":
+        checkpointer: BaseCheckpointSaver = MemorySaver()
+        jobs: JobStore = MemoryJobStore()
+    else:
+        checkpointer = sqlite_checkpointer(path)
+        jobs = SQLiteJobStore(path)
+    return checkpointer, jobs
@@ -4,87 +4,288 @@ Memory Processing, Story Generation, and Chat workflows
 """
 
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Dict, List, Any
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import TypedDict, Annotated, Callable, Dict, Iterator, List, Any, Optional
+import contextvars
+import threading
+import time
+
+from ..agents.story_review import StoryReviewer
+from ..metrics import NODE_ERRORS, NODE_SECONDS, instrument_node, iter_scoped
+
+
+def merge_dicts(left: Optional[Dict], right: Optional[Dict]) -> Dict:
+    """State reducer: parallel branches each add their own keys"""
+    return {**(left or {}), **(right or {})}
 
 
 # State definitions
 class MemoryState(TypedDict):
     memory_id: str
+    family_id: str
     image_url: str
     user_description: str
     privacy_approved: bool
     ai_caption: str
     detected_faces: List[Dict]
+    exif_data: Dict[str, Any]
+    ocr_text: List[str]
+    location_private: bool
+    branch_errors: Annotated[Dict[str, str], merge_dicts]
+    phash: str
+    duplicate_of: Optional[str]
     final_output: Dict[str, Any]
 
 
 class StoryState(TypedDict):
     person_id: str
+    person: Dict[str, Any]
     memories: List[Dict]
     relationships: List[Dict]
     tone: str
     story_draft: str
     final_story: str
+    withheld_paragraphs: List[int]
+
+
+# Time limit per analysis branch (seconds); an overrunning or failing
+# branch contributes its fallback and the memory is still processed
+BRANCH_TIMEOUTS = {
+    "caption": 30.0,
+    "detect_faces": 20.0,
+    "extract_metadata": 10.0,
+    "ocr": 60.0
+}
+ANALYSIS_BRANCHES = tuple(BRANCH_TIMEOUTS)
+
+# Where each branch's result is kept: its key in memories.ai_analysis
+# (reused by re-uploads) and in the workflow state
+ANALYSIS_FIELDS = {
+    "caption": ("suggested_caption", "ai_caption"),
+    "detect_faces": ("faces_detected", "detected_faces"),
+    "extract_metadata": ("metadata", "exif_data"),
+    "ocr": ("embedded_text", "ocr_text")
+}
+
+# Calls of one branch in flight at once, abandoned ones included: a call
+# that overran its timeout keeps its slot until it returns, so hung calls
+# can hold up only their own branch, and only up to this many
+BRANCH_CONCURRENCY = 16
+_branch_slots: Dict[str, threading.BoundedSemaphore] = {}
+_branch_slots_lock = threading.Lock()
+
+
+def _slots(name: str) -> threading.BoundedSemaphore:
+    with _branch_slots_lock:
+        slots = _branch_slots.get(name)
+        if slots is None:
+            slots = _branch_slots[name] = threading.BoundedSemaphore(BRANCH_CONCURRENCY)
+        return slots
+
+
+def analysis_branch(name: str, timeout: float, call: Callable[[Dict], Dict[str, Any]],
+                    pick: Callable[[Dict[str, Any]], Dict[str, Any]],
+                    fallback: Dict[str, Any]) -> Callable[[Dict], Dict[str, Any]]:
+    """
+    Graph node running one tool call with a time limit
+    
+    Branches run in the same graph step, so each returns only the state
+    keys it owns (plus its entry in branch_errors on failure). The call
+    gets its own thread once a slot of the branch is free, and the time
+    limit counts from then; an abandoned call finishes in the background
+    and its result is dropped.
+    """
+    def node(state: MemoryState) -> Dict[str, Any]:
+        slots = _slots(name)
+        if not slots.acquire(timeout=timeout):
+            return {**fallback, "branch_errors": {name: f"no free slot within {timeout:g}s"}}
+        future: Future = Future()
+        # The copied context carries the node's metric labels into the worker
+        context = contextvars.copy_context()
+        
+        def work() -> None:
+            try:
+                future.set_result(context.run(call, state))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                slots.release()
+        
+        threading.Thread(target=work, name=f"memory-branch-{name}", daemon=True).start()
+        try:
+            result = future.result(timeout=timeout)
+            if result.get("success", True):
+                return pick(result)
+            error = result.get("error") or "failed"
+        except FutureTimeout:
+            error = f"timed out after {timeout:g}s"
+        except Exception as e:
+            error = str(e)
+        return {**fallback, "branch_errors": {name: error}}
+    
+    return node
 
 
 # Memory Processing Workflow
-def create_memory_workflow(privacy_agent, curator_agent, biographer_agent):
-    """Create memory processing workflow"""
+def create_memory_workflow(privacy_agent, curator_agent, biographer_agent,
+                           branch_timeouts: Optional[Dict[str, float]] = None,
+                           checkpointer: Optional[BaseCheckpointSaver] = None):
+    """
+    Create memory processing workflow
+    
+    With a checkpointer the state is saved after every node, keyed by the
+    thread_id in the run config (see checkpoints.WorkflowRunner).
+    """
+    timeouts = {**BRANCH_TIMEOUTS, **(branch_timeouts or {})}
     
     def privacy_check_node(state: MemoryState) -> MemoryState:
-        # Run Privacy Guard Agent
-        task = privacy_agent.create_privacy_check_task(state["user_description"])
-        # result = task.execute()
-        state['privacy_approved'] = True  # Placeholder
+        # Run Privacy Guard (rules first, LLM only for ambiguous text)
+        verdict = privacy_agent.check_privacy(state["user_description"])
+        state['privacy_approved'] = verdict["is_safe"]
         return state
     
-    def analyze_memory_node(state: MemoryState) -> MemoryState:
-        # Run Memory Curator Agent
-        task = curator_agent.create_analyze_photo_task(
-            state["image_url"], 
-            state["user_description"]
-        )
-        # caption = task.execute()
-        state['ai_caption'] = "A joyful family gathering"  # Placeholder
-        state['detected_faces'] = []
+    def check_duplicate_node(state: MemoryState) -> MemoryState:
+        # Re-uploads of an analysed photo reuse its analysis; every upload's hash is stored for later ones
+        family_id = state.get("family_id")
+        if family_id:
+            duplicate = curator_agent.find_duplicate_analysis(state["image_url"], family_id)
+            state['phash'] = duplicate["phash"]
+            state['duplicate_of'] = duplicate["duplicate_of"]
+            curator_agent.save_phash(family_id, state["memory_id"], duplicate["phash"])
+            if duplicate["duplicate_of"]:
+                # Branches that failed for the original are missing from its analysis
+                analysis = duplicate["ai_analysis"]
+                state['ai_caption'] = analysis.get("suggested_caption", "")
+                state['detected_faces'] = analysis.get("faces_detected", [])
+                state['exif_data'] = analysis.get("metadata", {})
+                state['ocr_text'] = analysis.get("embedded_text", [])
+                state['branch_errors'] = {
+                    branch: "failed for the reused analysis"
+                    for branch, (field, _key) in ANALYSIS_FIELDS.items() if field not in analysis
+                }
         return state
     
+    def start_analysis_node(state: MemoryState) -> Dict[str, Any]:
+        # Fan-out point: the analysis branches all start from here
+        return {"branch_errors": {}}
+    
+    caption_node = analysis_branch(
+        "caption", timeouts["caption"],
+        lambda state: curator_agent.vision_tool._run(state["image_url"]),
+        lambda result: {"ai_caption": result["caption"] or ""},
+        {"ai_caption": ""}
+    )
+    detect_faces_node = analysis_branch(
+        "detect_faces", timeouts["detect_faces"],
+        lambda state: curator_agent.face_tool._run(state["image_url"], state.get("family_id")),
+        lambda result: {"detected_faces": result["faces_detected"]},
+        {"detected_faces": []}
+    )
+    extract_metadata_node = analysis_branch(
+        "extract_metadata", timeouts["extract_metadata"],
+        lambda state: curator_agent.exif_tool._run(state["image_url"]),
+        lambda result: {"exif_data": {
+            key: result.get(key)
+            for key in ("date_taken", "camera_model", "gps_info", "resolution", "file_format")
+        }},
+        {"exif_data": {}}
+    )
+    ocr_node = analysis_branch(
+        "ocr", timeouts["ocr"],
+        lambda state: curator_agent.ocr_tool._run(state["image_url"]),
+        lambda result: {"ocr_text": result["extracted_text"]},
+        {"ocr_text": []}
+    )
+    
+    def join_node(state: MemoryState) -> Dict[str, Any]:
+        # All branches have finished (or fallen back); combine their results
+        update: Dict[str, Any] = {"location_private": False}
+        family_id = state.get("family_id")
+        gps_info = state.get("exif_data", {}).get("gps_info")
+        if family_id and gps_info:
+            update['location_private'] = privacy_agent.check_location(family_id, gps_info)["is_private"]
+            curator_agent.remember_location(family_id, state["memory_id"], gps_info)
+        
+        # Results of the branches that succeeded are offered for reuse by later
+        # re-uploads (a branch unavailable in this deployment, e.g. OCR without
+        # its models, always fails and must not block the others)
+        failed = state.get("branch_errors") or {}
+        analysis = {
+            field: state.get(key)
+            for branch, (field, key) in ANALYSIS_FIELDS.items() if branch not in failed
+        }
+        if family_id and state.get("phash") and analysis:
+            curator_agent.remember_analysis(family_id, state["memory_id"], state["phash"], analysis)
+        return update
+    
     def finalize_node(state: MemoryState) -> MemoryState:
         # Run Biographer for final caption
         state['final_output'] = {
-            'caption': state['ai_caption'],
-            'faces': state['detected_faces']
+            'caption': state.get('ai_caption', ""),
+            'faces': state.get('detected_faces', []),
+            'metadata': state.get('exif_data', {}),
+            'embedded_text': state.get('ocr_text', []),
+            'location_private': state.get('location_private', False),
+            'partial': bool(state.get('branch_errors')),
+            'branch_errors': state.get('branch_errors', {}),
+            'phash': state.get('phash'),
+            'duplicate_of': state.get('duplicate_of')
         }
         return state
     
     # Build workflow graph
     workflow = StateGraph(MemoryState)
-    workflow.add_node("privacy_check", privacy_check_node)
-    workflow.add_node("analyze_memory", analyze_memory_node)
-    workflow.add_node("finalize", finalize_node)
+    nodes = {
+        "privacy_check": privacy_check_node,
+        "check_duplicate": check_duplicate_node,
+        "start_analysis": start_analysis_node,
+        "caption": caption_node,
+        "detect_faces": detect_faces_node,
+        "extract_metadata": extract_metadata_node,
+        "ocr": ocr_node,
+        "join": join_node,
+        "finalize": finalize_node
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, instrument_node("memory", name, node))
     
     workflow.set_entry_point("privacy_check")
     workflow.add_conditional_edges(
         "privacy_check",
         lambda state: "analyze" if state['privacy_approved'] else "reject",
         {
-            "analyze": "analyze_memory",
+            "analyze": "check_duplicate",
             "reject": END
         }
     )
-    workflow.add_edge("analyze_memory", "finalize")
+    workflow.add_conditional_edges(
+        "check_duplicate",
+        lambda state: "reuse" if state.get('duplicate_of') else "analyze",
+        {
+            "reuse": "finalize",
+            "analyze": "start_analysis"
+        }
+    )
+    # Independent analyses run in parallel; join waits for all of them
+    for branch in ANALYSIS_BRANCHES:
+        workflow.add_edge("start_analysis", branch)
+    workflow.add_edge(list(ANALYSIS_BRANCHES), "join")
+    workflow.add_edge("join", "finalize")
     workflow.add_edge("finalize", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
 
 # Story Generation Workflow
-def create_story_workflow(genealogist_agent, curator_agent, biographer_agent, privacy_agent):
-    """Create story generation workflow"""
+def _story_nodes(genealogist_agent, curator_agent, biographer_agent, privacy_agent,
+                 workflow: str = "story") -> Dict[str, Callable]:
+    """Node functions shared by the story graph and the streaming runner"""
     
     def gather_context_node(state: StoryState) -> StoryState:
         # Run Genealogist Agent
         state['relationships'] = []  # Placeholder
+        state['person'] = state.get('person') or {"name": state['person_id']}
         return state
     
     def curate_memories_node(state: StoryState) -> StoryState:
@@ -94,20 +295,43 @@ def create_story_workflow(genealogist_agent, curator_agent, biographer_agent, pr
     
     def write_story_node(state: StoryState) -> StoryState:
         # Biographer writes the story
-        state['story_draft'] = "Once upon a time..."  # Placeholder
+        state['story_draft'] = "".join(
+            biographer_agent.stream_story(state['person'], state['memories'], state.get('tone', "emotional"))
+        )
         return state
     
     def review_story_node(state: StoryState) -> StoryState:
-        # Privacy Guard final review
-        state['final_story'] = state['story_draft']
+        # Privacy Guard final review, paragraph by paragraph
+        reviewer = StoryReviewer(privacy_agent.decision_engine)
+        reviewer.feed(state['story_draft'])
+        reviewer.close()
+        state['final_story'] = reviewer.final_text
+        state['withheld_paragraphs'] = reviewer.withheld
         return state
     
+    nodes = {
+        "gather_context": gather_context_node,
+        "curate_memories": curate_memories_node,
+        "write_story": write_story_node,
+        "review_story": review_story_node
+    }
+    return {name: instrument_node(workflow, name, node) for name, node in nodes.items()}
+
+
+def create_story_workflow(genealogist_agent, curator_agent, biographer_agent, privacy_agent,
+                          checkpointer: Optional[BaseCheckpointSaver] = None):
+    """
+    Create story generation workflow
+    
+    With a checkpointer a failed write_story resumes without gathering
+    context and curating memories again.
+    """
+    nodes = _story_nodes(genealogist_agent, curator_agent, biographer_agent, privacy_agent)
+    
     # Build workflow
     story_workflow = StateGraph(StoryState)
-    story_workflow.add_node("gather_context", gather_context_node)
-    story_workflow.add_node("curate_memories", curate_memories_node)
-    story_workflow.add_node("write_story", write_story_node)
-    story_workflow.add_node("review_story", review_story_node)
+    for name, node in nodes.items():
+        story_workflow.add_node(name, node)
     
     story_workflow.set_entry_point("gather_context")
     story_workflow.add_edge("gather_context", "curate_memories")
@@ -115,4 +339,57 @@ def create_story_workflow(genealogist_agent, curator_agent, biographer_agent, pr
     story_workflow.add_edge("write_story", "review_story")
     story_workflow.add_edge("review_story", END)
     
-    return story_workflow.compile()
+    return story_workflow.compile(checkpointer=checkpointer)
+
+
+def create_story_stream(genealogist_agent, curator_agent, biographer_agent, privacy_agent
+                        ) -> Callable[[StoryState], Iterator[Dict[str, Any]]]:
+    """
+    Create the streaming variant of the story workflow
+    
+    The context steps run as in create_story_workflow; write_story and
+    review_story then run together: biographer tokens go through the
+    incremental StoryReviewer and are released as soon as they are reviewed.
+    
+    Returns:
+        Function of an initial StoryState yielding events: "start", the
+        reviewer's "delta" / "paragraph" events, then "done" with the final
+        story (or "error")
+    """
+    nodes = _story_nodes(genealogist_agent, curator_agent, biographer_agent, privacy_agent, "story_stream")
+    
+    def run(state: StoryState) -> Iterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        yield {"event": "start", "person_id": state['person_id']}
+        try:
+            state = nodes["curate_memories"](nodes["gather_context"](state))
+        except Exception as e:
+            yield {"event": "error", "error": str(e)}
+            return
+        
+        reviewer = StoryReviewer(privacy_agent.decision_engine)
+        writing = time.perf_counter()
+        try:
+            tokens = biographer_agent.stream_story(state['person'], state['memories'], state.get('tone', "emotional"))
+            # Labels are set per token: each one may be pulled from another thread
+            for token in iter_scoped(tokens, workflow="story_stream", node="write_story"):
+                yield from reviewer.feed(token)
+            yield from reviewer.close()
+        except Exception as e:
+            NODE_ERRORS.inc(workflow="story_stream", node="write_story")
+            yield {"event": "error", "error": str(e)}
+            return
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - writing, workflow="story_stream", node="write_story")
+        
+        state['story_draft'] = reviewer.draft
+        state['final_story'] = reviewer.final_text
+        state['withheld_paragraphs'] = reviewer.withheld
+        yield {
+            "event": "done",
+            "story_content": state['final_story'],
+            "withheld_paragraphs": state['withheld_paragraphs'],
+            "generation_time_ms": int((time.perf_counter() - started) * 1000)
+        }
+    
+    return run
@@ -0,0 +1,129 @@
+"""Face index: tagged faces are suggested for faces found in new photos"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.tools import face_detection
+from src.tools.face_engine import EMBEDDING_DIM
+from src.tools.face_index import FaceIndexStore
+
+
+def _embedding(seed: int) -> np.ndarray:
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _tag(key: str, member_id: str, embedding: np.ndarray) -> dict:
+    return {
+        "id": key,
+        "family_member_id": member_id,
+        "face_detection_data": {"bbox": {"x": 0, "y": 0, "width": 10, "height": 10},
+                                "embedding": embedding.tolist()}
+    }
+
+
+class _Engine:
+    """Finds one face per photo, with a fixed embedding"""
+    can_embed = True
+    backend_name = "test"
+
+    def __init__(self, embedding: np.ndarray):
+        self.embedding = embedding
+
+    def detect_files(self, refs, resolve=lambda ref: ref, embed=False):
+        return [{"faces": [{"bbox": {"x": 1, "y": 1, "width": 8, "height": 8}, "confidence": 0.9}],
+                 "width": 100, "height": 100, "embeddings": self.embedding.reshape(1, -1)} for _ in refs]
+
+
+class _Database:
+    def __init__(self, tags):
+        self.tags = tags
+        self.queries = []
+
+    def iter_rows(self, query_type, params):
+        self.queries.append((query_type, params["family_id"]))
+        return iter(self.tags)
+
+
+def _tool(monkeypatch, tmp_path, photo_face, tags):
+    store = FaceIndexStore(str(tmp_path))
+    database = _Database(tags)
+    monkeypatch.setattr(face_detection, "get_face_engine", lambda: _Engine(photo_face))
+    monkeypatch.setattr(face_detection, "get_image_store", lambda: SimpleNamespace(get_path=lambda ref: ref))
+    monkeypatch.setattr(face_detection, "get_face_index_store", lambda: store)
+    monkeypatch.setattr(face_detection, "DatabaseQueryTool", lambda: database)
+    return face_detection.FaceDetectionTool(), store, database
+
+
+def test_tagged_face_is_suggested_for_new_photo(monkeypatch, tmp_path):
+    grandma, uncle = _embedding(1), _embedding(2)
+    # The same face in a new photo: close to, not equal to, the tagged one
+    photo_face = grandma + 0.2 * _embedding(3)
+    tool, _store, database = _tool(monkeypatch, tmp_path, photo_face,
+                                   [_tag("tag-1", "grandma", grandma), _tag("tag-2", "uncle", uncle)])
+
+    result = tool.detect_batch(["new-photo.jpg"], family_id="family-1")[0]
+
+    matches = result["faces_detected"][0]["suggested_matches"]
+    assert [match["family_member_id"] for match in matches] == ["grandma"]
+    assert database.queries == [("get_tagged_faces", "family-1")]
+
+    # Loaded once per family
+    tool.detect_batch(["another-photo.jpg"], family_id="family-1")
+    assert len(database.queries) == 1
+
+
+def test_tag_events_update_loaded_index(monkeypatch, tmp_path):
+    cousin = _embedding(4)
+    tool, store, _database = _tool(monkeypatch, tmp_path, cousin, [])
+
+    assert tool.detect_batch(["photo.jpg"], family_id="family-1")[0]["faces_detected"][0]["suggested_matches"] == []
+
+    store.apply_tag_events("family-1", [
+        {"table": "memory_people", "eventType": "INSERT", "new": _tag("tag-9", "cousin", cousin)}
+    ])
+    matches = tool.detect_batch(["photo.jpg"], family_id="family-1")[0]["faces_detected"][0]["suggested_matches"]
+    assert matches[0]["family_member_id"] == "cousin"
+
+    store.apply_tag_events("family-1", [
+        {"table": "memory_people", "eventType": "DELETE", "old": {"id": "tag-9"}}
+    ])
+    assert tool.detect_batch(["photo.jpg"], family_id="family-1")[0]["faces_detected"][0]["suggested_matches"] == []
+
+
+def _no_database():
+    raise AssertionError("the saved index should have been used")
+
+
+def test_saved_index_is_opened_after_restart(tmp_path):
+    grandma = _embedding(5)
+    FaceIndexStore(str(tmp_path)).get("family-1", load=lambda: [_tag("tag-1", "grandma", grandma)])
+
+    # A new process maps the saved matrix instead of reading memory_people
+    index = FaceIndexStore(str(tmp_path)).get("family-1", load=_no_database)
+
+    assert isinstance(index._vectors, np.memmap)
+    assert index.search(grandma)[0][0]["family_member_id"] == "grandma"
+
+
+def test_tag_events_are_saved(tmp_path):
+    cousin = _embedding(6)
+    store = FaceIndexStore(str(tmp_path))
+    store.get("family-1", load=lambda: [])
+    store.apply_tag_events("family-1", [
+        {"table": "memory_people", "eventType": "INSERT", "new": _tag("tag-9", "cousin", cousin)}
+    ])
+
+    index = FaceIndexStore(str(tmp_path)).get("family-1", load=_no_database)
+
+    assert index.search(cousin)[0][0]["family_member_id"] == "cousin"
+
+
+def test_stale_saved_index_is_rebuilt(tmp_path):
+    FaceIndexStore(str(tmp_path)).get("family-1", load=lambda: [_tag("tag-1", "grandma", _embedding(7))])
+    uncle = _embedding(8)
+
+    index = FaceIndexStore(str(tmp_path), max_age=0).get("family-1", load=lambda: [_tag("tag-2", "uncle", uncle)])
+
+    assert len(index) == 1
+    assert index.search(uncle)[0][0]["family_member_id"] == "uncle"
@@ -0,0 +1,100 @@
+"""Family sync: a graph patched by change events matches one rebuilt from the rows"""
+import json
+import random
+
+from src.tools.family_graph import FamilyGraph
+from src.tools.family_sync import apply_changes
+from src.tools.kinship import KinshipIndex
+
+UPDATED_AT = "2026-01-01T00:00:00"
+
+
+class _Family:
+    """Rows of a random family, edited alongside the cached graph"""
+
+    def __init__(self, rng: random.Random, size: int):
+        self.rng = rng
+        self.members = {}
+        self.relationships = {}
+        for i in range(size):
+            self.members[f"m{i}"] = {"id": f"m{i}", "first_name": f"M{i}", "gender": rng.choice(["male", "female"]),
+                                     "birth_date": f"{1800 + i * 200 // size}-01-01", "updated_at": UPDATED_AT}
+        for i in range(0, 20, 2):
+            self.link(f"m{i}", f"m{i + 1}", "spouse")
+        for i in range(20, size):
+            # Children of an earlier couple, written from either side
+            father = rng.randrange(0, i - 1 - i % 2)
+            father -= father % 2
+            self.link(f"m{father}", f"m{i}", "parent")
+            self.link(f"m{i}", f"m{father + 1}", "child")
+
+    def link(self, person1: str, person2: str, kind: str) -> dict:
+        row = {"id": f"r{len(self.relationships)}-{self.rng.random()}", "person1_id": person1,
+               "person2_id": person2, "relationship_type": kind, "updated_at": UPDATED_AT}
+        self.relationships[row["id"]] = row
+        return row
+
+    def random_events(self) -> list:
+        rng, roll = self.rng, self.rng.random()
+        some_member = rng.choice(list(self.members))
+        if roll < 0.3:
+            row = self.link(some_member, rng.choice(list(self.members)),
+                            rng.choice(["parent", "child", "spouse", "sibling"]))
+            return [{"table": "relationships", "eventType": "INSERT", "new": row}]
+        if roll < 0.5:
+            row_id = rng.choice(list(self.relationships))
+            del self.relationships[row_id]
+            return [{"table": "relationships", "eventType": "DELETE", "old": {"id": row_id}}]
+        if roll < 0.6:
+            row_id = rng.choice(list(self.relationships))
+            row = self.relationships[row_id] = {**self.relationships[row_id], "person1_id": some_member}
+            # Database webhook format
+            return [{"table": "relationships", "type": "UPDATE", "record": row}]
+        if roll < 0.75:
+            member = {"id": f"new{len(self.members)}-{rng.random()}", "first_name": "New",
+                      "gender": "female", "birth_date": "1990-05-05", "updated_at": UPDATED_AT}
+            self.members[member["id"]] = member
+            row = self.link(some_member, member["id"], "parent")
+            return [{"table": "family_members", "eventType": "INSERT", "new": member},
+                    {"table": "relationships", "eventType": "INSERT", "new": row}]
+        if roll < 0.85:
+            member = self.members[some_member] = {**self.members[some_member], "gender": "male",
+                                                  "is_deceased": not self.members[some_member].get("is_deceased")}
+            return [{"table": "family_members", "eventType": "UPDATE", "new": member}]
+        del self.members[some_member]
+        if rng.random() < 0.5:
+            return [{"table": "family_members", "eventType": "DELETE", "old": {"id": some_member}}]
+        return [{"table": "family_members", "eventType": "UPDATE", "new": {"id": some_member, "is_active": False}}]
+
+
+def _rebuilt(graph: FamilyGraph, family: _Family) -> FamilyGraph:
+    # Members in the cached graph's order, so both number them alike
+    ids = [graph.ids[i] for i in range(len(graph.ids)) if graph.active[i]]
+    return FamilyGraph([family.members[member_id] for member_id in ids], family.relationships.values())
+
+
+def _relations(kinship: KinshipIndex, member_id: str) -> list:
+    return sorted(json.dumps(relation, sort_keys=True) for relation in kinship.relations_of(member_id))
+
+
+def test_incremental_sync_matches_rebuild():
+    rng = random.Random(24)
+    family = _Family(rng, 400)
+    graph = FamilyGraph(family.members.values(), family.relationships.values())
+    kinship = KinshipIndex(graph)
+
+    for step in range(120):
+        apply_changes(graph, family.random_events(), kinship)
+        if step % 40 != 39:
+            continue
+        rebuilt = _rebuilt(graph, family)
+        rebuilt_kinship = KinshipIndex(rebuilt)
+
+        assert graph.statistics() == rebuilt.statistics()
+        assert graph.d3_json() == rebuilt.d3_json()
+        assert sorted(map(sorted, graph.sibling_groups())) == sorted(map(sorted, rebuilt.sibling_groups()))
+        assert sorted(map(sorted, graph.spouse_pairs())) == sorted(map(sorted, rebuilt.spouse_pairs()))
+        for member_id in rng.sample(rebuilt.ids, 25):
+            assert _relations(kinship, member_id) == _relations(rebuilt_kinship, member_id), member_id
+            relative_id = rng.choice(rebuilt.ids)
+            assert kinship.relation(member_id, relative_id) == rebuilt_kinship.relation(member_id, relative_id)
@@ -0,0 +1,120 @@
+"""Kinship: relations are named from the closest common ancestors"""
+import json
+import random
+
+from src.tools.family_graph import FamilyGraph
+from src.tools.kinship import KinshipIndex
+
+MEMBERS = [
+    ("grandpa", "male", "1920-01-01"), ("grandma", "female", "1922-01-01"),
+    ("father", "male", "1950-01-01"), ("aunt", "female", "1952-01-01"),
+    ("mother", "female", "1953-01-01"), ("other", "female", "1955-01-01"),
+    ("me", "female", "1980-01-01"), ("brother", "male", "1975-01-01"),
+    ("half_sister", "female", "1985-01-01"), ("cousin", "male", "1982-01-01"),
+    ("row_a", "male", None), ("row_b", "female", None),
+]
+
+
+def _family() -> KinshipIndex:
+    members = [{"id": member_id, "first_name": member_id, "gender": gender, "birth_date": born}
+               for member_id, gender, born in MEMBERS]
+    relationships = []
+
+    def link(person1, person2, kind):
+        relationships.append({"id": f"r{len(relationships)}", "person1_id": person1,
+                              "person2_id": person2, "relationship_type": kind})
+
+    link("grandpa", "grandma", "spouse")
+    for grandparent in ("grandpa", "grandma"):
+        # Rows may be written from either side
+        link(grandparent, "father", "parent")
+        link("aunt", grandparent, "child")
+    link("father", "mother", "spouse")
+    for child in ("me", "brother"):
+        link("father", child, "parent")
+        link(child, "mother", "child")
+    link("father", "half_sister", "parent")
+    link("other", "half_sister", "parent")
+    link("aunt", "cousin", "parent")
+    # Siblings recorded without their parents
+    link("row_a", "row_b", "sibling")
+    return KinshipIndex(FamilyGraph(members, relationships))
+
+
+def _names(kinship: KinshipIndex, person_id: str, relative_id: str):
+    relation = kinship.relation(person_id, relative_id)
+    return relation["relation"], relation["relation_indonesian"]
+
+
+def test_blood_relations_are_named():
+    kinship = _family()
+
+    assert _names(kinship, "me", "father") == ("father", "ayah")
+    assert _names(kinship, "me", "grandpa") == ("grandfather", "kakek")
+    assert _names(kinship, "me", "aunt") == ("aunt", "bibi")
+    assert _names(kinship, "me", "cousin") == ("first cousin", "sepupu")
+    assert _names(kinship, "grandma", "me") == ("granddaughter", "cucu")
+
+
+def test_full_and_half_siblings():
+    kinship = _family()
+
+    brother = kinship.relation("me", "brother")
+    assert (brother["relation"], brother["relation_indonesian"]) == ("brother", "kakak laki-laki")
+    assert sorted(brother["common_ancestors"]) == ["father", "mother"]
+    # Only the father is shared, and both of her parents are known
+    assert _names(kinship, "me", "half_sister") == ("half-sister", "saudara seayah")
+    assert _names(kinship, "half_sister", "me") == ("half-sister", "saudara seayah")
+
+
+def test_sibling_rows_without_parents():
+    kinship = _family()
+
+    relation = kinship.relation("row_a", "row_b")
+    assert relation["kind"] == "blood"
+    assert (relation["relation"], relation["relation_indonesian"]) == ("sister", "saudara kandung")
+    # Their shared parent is not a member
+    assert relation["common_ancestors"] == []
+
+
+def test_relations_of_agrees_with_relation():
+    kinship = _family()
+
+    relations = kinship.relations_of("me")
+
+    assert {relation["relative_id"] for relation in relations} == {
+        "father", "mother", "grandpa", "grandma", "brother", "half_sister", "aunt", "cousin"
+    }
+    for relation in relations:
+        single = kinship.relation("me", relation["relative_id"])
+        assert (relation["relation"], relation["generations_up"], relation["generations_down"]) == \
+            (single["relation"], single["generations_up"], single["generations_down"])
+    assert kinship.relation("me", "other")["kind"] == "unrelated"
+
+
+def _sorted_relation(relation):
+    return json.dumps({**relation, "common_ancestors": sorted(relation.get("common_ancestors", []))},
+                      sort_keys=True)
+
+
+def test_relations_do_not_depend_on_row_order():
+    # Parents drawn from any earlier member: many members descend from the
+    # same ancestor along lines of different lengths, so ties are common
+    rng = random.Random(23)
+    for _ in range(100):
+        size = rng.randint(5, 25)
+        members = [{"id": f"m{i}", "gender": rng.choice(["male", "female"])} for i in range(size)]
+        relationships = [{"id": f"r{i}-{parent}", "person1_id": f"m{parent}", "person2_id": f"m{i}",
+                          "relationship_type": "parent"}
+                         for i in range(2, size) for parent in rng.sample(range(i), rng.choice([1, 2]))]
+        kinship = KinshipIndex(FamilyGraph(members, relationships))
+        rng.shuffle(members)
+        rng.shuffle(relationships)
+        shuffled = KinshipIndex(FamilyGraph(members, relationships))
+
+        for member in members:
+            assert sorted(map(_sorted_relation, kinship.relations_of(member["id"]))) == \
+                sorted(map(_sorted_relation, shuffled.relations_of(member["id"])))
+            for relative in members:
+                assert _sorted_relation(kinship.relation(member["id"], relative["id"])) == \
+                    _sorted_relation(shuffled.relation(member["id"], relative["id"]))
@@ -0,0 +1,112 @@
+"""PII scanner: the single-pass scan finds what every rule finds on its own"""
+import random
+
+from src.tools.pii_scanner import COMPILED_RULES, PII_RULES, RISK_ORDER, highest_risk, iter_spans, scan_spans
+from src.tools.redaction_engine import merge_spans, redact_text
+
+ALPHABET = "0123456789    ..@-+()abcxyzMainStreetJlRdAve%_\n"
+WORDS = ["12", "Main", "Street", "Jl", "Road", "budi@mail.com", "a.b", "0812", "345", "6789", "+62",
+         "(021)", "-", ".", "@", " ", "x", "com", "1234567890123456", "4111 1111 1111 1111"]
+
+
+def random_text(rng: random.Random) -> str:
+    """Text dense in the characters and fragments the rules compete for"""
+    if rng.random() < 0.5:
+        return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60)))
+    return "".join(rng.choice(WORDS) + rng.choice(["", " ", ".", "-", "@"]) for _ in range(rng.randint(0, 12)))
+
+
+def per_rule_matches(text: str):
+    return [(rule, match) for rule in PII_RULES for match in COMPILED_RULES[rule.pii_type].finditer(text)]
+
+
+def test_scan_reports_each_type():
+    spans = scan_spans("mail budi@mail.com or call +62 812-3456-7890, lives at 12 Main Street, Jakarta")
+
+    assert [(span.type, span.value) for span in spans] == [
+        ("email_address", "budi@mail.com"), ("phone_number", "+62 812-3456-7890"),
+        ("detailed_address", "12 Main Street")
+    ]
+    assert spans[0].start == 5 and spans[0].end == 18
+    assert scan_spans("nothing here") == [] and highest_risk([]) == "none"
+
+
+def test_numbers_inside_a_digit_run_are_reported_too():
+    spans = scan_spans("KTP 3171234567890123 ok")
+
+    # A KTP is also a phone-style run and has a card's shape
+    assert [span.type for span in spans] == ["ktp_number", "phone_number", "credit_card"]
+    assert {(span.start, span.end) for span in spans} == {(4, 20)}
+    assert highest_risk(spans) == "critical"
+
+
+def test_merge_spans_labels_each_region_with_its_highest_risk():
+    text = "KTP 3171234567890123, mail budi@mail.com"
+    regions = merge_spans(scan_spans(text))
+
+    assert regions == [(4, 20, "credit_card"), (27, 40, "email_address")]
+    assert redact_text(text, regions) == "KTP [REDACTED_CC], mail [REDACTED_EMAIL]"
+
+
+def test_merge_spans_of_detection_dicts():
+    regions = merge_spans([
+        {"type": "phone_number", "start": 0, "end": 10},
+        {"type": "ktp_number", "start": 5, "end": 12, "risk_level": "high"},
+        # Touching, not overlapping: a region of its own
+        {"type": "email_address", "start": 12, "end": 20, "risk_level": "medium"},
+        {"type": "phone_number", "start": 30, "end": 30},
+    ])
+
+    assert regions == [(0, 12, "ktp_number"), (12, 20, "email_address")]
+
+
+def test_email_right_after_address_is_found():
+    spans = scan_spans("Visit 12 Main Street.budi@mail.com")
+
+    assert ("email_address", "Street.budi@mail.com") in [(span.type, span.value) for span in spans]
+
+
+def test_scan_covers_every_rule_match():
+    # Where rule families overlap the scan may report a different split,
+    # but every character a rule matches is reported, at the same risk
+    rng = random.Random(6)
+    for _ in range(20000):
+        text = random_text(rng)
+        spans = scan_spans(text)
+        covered = set()
+        for span in spans:
+            covered.update(range(span.start, span.end))
+        matches = per_rule_matches(text)
+
+        missed = [(rule.pii_type, match.span()) for rule, match in matches
+                  if not covered.issuperset(range(match.start(), match.end()))]
+        assert not missed, (text, missed)
+        expected_risk = max((rule.risk_level for rule, _ in matches),
+                            key=RISK_ORDER.get, default="none")
+        assert highest_risk(spans) == expected_risk, text
+        assert len(set(spans)) == len(spans), text
+
+
+def test_streaming_scan_matches_whole_text_scan():
+    # Fragments separated by boundaries no match can cross, so no window is
+    # cut hard; the windows must then report exactly what one scan does
+    rng = random.Random(2)
+    for _ in range(5000):
+        text = "".join(random_text(rng) + rng.choice([", ", "; ", ". "]) for _ in range(rng.randint(1, 12)))
+        expected = scan_spans(text)
+        for chunk_size, overlap in ((64, 32), (64, 64), (128, 32), (128, 64)):
+            assert list(iter_spans(text, chunk_size, overlap)) == expected, (text, chunk_size, overlap)
+
+
+def test_hard_cut_windows_report_short_spans_once():
+    # Without any safe boundary windows are cut hard; only a match longer
+    # than the overlap may then be seen in part
+    rng = random.Random(3)
+    for _ in range(5000):
+        text = "".join(random_text(rng) for _ in range(rng.randint(1, 12)))
+        expected = scan_spans(text)
+        for chunk_size, overlap in ((64, 32), (64, 64), (128, 32), (128, 64)):
+            spans = list(iter_spans(text, chunk_size, overlap))
+            assert len(set(spans)) == len(spans), (text, chunk_size, overlap)
+            missed = [span for span in expected if span.end - span.start <= overlap and span not in spans]
+            assert not missed, (text, chunk_size, overlap, missed)
@@ -0,0 +1,91 @@
+"""Relationship validator: date rules and ancestry cycles"""
+from src.tools.relationship_validator import validate_relationships
+
+
+def _member(member_id, born=None, died=None, gender=None):
+    return {"id": member_id, "birth_date": born, "death_date": died, "gender": gender}
+
+
+def _parent(row_id, parent, child):
+    return {"id": row_id, "person1_id": parent, "person2_id": child, "relationship_type": "parent"}
+
+
+def _rules(report):
+    return sorted((violation["rule"], violation["relationship_id"]) for violation in report["violations"])
+
+
+def test_consistent_family_is_valid():
+    members = [_member("dad", "1950-01-01", gender="male"), _member("mum", "1952-01-01", gender="female"),
+               _member("kid", "1980-01-01")]
+    relationships = [
+        _parent("r1", "dad", "kid"),
+        {"id": "r2", "person1_id": "kid", "person2_id": "mum", "relationship_type": "child"},
+        {"id": "r3", "person1_id": "dad", "person2_id": "mum", "relationship_type": "spouse",
+         "start_date": "1975-06-01"},
+    ]
+
+    report = validate_relationships(members, relationships)
+
+    assert report["is_valid"]
+    assert report["violations"] == [] and report["cycles"] == []
+    assert report["checked_relationships"] == 3
+
+
+def test_date_rules():
+    members = [_member("old", "1900-01-01", "1950-01-01", "male"), _member("young", "1990-01-01"),
+               _member("kid", "1980-01-01"), _member("teen", "1970-01-01", gender="female")]
+    relationships = [
+        _parent("r1", "young", "kid"),   # parent born after the child
+        _parent("r2", "teen", "kid"),    # ten at the child's birth
+        _parent("r3", "old", "kid"),     # eighty, and dead for thirty years
+        {"id": "r4", "person1_id": "old", "person2_id": "teen", "relationship_type": "spouse",
+         "start_date": "1960-01-01"},    # after his death, before her birth
+        _parent("r5", "ghost", "kid"),   # not a member
+    ]
+
+    report = validate_relationships(members, relationships)
+
+    assert not report["is_valid"]
+    assert _rules(report) == [
+        ("married_after_death", "r4"), ("married_before_birth", "r4"),
+        ("more_than_two_parents", "r1"), ("more_than_two_parents", "r2"), ("more_than_two_parents", "r3"),
+        ("parent_died_before_birth", "r3"), ("parent_too_old", "r3"), ("parent_too_young", "r2"),
+        ("parent_younger_than_child", "r1"), ("unknown_member", "r5"),
+    ]
+    assert report["counts"]["more_than_two_parents"] == 3
+
+
+def test_parent_also_recorded_as_sibling():
+    members = [_member("a"), _member("b")]
+    relationships = [_parent("r1", "a", "b"),
+                     {"id": "r2", "person1_id": "b", "person2_id": "a", "relationship_type": "sibling"}]
+
+    assert _rules(validate_relationships(members, relationships)) == [("conflicting_relationships", "r2")]
+
+
+def test_ancestry_cycles():
+    # A loop a -> b -> c -> a with a line of descendants hanging off it,
+    # ancestors above it, and a second loop d <-> e elsewhere
+    members = [_member(member_id) for member_id in ("root", "a", "b", "c", "x", "y", "d", "e")]
+    relationships = [
+        _parent("r1", "a", "b"), _parent("r2", "b", "c"),
+        {"id": "r3", "person1_id": "a", "person2_id": "c", "relationship_type": "child"},
+        _parent("r4", "c", "x"), _parent("r5", "x", "y"), _parent("r6", "root", "a"),
+        _parent("r7", "d", "e"), _parent("r8", "e", "d"),
+    ]
+
+    report = validate_relationships(members, relationships)
+
+    cycles = sorted((sorted(cycle["members"]), sorted(cycle["relationship_ids"])) for cycle in report["cycles"])
+    assert cycles == [(["a", "b", "c"], ["r1", "r2", "r3"]), (["d", "e"], ["r7", "r8"])]
+    assert report["counts"] == {"ancestry_cycle": 5}
+    assert not report["is_valid"]
+
+
+def test_long_chain_has_no_cycle():
+    members = [_member(f"m{i}") for i in range(5000)]
+    relationships = [_parent(f"r{i}", f"m{i}", f"m{i + 1}") for i in range(4999)]
+
+    report = validate_relationships(members, relationships)
+
+    assert report["cycles"] == [] and report["is_valid"]